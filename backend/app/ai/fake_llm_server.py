@@ -0,0 +1,63 @@
+"""
+Fake OpenAI-compatible LLM server for exercising the provider chain locally.
+
+    FAKE_LLM_FAILURE_RATE=0.2 FAKE_LLM_SLOW_RATE=0.1 uvicorn app.ai.fake_llm_server:app --port 8080
+    AI_PROVIDERS=local,dummy uvicorn app.main:app
+
+Every response waits FAKE_LLM_DELAY_SECONDS; a FAKE_LLM_SLOW_RATE fraction
+waits FAKE_LLM_SLOW_SECONDS instead, and a FAKE_LLM_FAILURE_RATE fraction
+answers 500. Prompts asking for JSON variants get a JSON reply, of which a
+FAKE_LLM_MALFORMED_RATE fraction is fenced and cut off mid-variant.
+"""
+import asyncio
+import json
+import os
+import random
+
+from fastapi import FastAPI, HTTPException, Request
+
+FAKE_LLM_DELAY_SECONDS = float(os.getenv("FAKE_LLM_DELAY_SECONDS", "0.2"))
+FAKE_LLM_SLOW_SECONDS = float(os.getenv("FAKE_LLM_SLOW_SECONDS", "10"))
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "0"))
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+
+def create_app(
+    delay_seconds: float = FAKE_LLM_DELAY_SECONDS,
+    slow_seconds: float = FAKE_LLM_SLOW_SECONDS,
+    slow_rate: float = FAKE_LLM_SLOW_RATE,
+    failure_rate: float = FAKE_LLM_FAILURE_RATE,
+    malformed_rate: float = FAKE_LLM_MALFORMED_RATE
+) -> FastAPI:
+    """A fake server with its own latency and failure settings (tests run several side by side)."""
+    fake = FastAPI(title="Fake LLM")
+
+    @fake.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        roll = random.random()
+        if roll < failure_rate:
+            raise HTTPException(status_code=500, detail="Injected failure")
+        slow = roll < failure_rate + slow_rate
+        await asyncio.sleep(slow_seconds if slow else delay_seconds)
+        prompt = payload["messages"][-1]["content"]
+        content = f"Subject: Quick follow-up\n\nHi,\n\n{prompt[:80]}\n\nThanks"
+        if '"variants"' in prompt:
+            content = json.dumps({"variants": [
+                {"subject": f"Quick follow-up #{i + 1}", "body": f"Hi,\n\n{prompt[:80]}\n\nThanks"} for i in range(3)
+            ]})
+            if random.random() < malformed_rate:
+                content = "```json\n" + content[:int(len(content) * 0.8)]
+        return {
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+        }
+
+    return fake
+
+
+app = create_app()
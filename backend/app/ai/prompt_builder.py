@@ -0,0 +1,74 @@
+"""
+Token-budgeted context for follow-up generation.
+
+``PromptBuilder`` fills a fixed budget (``PROMPT_TOKEN_BUDGET``) in priority
+order: the generation context (caller-supplied, or the lead's details and
+notes), the lead's rolling conversation summary, then the most recent sent
+emails, newest first. The summary leaves out the digests of those recent
+emails, so no email is sent twice. Whatever does not fit is truncated (the
+summary loses its oldest lines first) or left out, so the prompt size stays
+flat no matter how long the history gets.
+"""
+import os
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from ..models.lead_summary import LeadSummary
+from ..models.sent_email_log import SentEmailLog
+from ..services.conversation_summary import ConversationSummaryService
+from .templates import lead_context
+from .tokenizer import count_tokens, truncate_to_tokens
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))
+PROMPT_RECENT_EMAILS = int(os.getenv("PROMPT_RECENT_EMAILS", "3"))
+MIN_SECTION_TOKENS = 20
+
+
+class BuiltPrompt(NamedTuple):
+    context: str
+    previous_interactions: List[Dict[str, Any]]
+    tokens: int
+
+
+class PromptBuilder:
+    def __init__(self, budget_tokens: int = PROMPT_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+
+    def build(
+        self,
+        lead,
+        context: Optional[str] = None,
+        summary: Optional[LeadSummary] = None,
+        recent_emails: Optional[List[SentEmailLog]] = None
+    ) -> BuiltPrompt:
+        remaining = self.budget_tokens
+
+        # The context never takes more than half the budget, leaving room for history
+        context = truncate_to_tokens(context or lead_context(lead), remaining // 2)
+        remaining -= count_tokens(context)
+
+        interactions: List[Dict[str, Any]] = []
+        # The newest emails go in verbatim below; their digest lines would repeat them
+        summary_text = ConversationSummaryService.render(summary, skip_latest=len(recent_emails or []))
+        if summary_text and remaining >= MIN_SECTION_TOKENS:
+            # Digest lines run oldest to newest; keep the newest
+            summary_text = truncate_to_tokens(summary_text, remaining // 2, keep_end=True)
+            remaining -= count_tokens(summary_text)
+            interactions.append({"type": "summary", "text": summary_text})
+
+        for email in recent_emails or []:
+            header_tokens = count_tokens(email.subject) + 8
+            if remaining - header_tokens < MIN_SECTION_TOKENS:
+                break
+            body = truncate_to_tokens(email.body, remaining - header_tokens)
+            remaining -= header_tokens + count_tokens(body)
+            interactions.append({
+                "type": "email",
+                "sent_at": email.sent_at.isoformat() if email.sent_at else None,
+                "subject": email.subject,
+                "body": body,
+            })
+
+        return BuiltPrompt(context, interactions, self.budget_tokens - remaining)
+
+
+prompt_builder = PromptBuilder()
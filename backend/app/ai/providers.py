@@ -1,11 +1,18 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import asyncio
+import os
 from ..schemas.followup_suggestion import FollowUpTone, FollowUpSuggestionBase
+from .templates import render_variants, template_registry
+from .structured_output import parse_variants
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 
+class AIProviderError(Exception):
+    """Raised when no configured provider could produce suggestions."""
+
 class AIProvider(ABC):
     """Abstract base class for AI providers that generate follow-up suggestions."""
     
@@ -42,91 +49,166 @@ class DummyAIProvider(AIProvider):
         previous_interactions: Optional[List[Dict[str, Any]]] = None
     ) -> List[FollowUpSuggestionBase]:
         """Generate dummy follow-up email variants."""
-        logger.info(f"Generating {tone} follow-up variants with context: {context[:100]}...")
-        
-        # Sample follow-up templates based on tone
-        templates = {
-            FollowUpTone.POLITE: {
-                "subjects": [
-                    "Following up on our recent conversation",
-                    "Just checking in",
-                    "Reconnecting regarding your interest"
-                ],
-                "bodies": [
-                    "Dear {name},\n\nI hope this message finds you well. I'm following up on our recent conversation about {context}. I wanted to check if you had any questions or if there's anything else I can assist you with.\n\nBest regards,\n{user_name}",
-                    "Hello {name},\n\nI wanted to follow up regarding {context}. Please let me know if you've had a chance to review the information I sent. I'm happy to provide any additional details you might need.\n\nBest regards,\n{user_name}",
-                    "Hi {name},\n\nI hope you're doing well. I'm reaching out to see if you've had any thoughts about {context} since we last spoke. I'm here to help with any questions you might have.\n\nKind regards,\n{user_name}"
-                ]
-            },
-            FollowUpTone.ASSERTIVE: {
-                "subjects": [
-                    "Action required: Follow-up on our discussion",
-                    "Time-sensitive: Need your input",
-                    "Following up: Next steps"
-                ],
-                "bodies": [
-                    "{name},\n\nI'm following up on our discussion about {context}. To move forward, I'll need your response by {deadline}. Please let me know if you have any questions.\n\nRegards,\n{user_name}",
-                    "{name},\n\nThis is a follow-up regarding {context}. I need to hear back from you by {deadline} to proceed. Let me know if you need any clarification.\n\nBest,\n{user_name}",
-                    "{name},\n\nI'm reaching out again about {context}. Your input is needed to take the next steps. Please respond by {deadline}.\n\nThanks,\n{user_name}"
-                ]
-            },
-            FollowUpTone.FRIENDLY: {
-                "subjects": [
-                    "Hey {first_name}! Just checking in",
-                    "Following up on {context}",
-                    "Quick update on our conversation"
-                ],
-                "bodies": [
-                    "Hey {first_name}!\n\nI was just thinking about our conversation about {context} and wanted to check in. How's it going? Let me know if you've had any thoughts or questions!\n\nCheers,\n{user_name}",
-                    "Hi {first_name}!\n\nHope you're having a great week! I wanted to follow up on {context}. Any updates on your end?\n\nBest,\n{user_name}",
-                    "{first_name}!\n\nQuick note to follow up about {context}. Let me know what you think when you get a chance!\n\nTalk soon,\n{user_name}"
-                ]
-            }
-        }
-        
-        # Get the appropriate templates based on tone
-        tone_templates = templates.get(tone, templates[FollowUpTone.POLITE])
-        
-        # Prepare context variables
-        first_name = (lead_info or {}).get('contact_name', '').split(' ')[0] if lead_info and 'contact_name' in lead_info else 'there'
-        user_name = (lead_info or {}).get('user_name', 'Your FollowWise Team')
-        deadline = (datetime.now() + timedelta(days=3)).strftime('%A, %B %d')
-        
-        # Generate the three variants
-        variants = []
-        for i in range(3):
-            subject = tone_templates["subjects"][i % len(tone_templates["subjects"])]
-            body = tone_templates["bodies"][i % len(tone_templates["bodies"])]
-            
-            # Format the template with context
-            formatted_subject = subject.format(
-                first_name=first_name,
-                context=context[:50] + ('...' if len(context) > 50 else ''),
-                deadline=deadline
-            )
-            
-            formatted_body = body.format(
-                name=lead_info.get('contact_name', 'there') if lead_info else 'there',
-                first_name=first_name,
-                context=context,
-                deadline=deadline,
-                user_name=user_name
-            )
-            
-            variants.append(FollowUpSuggestionBase(
-                variant_index=i,
-                subject=formatted_subject,
-                body=formatted_body,
-                tone=tone
-            ))
+        logger.info("Generating %s follow-up variants with context: %.100s", tone, context)
         
-        return variants
+        return render_variants(template_registry.builtin(tone), tone, context, lead_info)
+
+
+VARIANT_COUNT = 3
+
+
+class LLMProvider(AIProvider):
+    """
+    AIProvider backed by an OpenAI-compatible chat completions endpoint (NVIDIA, OpenAI, llama.cpp, ...).
+
+    All variants come from one completion answering in JSON. Variants missing
+    from unparseable or truncated output are generated one completion each.
+    """
+
+    def __init__(self, base_url: str, model: str, api_key: Optional[str] = None, max_tokens: int = 500):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.model = model
+        self.max_tokens = max_tokens
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=float(os.getenv("AI_TIMEOUT_SECONDS", "20"))
+        )
+
+    @staticmethod
+    def _history(previous_interactions: Optional[List[Dict[str, Any]]]) -> str:
+        parts = []
+        for item in previous_interactions or []:
+            if item.get("type") == "summary":
+                parts.append(f"Conversation so far:\n{item['text']}")
+            else:
+                parts.append(f"Email sent {item.get('sent_at') or ''} - Subject: {item.get('subject')}\n{item.get('body')}")
+        return "\n\n".join(parts)
+
+    def _lead_line(self, tone: FollowUpTone, lead_info: Optional[Dict[str, Any]]) -> str:
+        lead_info = lead_info or {}
+        return (
+            f"in a {getattr(tone, 'value', tone)} tone "
+            f"to {lead_info.get('contact_name') or 'the lead'}"
+            f"{' at ' + lead_info['company'] if lead_info.get('company') else ''}, "
+            f"signed by {lead_info.get('user_name') or 'the sender'}"
+        )
+
+    def _context_sections(self, context: str, previous_interactions: Optional[List[Dict[str, Any]]]) -> List[str]:
+        sections = [f"Context:\n{context.strip()}"]
+        history = self._history(previous_interactions)
+        if history:
+            sections.append(f"Previous interactions:\n{history}")
+        return sections
+
+    def _batch_prompt(
+        self,
+        context: str,
+        tone: FollowUpTone,
+        lead_info: Optional[Dict[str, Any]],
+        previous_interactions: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        sections = [f"Write {VARIANT_COUNT} different follow-up email variants {self._lead_line(tone, lead_info)}."]
+        sections += self._context_sections(context, previous_interactions)
+        sections.append(
+            'Reply with only a JSON object, no Markdown: '
+            '{"variants": [{"subject": "<subject>", "body": "<email body>"}, ...]} '
+            f"with exactly {VARIANT_COUNT} variants."
+        )
+        return "\n\n".join(sections)
+
+    def _prompt(
+        self,
+        context: str,
+        tone: FollowUpTone,
+        lead_info: Optional[Dict[str, Any]],
+        variant_index: int,
+        previous_interactions: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        sections = [f"Write follow-up email variant #{variant_index + 1} of {VARIANT_COUNT} {self._lead_line(tone, lead_info)}."]
+        sections += self._context_sections(context, previous_interactions)
+        sections.append("Reply with the first line as 'Subject: <subject>' followed by a blank line and the email body.")
+        return "\n\n".join(sections)
+
+    async def _complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        response = await self.client.post("/chat/completions", json={
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7,
+            "max_tokens": max_tokens or self.max_tokens,
+        })
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    @staticmethod
+    def _parse(text: str, variant_index: int, tone: FollowUpTone) -> FollowUpSuggestionBase:
+        subject, _, body = text.strip().partition("\n")
+        if subject.lower().startswith("subject:"):
+            subject = subject[len("subject:"):].strip()
+        else:
+            subject, body = "Following up", text.strip()
+        return FollowUpSuggestionBase(variant_index=variant_index, subject=subject, body=body.strip(), tone=tone)
+
+    async def generate_followup_variants(
+        self,
+        context: str,
+        tone: FollowUpTone = FollowUpTone.POLITE,
+        lead_info: Optional[Dict[str, Any]] = None,
+        previous_interactions: Optional[List[Dict[str, Any]]] = None
+    ) -> List[FollowUpSuggestionBase]:
+        """One JSON completion for all variants; per-variant completions only for what it lacks."""
+        text = await self._complete(
+            self._batch_prompt(context, tone, lead_info, previous_interactions),
+            max_tokens=self.max_tokens * VARIANT_COUNT
+        )
+        parsed = parse_variants(text, VARIANT_COUNT)
+        suggestions = [
+            FollowUpSuggestionBase(variant_index=i, subject=variant["subject"], body=variant["body"], tone=tone)
+            for i, variant in enumerate(parsed)
+        ]
+        missing = range(len(suggestions), VARIANT_COUNT)
+        if missing:
+            logger.warning("Structured reply had %d of %d variants; generating the rest one by one", len(parsed), VARIANT_COUNT)
+            texts = await asyncio.gather(*[
+                self._complete(self._prompt(context, tone, lead_info, i, previous_interactions)) for i in missing
+            ])
+            suggestions += [self._parse(text, i, tone) for i, text in zip(missing, texts)]
+        return suggestions
+
+
+def _build_provider(name: str) -> AIProvider:
+    if name == "llm":
+        return LLMProvider(
+            base_url=os.getenv("LLM_BASE_URL", "https://integrate.api.nvidia.com/v1"),
+            model=os.getenv("LLM_MODEL", "meta/llama-3.1-405b-instruct"),
+            api_key=os.getenv("LLM_API_KEY") or os.getenv("NVIDIA_API_KEY"),
+        )
+    if name == "local":
+        return LLMProvider(
+            base_url=os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:8080/v1"),
+            model=os.getenv("LOCAL_LLM_MODEL", "local"),
+        )
+    if name == "dummy":
+        return DummyAIProvider()
+    raise ValueError(f"Unknown AI provider {name!r} in AI_PROVIDERS")
+
 
+_provider: Optional[AIProvider] = None
 
 # Dependency provider function for FastAPI DI
 def get_ai_provider() -> AIProvider:
     """
-    Return an AIProvider instance. In production this could be configured
-    to return different provider implementations based on settings.
+    Return the process-wide AIProvider configured by AI_PROVIDERS, a
+    comma-separated fallback chain of "llm", "local" and "dummy" (default
+    "dummy"). Chains of more than one provider get hedging and circuit
+    breakers; the instance is shared so that their state persists.
     """
-    return DummyAIProvider()
+    global _provider
+    if _provider is None:
+        names = [n.strip() for n in os.getenv("AI_PROVIDERS", "dummy").split(",") if n.strip()]
+        if len(names) == 1:
+            _provider = _build_provider(names[0])
+        else:
+            from .resilience import FallbackAIProvider
+            _provider = FallbackAIProvider({name: _build_provider(name) for name in names})
+    return _provider
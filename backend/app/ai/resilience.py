@@ -0,0 +1,201 @@
+"""
+Fallback chain, hedged requests and circuit breakers across AI providers.
+
+``FallbackAIProvider`` tries its providers in order. If the current attempt
+has not answered within that provider's recent latency percentile, a hedged
+request goes to the next provider and whichever succeeds first wins. Failed
+or timed-out attempts fall through to the next provider, and each provider's
+circuit breaker opens after a burst of errors so a dead endpoint is skipped
+instead of waited on.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from ..schemas.followup_suggestion import FollowUpTone, FollowUpSuggestionBase
+from .providers import AIProvider, AIProviderError
+
+logger = logging.getLogger(__name__)
+
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "20"))
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "0.95"))
+AI_HEDGE_DEFAULT_SECONDS = float(os.getenv("AI_HEDGE_DEFAULT_SECONDS", "2"))
+AI_HEDGE_MIN_SECONDS = float(os.getenv("AI_HEDGE_MIN_SECONDS", "0.25"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_WINDOW_SECONDS = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "30"))
+AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` failures within ``window_seconds``; half-opens after a cooldown."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = AI_BREAKER_FAILURES,
+        window_seconds: float = AI_BREAKER_WINDOW_SECONDS,
+        cooldown_seconds: float = AI_BREAKER_COOLDOWN_SECONDS
+    ):
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self._failures: deque = deque()
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                # Let exactly one trial request through
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_cancelled(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures.clear()
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                self._trip(now)
+                return
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window_seconds:
+                self._failures.popleft()
+            if len(self._failures) >= self.failure_threshold:
+                self._trip(now)
+
+    def _trip(self, now: float) -> None:
+        self.state = self.OPEN
+        self._opened_at = now
+        self._failures.clear()
+
+
+class LatencyTracker:
+    """Recent successful latencies of one provider, for picking the hedge delay."""
+
+    def __init__(self, size: int = 100, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def hedge_delay(self) -> float:
+        observed = self.percentile(AI_HEDGE_PERCENTILE)
+        return max(AI_HEDGE_MIN_SECONDS, observed if observed is not None else AI_HEDGE_DEFAULT_SECONDS)
+
+
+class _Member:
+    def __init__(self, name: str, provider: AIProvider):
+        self.name = name
+        self.provider = provider
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+
+
+class FallbackAIProvider(AIProvider):
+    """Composite provider: ordered fallback with hedging and per-provider circuit breakers."""
+
+    def __init__(self, providers: Dict[str, AIProvider], timeout_seconds: float = AI_TIMEOUT_SECONDS):
+        if not providers:
+            raise ValueError("FallbackAIProvider needs at least one provider")
+        self.members = [_Member(name, provider) for name, provider in providers.items()]
+        self.timeout_seconds = timeout_seconds
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {"provider": m.name, "circuit": m.breaker.state, "p95_seconds": m.latency.percentile(0.95)}
+            for m in self.members
+        ]
+
+    async def _attempt(self, member: _Member, kwargs: Dict[str, Any]) -> List[FollowUpSuggestionBase]:
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                member.provider.generate_followup_variants(**kwargs), self.timeout_seconds
+            )
+        except asyncio.CancelledError:
+            # Lost a hedge race; not the provider's fault
+            member.breaker.record_cancelled()
+            raise
+        except Exception:
+            member.breaker.record_failure()
+            raise
+        member.breaker.record_success()
+        member.latency.record(time.monotonic() - started)
+        return result
+
+    async def generate_followup_variants(
+        self,
+        context: str,
+        tone: FollowUpTone = FollowUpTone.POLITE,
+        lead_info: Optional[Dict[str, Any]] = None,
+        previous_interactions: Optional[List[Dict[str, Any]]] = None
+    ) -> List[FollowUpSuggestionBase]:
+        kwargs = dict(context=context, tone=tone, lead_info=lead_info, previous_interactions=previous_interactions)
+        candidates = iter(m for m in self.members if m.breaker.allow())
+        pending: Dict[asyncio.Task, _Member] = {}
+        errors: List[str] = []
+
+        def launch() -> Optional[_Member]:
+            member = next(candidates, None)
+            if member is not None:
+                pending[asyncio.ensure_future(self._attempt(member, kwargs))] = member
+            return member
+
+        last = launch()
+        if last is None:
+            raise AIProviderError("All AI providers are unavailable (circuits open)")
+
+        try:
+            while pending:
+                # Only hedge while there is another provider left to hedge to
+                hedge_after = last.latency.hedge_delay() if last is not None else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info("Hedging AI request after %.2fs on %s", hedge_after, last.name)
+                    last = launch()
+                    continue
+                for task in done:
+                    member = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    errors.append(f"{member.name}: {error!r}")
+                    logger.warning("AI provider %s failed: %r", member.name, error)
+                if not pending:
+                    last = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise AIProviderError("All AI providers failed: " + "; ".join(errors))
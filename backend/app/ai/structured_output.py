@@ -0,0 +1,122 @@
+"""
+Lenient parsing of the JSON an LLM returns for a batch of email variants.
+
+Models asked for ``{"variants": [{"subject": ..., "body": ...}, ...]}`` often
+wrap the JSON in a Markdown fence or in prose. They also leave trailing
+commas, and get cut off at ``max_tokens`` part way through the last variant.
+``parse_variants`` tries, in order:
+
+1. the JSON value itself
+2. the same text with trailing commas removed, cut back to the last
+   complete element and with its brackets closed
+3. a scan for complete ``"subject": ..., "body": ...`` pairs
+
+It keeps whatever complete variants it finds. Callers then regenerate only
+the missing ones.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_STRING = r'"((?:[^"\\]|\\.)*)"'
+_PAIR = re.compile(
+    r'"subject"\s*:\s*' + _STRING + r'\s*,\s*"body"\s*:\s*' + _STRING
+    + r'|"body"\s*:\s*' + _STRING + r'\s*,\s*"subject"\s*:\s*' + _STRING,
+    re.IGNORECASE
+)
+
+
+def _json_slice(text: str) -> str:
+    """The text from the first ``{`` or ``[`` on, without a surrounding code fence."""
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else ""
+
+
+def _close_truncated(text: str) -> str:
+    """
+    Cut output that stopped part way back to its last complete element and close
+    the open brackets. A half-written variant is dropped, not patched up.
+    """
+    stack = []  # [closer, start, end of last complete child]
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(["}" if char == "{" else "]", i, None])
+        elif char in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return text[:i + 1]
+            stack[-1][2] = i + 1
+    if not stack:
+        return text
+    if stack[-1][0] == "}" and len(stack) > 1:
+        text = text[:stack.pop()[1]]
+    closer, start, last_child_end = stack[-1]
+    text = text[:last_child_end or start + 1]
+    return text + "".join(closer for closer, _, _ in reversed(stack))
+
+
+def _decode(text: str) -> Optional[Any]:
+    """``json.loads`` that ignores prose after the value."""
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text)
+        return value
+    except ValueError:
+        return None
+
+
+def _variants_of(value: Any) -> List[Dict[str, str]]:
+    if isinstance(value, dict):
+        value = next((v for k, v in value.items() if isinstance(v, list) and k.lower() in ("variants", "emails")), [value])
+    if not isinstance(value, list):
+        return []
+    variants = []
+    for item in value:
+        if not isinstance(item, dict):
+            continue
+        item = {str(k).lower(): v for k, v in item.items()}
+        subject, body = item.get("subject"), item.get("body")
+        # A variant without both a subject and a body doesn't count
+        if isinstance(subject, str) and isinstance(body, str) and subject.strip() and body.strip():
+            variants.append({"subject": subject.strip(), "body": body.strip()})
+    return variants
+
+
+def _unescape(raw: str) -> str:
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def parse_variants(text: str, count: int) -> List[Dict[str, str]]:
+    """Up to ``count`` complete ``{"subject", "body"}`` variants found in ``text``; possibly none."""
+    candidate = _json_slice(text)
+    variants = _variants_of(_decode(candidate)) if candidate else []
+    if len(variants) < count and candidate:
+        repaired = _variants_of(_decode(_close_truncated(_TRAILING_COMMA.sub(r"\1", candidate))))
+        if len(repaired) > len(variants):
+            variants = repaired
+    if len(variants) < count:
+        scanned = []
+        for match in _PAIR.finditer(text):
+            subject, body = (match.group(1), match.group(2)) if match.group(1) is not None else (match.group(4), match.group(3))
+            if subject.strip() and body.strip():
+                scanned.append({"subject": _unescape(subject).strip(), "body": _unescape(body).strip()})
+        if len(scanned) > len(variants):
+            variants = scanned
+    return variants[:count]
@@ -0,0 +1,214 @@
+"""
+Precompiled follow-up templates.
+
+Templates use ``str.format`` placeholders but are parsed once into a tuple of
+literal/field pieces, so rendering is a single join with no re-parsing.
+Built-in templates are compiled at import time; per-user templates (the
+``followup_templates`` table) override built-ins per tone and variant index
+and are cached per user until edited.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.invalidation import invalidation_bus
+from ..models.followup_template import FollowUpTemplate
+from ..schemas.followup_suggestion import FollowUpTone, FollowUpSuggestionBase
+
+TEMPLATE_FIELDS = frozenset({"name", "first_name", "company", "context", "deadline", "user_name"})
+SUBJECT_CONTEXT_CHARS = 50
+
+BUILTIN_TEMPLATES: Dict[FollowUpTone, List[Tuple[str, str]]] = {
+    FollowUpTone.POLITE: [
+        (
+            "Following up on our recent conversation",
+            "Dear {name},\n\nI hope this message finds you well. I'm following up on our recent conversation about {context}. I wanted to check if you had any questions or if there's anything else I can assist you with.\n\nBest regards,\n{user_name}",
+        ),
+        (
+            "Just checking in",
+            "Hello {name},\n\nI wanted to follow up regarding {context}. Please let me know if you've had a chance to review the information I sent. I'm happy to provide any additional details you might need.\n\nBest regards,\n{user_name}",
+        ),
+        (
+            "Reconnecting regarding your interest",
+            "Hi {name},\n\nI hope you're doing well. I'm reaching out to see if you've had any thoughts about {context} since we last spoke. I'm here to help with any questions you might have.\n\nKind regards,\n{user_name}",
+        ),
+    ],
+    FollowUpTone.ASSERTIVE: [
+        (
+            "Action required: Follow-up on our discussion",
+            "{name},\n\nI'm following up on our discussion about {context}. To move forward, I'll need your response by {deadline}. Please let me know if you have any questions.\n\nRegards,\n{user_name}",
+        ),
+        (
+            "Time-sensitive: Need your input",
+            "{name},\n\nThis is a follow-up regarding {context}. I need to hear back from you by {deadline} to proceed. Let me know if you need any clarification.\n\nBest,\n{user_name}",
+        ),
+        (
+            "Following up: Next steps",
+            "{name},\n\nI'm reaching out again about {context}. Your input is needed to take the next steps. Please respond by {deadline}.\n\nThanks,\n{user_name}",
+        ),
+    ],
+    FollowUpTone.FRIENDLY: [
+        (
+            "Hey {first_name}! Just checking in",
+            "Hey {first_name}!\n\nI was just thinking about our conversation about {context} and wanted to check in. How's it going? Let me know if you've had any thoughts or questions!\n\nCheers,\n{user_name}",
+        ),
+        (
+            "Following up on {context}",
+            "Hi {first_name}!\n\nHope you're having a great week! I wanted to follow up on {context}. Any updates on your end?\n\nBest,\n{user_name}",
+        ),
+        (
+            "Quick update on our conversation",
+            "{first_name}!\n\nQuick note to follow up about {context}. Let me know what you think when you get a chance!\n\nTalk soon,\n{user_name}",
+        ),
+    ],
+}
+
+
+class CompiledTemplate:
+    """A template parsed into alternating literal text and placeholder names."""
+
+    __slots__ = ("source", "_pieces")
+
+    def __init__(self, source: str):
+        pieces = []
+        for literal, field, format_spec, conversion in Formatter().parse(source):
+            if literal:
+                pieces.append((True, literal))
+            if field is None:
+                continue
+            if field not in TEMPLATE_FIELDS:
+                raise ValueError(f"Unknown placeholder {{{field}}}; allowed: {', '.join(sorted(TEMPLATE_FIELDS))}")
+            if format_spec or conversion:
+                raise ValueError(f"Format specs are not supported in {{{field}}}")
+            pieces.append((False, field))
+        self.source = source
+        self._pieces = tuple(pieces)
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(text if is_literal else values[text] for is_literal, text in self._pieces)
+
+
+TemplateSet = List[Tuple[CompiledTemplate, CompiledTemplate]]
+
+
+def compile_pair(subject: str, body: str) -> Tuple[CompiledTemplate, CompiledTemplate]:
+    return CompiledTemplate(subject), CompiledTemplate(body)
+
+
+_COMPILED_BUILTINS: Dict[FollowUpTone, TemplateSet] = {
+    tone: [compile_pair(subject, body) for subject, body in pairs]
+    for tone, pairs in BUILTIN_TEMPLATES.items()
+}
+
+
+def template_values(context: str, lead_info: Optional[Dict[str, Any]], deadline: str) -> Dict[str, str]:
+    lead_info = lead_info or {}
+    name = lead_info.get("contact_name") or "there"
+    return {
+        "name": name,
+        "first_name": name.split(" ")[0] if lead_info.get("contact_name") else "there",
+        "company": lead_info.get("company") or "your team",
+        "context": context,
+        "deadline": deadline,
+        "user_name": lead_info.get("user_name") or "Your FollowWise Team",
+    }
+
+
+def lead_context(lead) -> str:
+    """Default generation context for a lead when the caller supplies none."""
+    return f"""
+    Lead Name: {lead.contact_name}
+    Company: {lead.company or 'N/A'}
+    Last Interaction: {lead.last_email_snippet or 'No previous interaction'}
+    Notes: {lead.notes or 'No additional notes'}
+    """
+
+
+def default_deadline() -> str:
+    return (datetime.now() + timedelta(days=3)).strftime('%A, %B %d')
+
+
+def render_variants(
+    templates: TemplateSet,
+    tone: FollowUpTone,
+    context: str,
+    lead_info: Optional[Dict[str, Any]] = None,
+    deadline: Optional[str] = None
+) -> List[FollowUpSuggestionBase]:
+    values = template_values(context, lead_info, deadline or default_deadline())
+    # Subjects get a shortened context so they stay one line
+    subject_values = dict(values, context=context[:SUBJECT_CONTEXT_CHARS] + ('...' if len(context) > SUBJECT_CONTEXT_CHARS else ''))
+    return [
+        FollowUpSuggestionBase(
+            variant_index=i,
+            subject=subject.render(subject_values),
+            body=body.render(values),
+            tone=tone
+        )
+        for i, (subject, body) in enumerate(templates)
+    ]
+
+
+class TemplateRegistry:
+    """Compiled built-in templates plus an LRU cache of per-user overrides."""
+
+    def __init__(self, max_users: int = 1024):
+        self.max_users = max_users
+        self._user_cache: "OrderedDict[int, Dict[FollowUpTone, TemplateSet]]" = OrderedDict()
+        # Bumped per user on invalidation so a load that raced one is not cached
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        invalidation_bus.register("templates", self._evict)
+
+    def builtin(self, tone: FollowUpTone) -> TemplateSet:
+        return _COMPILED_BUILTINS.get(tone, _COMPILED_BUILTINS[FollowUpTone.POLITE])
+
+    def _load_user(self, db: Session, user_id: int) -> Dict[FollowUpTone, TemplateSet]:
+        overrides: Dict[FollowUpTone, TemplateSet] = {}
+        for row in db.query(FollowUpTemplate).filter(FollowUpTemplate.user_id == user_id):
+            tone = FollowUpTone(row.tone)
+            templates = overrides.setdefault(tone, list(self.builtin(tone)))
+            if 0 <= row.variant_index < len(templates):
+                templates[row.variant_index] = compile_pair(row.subject, row.body)
+        return overrides
+
+    def for_user(self, db: Session, user_id: int, tone: FollowUpTone) -> TemplateSet:
+        with self._lock:
+            overrides = self._user_cache.get(user_id)
+            if overrides is not None:
+                self._user_cache.move_to_end(user_id)
+            generation = self._generations.get(user_id, 0)
+        if overrides is None:
+            overrides = self._load_user(db, user_id)
+            with self._lock:
+                if self._generations.get(user_id, 0) == generation:
+                    self._user_cache[user_id] = overrides
+                    while len(self._user_cache) > self.max_users:
+                        self._user_cache.popitem(last=False)
+        return overrides.get(tone) or self.builtin(tone)
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's cached templates in every worker."""
+        invalidation_bus.invalidate("templates", user_id)
+
+    def _evict(self, user_id: int) -> None:
+        with self._lock:
+            self._user_cache.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def render_batch(
+        self,
+        templates: TemplateSet,
+        tone: FollowUpTone,
+        leads: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[List[FollowUpSuggestionBase]]:
+        """Render variants for many (context, lead_info) pairs with one shared deadline."""
+        deadline = default_deadline()
+        return [render_variants(templates, tone, context, lead_info, deadline) for context, lead_info in leads]
+
+
+template_registry = TemplateRegistry()
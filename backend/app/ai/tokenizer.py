@@ -0,0 +1,74 @@
+"""
+Token counting for prompt budgets.
+
+Uses tiktoken's ``cl100k_base`` encoding when the package is installed and a
+word/punctuation approximation otherwise. The encoding is loaded once and
+counts are memoized, since the same notes and email bodies are measured on
+every generation for a lead. The memo is keyed by a digest of the text, so it
+does not keep thousands of email bodies alive.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional; the approximation is close enough for budgeting
+    tiktoken = None
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_COUNT_CACHE_SIZE = 4096
+
+_counts: "OrderedDict[bytes, int]" = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
+
+
+def _count_uncached(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_TOKEN_RE.findall(text))
+
+
+def count_tokens(text: str) -> int:
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _counts_lock:
+        count = _counts.get(key)
+        if count is not None:
+            _counts.move_to_end(key)
+            return count
+    count = _count_uncached(text)
+    with _counts_lock:
+        _counts[key] = count
+        if len(_counts) > _COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return count
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """
+    Cut text down to at most max_tokens tokens, marking the cut with an ellipsis.
+    With ``keep_end`` the start is cut instead, for text whose newest part is last.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if keep_end:
+            return "…" + encoding.decode(tokens[len(tokens) - (max_tokens - 1):])
+        return encoding.decode(tokens[:max_tokens - 1]) + "…"
+    matches = list(_TOKEN_RE.finditer(text))
+    if keep_end:
+        kept = matches[len(matches) - (max_tokens - 1):]
+        return "…" + (text[kept[0].start():] if kept else "")
+    return text[:matches[max_tokens - 1].start()].rstrip() + "…"
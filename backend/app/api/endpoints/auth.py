@@ -1,11 +1,11 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.db.base import get_db
 from app.models.user import User
-from app.schemas.user import Token, User as UserSchema, UserCreate
+from app.schemas.user import RefreshTokenRequest, Token, User as UserSchema, UserCreate
 # FIX: Added get_current_active_user to the imports below
 from app.core.security import (
     create_access_token, 
@@ -14,6 +14,8 @@ from app.core.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_active_user
 )
+from app.core.rate_limit import login_rate_limit
+from app.services.refresh_tokens import RefreshTokenService
 
 router = APIRouter()
 
@@ -34,7 +36,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     return db_user
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(login_rate_limit)])
 def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -47,11 +49,38 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    return _token_response(user.email, RefreshTokenService.issue(db, user.id, user.email))
+
+@router.post("/refresh", response_model=Token)
+def refresh(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    exchanged = RefreshTokenService.rotate(db, request.refresh_token)
+    if exchanged is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    email, refresh_token = exchanged
+    return _token_response(email, refresh_token)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Revoke the session of a refresh token"""
+    RefreshTokenService.revoke(db, request.refresh_token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+def _token_response(email: str, refresh_token: str) -> dict:
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": email}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": int(access_token_expires.total_seconds()),
+    }
 
 @router.get("/me", response_model=UserSchema)
 async def read_users_me(current_user: User = Depends(get_current_active_user)):
@@ -1,20 +1,40 @@
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import or_
 
 from app.db.base import get_db
+from app.db.sharding import get_user_db, shard_router
 from app.core.security import get_current_active_user
-from app.ai.providers import get_ai_provider, AIProvider
+from app.core.rate_limit import ai_admission, rate_limit
+from app.core.single_flight import SingleFlight
+from app.api.fieldsets import fieldset_options, parse_fields, project
+from app.ai.providers import get_ai_provider, AIProvider, AIProviderError
+from app.services.conversation_summary import ConversationSummaryService
+from app.services.followup_drafts import FollowUpDraftService, fresh_drafts
+from app.services.lead_changes import CHANGE_FEED_PAGE_SIZE, LeadChangeFeed
+from app.services.dedup_service import DEDUP_THRESHOLD, DedupService
+from app.services.idempotency import IdempotencyService, request_fingerprint
+from app.services.similarity_index import similarity_index
+from app.services.prefix_index import prefix_index
+from app.services.lead_counters import LeadCounterService
+from app.services.purge_service import PurgeService
 
 # Models
 from app.models.user import User
 from app.models.lead import Lead, LeadStatus, LeadSource
 from app.models.followup_suggestion import FollowUpSuggestion
 from app.models.sent_email_log import SentEmailLog
+from app.models.archived_lead import ArchivedLead
+from app.models.content_blob import ContentBlob, load_body
+from app.models.change_sequence import next_change_seq
 
 # Schemas
-from app.schemas.lead import Lead as LeadSchema, LeadCreate, LeadUpdate, LeadList, LeadStatus as LeadStatusEnum
+from app.schemas.lead import Lead as LeadSchema, LeadCreate, LeadUpdate, LeadList, LeadStatus as LeadStatusEnum, ArchivedLead as ArchivedLeadSchema, LeadChanges
+from app.schemas.lead import LeadBulkSelection, LeadBulkUpdate, LeadBulkResult, LeadDetail, LeadDuplicateGroup, LeadMergeRequest, LeadSimilar, LeadSuggestion
+from app.schemas.lead import LeadListItem, LEAD_LIST_FIELDS, LEAD_SUMMARY_FIELDS
+from app.schemas.sent_email import SentEmailListItem, SENT_EMAIL_LIST_FIELDS, SENT_EMAIL_SUMMARY_FIELDS
 from app.schemas.followup import (
     FollowUpSuggestion as FollowUpSuggestionSchema,
     FollowUpGenerateRequest,
@@ -27,42 +47,89 @@ from app.schemas.followup import (
 
 router = APIRouter()
 
+followup_flights = SingleFlight()
+
 # --- Leads CRUD Endpoints ---
 
-@router.get("/", response_model=List[LeadSchema])
+# Sort keys for the leads list; engagement columns are maintained on the lead itself
+LEAD_SORTS = {
+    "created_at": Lead.created_at,
+    "updated_at": Lead.updated_at,
+    "lead_score": Lead.lead_score,
+    "emails_sent_count": Lead.emails_sent_count,
+    "last_sent_at": Lead.last_sent_at,
+    "last_suggestion_at": Lead.last_suggestion_at,
+}
+
+@router.get("/", response_model=List[LeadListItem], response_model_exclude_unset=True)
 def read_leads(
     skip: int = 0,
     limit: int = 100,
     status: Optional[LeadStatusEnum] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    sort: Optional[str] = Query(None, description="Sort key, prefixed with - for descending: " + ", ".join(LEAD_SORTS)),
+    fields: Optional[str] = Query(None, description="Comma-separated fields; notes and last_email_snippet are left out unless requested"),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Retrieve leads with optional filtering and search
+    Retrieve leads with optional filtering, search, sorting and sparse fields
     """
-    query = db.query(Lead).filter(Lead.user_id == current_user.id)
+    names = parse_fields(fields, LEAD_LIST_FIELDS, LEAD_SUMMARY_FIELDS)
+    query = db.query(Lead)\
+        .options(*fieldset_options(Lead, names))\
+        .filter(Lead.user_id == current_user.id)
     
     if status:
         query = query.filter(Lead.status == status)
     
     if search:
-        search = f"%{search}%"
-        query = query.filter(
-            or_(
-                Lead.contact_name.ilike(search),
-                Lead.contact_email.ilike(search),
-                Lead.company.ilike(search),
-                Lead.notes.ilike(search)
-            )
-        )
+        query = query.filter(_search_filter(search))
+
+    if sort:
+        column = LEAD_SORTS.get(sort.lstrip("-"))
+        if column is None:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort.lstrip('-')}")
+        order = column.desc() if sort.startswith("-") else column.asc()
+        # Never-contacted leads go last either way; id keeps pages stable
+        query = query.order_by(order.nullslast(), Lead.id)
     
-    return query.offset(skip).limit(limit).all()
+    return project(query.offset(skip).limit(limit), names)
+
+def _search_filter(search: str):
+    search = f"%{search}%"
+    return or_(
+        Lead.contact_name.ilike(search),
+        Lead.contact_email.ilike(search),
+        Lead.company.ilike(search),
+        Lead.notes.ilike(search)
+    )
+
+def _bulk_conditions(selection: LeadBulkSelection, user_id: int) -> list:
+    """WHERE clauses for a bulk selection, always scoped to the user's own leads"""
+    conditions = [Lead.user_id == user_id]
+    if selection.ids is not None:
+        conditions.append(Lead.id.in_(selection.ids))
+        return conditions
+    criteria = selection.filter
+    if criteria.status is not None:
+        conditions.append(Lead.status == criteria.status)
+    if criteria.source is not None:
+        conditions.append(Lead.source == criteria.source)
+    if criteria.is_active is not None:
+        conditions.append(Lead.is_active == criteria.is_active)
+    if criteria.search:
+        conditions.append(_search_filter(criteria.search))
+    if criteria.next_followup_before is not None:
+        conditions.append(Lead.next_followup_at < criteria.next_followup_before)
+    if criteria.next_followup_after is not None:
+        conditions.append(Lead.next_followup_at >= criteria.next_followup_after)
+    return conditions
 
 @router.post("/", response_model=LeadSchema, status_code=status.HTTP_201_CREATED)
 def create_lead(
     lead: LeadCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -74,25 +141,210 @@ def create_lead(
     db.refresh(db_lead)
     return db_lead
 
-@router.get("/{lead_id}", response_model=LeadSchema)
+@router.patch("/", response_model=LeadBulkResult)
+def bulk_update_leads(
+    bulk: LeadBulkUpdate,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Apply the same update to many leads, selected by IDs or filter, in one statement
+    """
+    values = bulk.update.dict(exclude_unset=True)
+    if not values or bulk.ids == []:
+        return {"affected": 0}
+
+    values["updated_at"] = datetime.utcnow()
+    values["change_seq"] = next_change_seq(db, current_user.id)
+    affected = db.query(Lead)\
+        .filter(*_bulk_conditions(bulk, current_user.id))\
+        .update(values, synchronize_session=False)
+    db.commit()
+    return {"affected": affected}
+
+@router.delete("/", response_model=LeadBulkResult)
+def bulk_delete_leads(
+    selection: LeadBulkSelection,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Delete many leads, selected by IDs or filter, with their suggestions and sent emails
+    """
+    if selection.ids == []:
+        return {"affected": 0}
+
+    # Materialized once, so the children and the leads are deleted for the same set
+    lead_ids = [lead_id for (lead_id,) in db.query(Lead.id).filter(*_bulk_conditions(selection, current_user.id))]
+    if lead_ids:
+        PurgeService.delete_leads(db, lead_ids)
+        db.commit()
+    return {"affected": len(lead_ids)}
+
+@router.get("/archived", response_model=List[ArchivedLeadSchema])
+def read_archived_leads(
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Retrieve inactive leads that were moved to the archive
+    """
+    return db.query(ArchivedLead)\
+        .filter(ArchivedLead.user_id == current_user.id)\
+        .order_by(ArchivedLead.archived_at.desc())\
+        .offset(skip).limit(limit).all()
+
+@router.get("/changes", response_model=LeadChanges)
+def read_lead_changes(
+    since: Optional[str] = None,
+    limit: int = Query(CHANGE_FEED_PAGE_SIZE, ge=1, le=5000),
+    db: Session = Depends(get_user_db),
+    primary_db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Leads created, updated or deleted since a cursor from a previous call.
+    Omit ``since`` for a full sync; keep calling while ``has_more`` is true
+    """
+    shard_id = shard_router.shard_for_user(primary_db, current_user.id)
+    try:
+        return LeadChangeFeed.since(db, current_user.id, shard_id, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/duplicates", response_model=List[LeadDuplicateGroup])
+def read_duplicate_leads(
+    threshold: float = Query(DEDUP_THRESHOLD, ge=0.5, le=1.0),
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Groups of leads that look like the same contact, best matches first
+    """
+    return DedupService.find_duplicates(db, current_user.id, threshold)
+
+@router.post("/merge", response_model=LeadSchema)
+def merge_leads(
+    merge: LeadMergeRequest,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Merge duplicate leads into a primary lead, moving their sent emails and suggestions
+    """
+    lead = DedupService.merge(db, current_user.id, merge.primary_id, merge.duplicate_ids)
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    return lead
+
+@router.get("/suggest", response_model=List[LeadSuggestion])
+def suggest_leads(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(8, ge=1, le=50),
+    db: Session = Depends(get_user_db),
+    primary_db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Typeahead: leads whose name, email or company starts with what was typed
+    """
+    shard_id = shard_router.shard_for_user(primary_db, current_user.id)
+    return [
+        {"id": lead_id, "contact_name": name, "contact_email": email, "company": company}
+        for lead_id, (name, email, company) in prefix_index.suggest(db, current_user.id, shard_id, q, limit)
+    ]
+
+@router.get("/similar", response_model=List[LeadSimilar])
+def search_similar_leads(
+    q: str = Query(..., min_length=1, max_length=2000),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_user_db),
+    primary_db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Leads whose notes and email history read most like the given text
+    """
+    shard_id = shard_router.shard_for_user(primary_db, current_user.id)
+    return _similar_leads(db, similarity_index.search(db, current_user.id, shard_id, q, limit))
+
+def _similar_leads(db: Session, ranked: List[tuple]) -> List[dict]:
+    leads = {lead.id: lead for lead in db.query(Lead).filter(Lead.id.in_([lead_id for lead_id, _ in ranked]))}
+    return [{"lead": leads[lead_id], "score": score} for lead_id, score in ranked if lead_id in leads]
+
+LEAD_INCLUDES = ("followups", "sent_emails")
+
+@router.get("/{lead_id}", response_model=LeadDetail, response_model_exclude_unset=True)
 def read_lead(
     lead_id: int,
-    db: Session = Depends(get_db),
+    include: Optional[str] = Query(None, description="Comma-separated: followups, sent_emails"),
+    emails_skip: int = Query(0, ge=0),
+    emails_limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Get a specific lead by ID
+    Get a specific lead by ID, optionally with its follow-up suggestions and a
+    page of its sent emails (newest first) in the same response
     """
-    lead = db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == current_user.id).first()
+    includes = {name.strip() for name in include.split(",") if name.strip()} if include else set()
+    unknown = includes.difference(LEAD_INCLUDES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+
+    query = db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == current_user.id)
+    if "followups" in includes:
+        # Suggestions and their bodies arrive in one extra query
+        query = query.options(
+            selectinload(Lead.followup_suggestions)
+            .joinedload(FollowUpSuggestion.body_blob)
+            .undefer(ContentBlob.data)
+        )
+    lead = query.first()
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
-    return lead
+
+    detail = {}
+    if "followups" in includes:
+        # Pre-generated drafts made before the lead's latest change are left out
+        detail["followups"] = sorted(fresh_drafts(lead, lead.followup_suggestions), key=lambda s: s.variant_index)
+    if "sent_emails" in includes:
+        # A relationship loader cannot page, so the bounded page is its own query
+        emails = db.query(SentEmailLog)\
+            .options(joinedload(SentEmailLog.body_blob).undefer(ContentBlob.data))\
+            .filter(SentEmailLog.lead_id == lead_id)\
+            .order_by(SentEmailLog.sent_at.desc())\
+            .offset(emails_skip)\
+            .limit(emails_limit + 1)\
+            .all()
+        detail["sent_emails"] = emails[:emails_limit]
+        detail["sent_emails_has_more"] = len(emails) > emails_limit
+    return LeadDetail(**LeadSchema.from_orm(lead).dict(), **detail)
+
+@router.get("/{lead_id}/similar", response_model=List[LeadSimilar])
+def read_similar_leads(
+    lead_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_user_db),
+    primary_db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Leads most like this one, by notes, last email snippet and sent email subjects
+    """
+    shard_id = shard_router.shard_for_user(primary_db, current_user.id)
+    ranked = similarity_index.similar_to_lead(db, current_user.id, shard_id, lead_id, limit)
+    if ranked is None:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    return _similar_leads(db, ranked)
 
 @router.patch("/{lead_id}", response_model=LeadSchema)
 def update_lead(
     lead_id: int,
     lead_update: LeadUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -114,25 +366,26 @@ def update_lead(
 @router.delete("/{lead_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_lead(
     lead_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Delete a lead
     """
-    db_lead = db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == current_user.id).first()
+    db_lead = db.query(Lead.id).filter(Lead.id == lead_id, Lead.user_id == current_user.id).first()
     if not db_lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    db.delete(db_lead)
+    # Set-based: the lead's emails and suggestions are never loaded
+    PurgeService.delete_leads(db, [lead_id])
     db.commit()
-    return None
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 # --- Email Scanning Endpoints ---
 
-@router.post("/scan-inbox", status_code=status.HTTP_201_CREATED)
+@router.post("/scan-inbox", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("scan-inbox"))])
 async def scan_inbox(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -208,78 +461,96 @@ async def scan_inbox(
 @router.post(
     "/{lead_id}/generate-followups",
     response_model=FollowUpGenerateResponse,
-    status_code=status.HTTP_201_CREATED
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("generate-followups"))]
 )
 async def generate_followup_suggestions(
     lead_id: int,
     request: FollowUpGenerateRequest,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: Session = Depends(get_user_db),
+    primary_db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     ai_provider: AIProvider = Depends(get_ai_provider)
 ):
     """
-    Generate AI-powered follow-up email suggestions for a lead
-    """
-    # Verify lead exists and belongs to user
-    lead = db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == current_user.id).first()
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
-    
-    # Generate follow-up suggestions using AI provider
-    context = request.context or f"""
-    Lead Name: {lead.contact_name}
-    Company: {lead.company or 'N/A'}
-    Last Interaction: {lead.last_email_snippet or 'No previous interaction'}
-    Notes: {lead.notes or 'No additional notes'}
+    Generate AI-powered follow-up email suggestions for a lead.
+    Send an Idempotency-Key header to have retries replay the first response
     """
-    
-    # Get suggestions from AI provider
-    # Generate suggestions (provider returns Pydantic models)
-    suggestions_data = await ai_provider.generate_followup_variants(
-        context=context,
-        tone=request.tone,
-        lead_info={
-            'contact_name': lead.contact_name,
-            'user_name': current_user.email if hasattr(current_user, 'email') else None
-        }
-    )
-    
-    # Delete any existing suggestions for this lead
-    db.query(FollowUpSuggestion).filter(FollowUpSuggestion.lead_id == lead_id).delete()
-    
-    # Save new suggestions
-    suggestions = []
-    for i, suggestion_data in enumerate(suggestions_data):
-        suggestion = FollowUpSuggestion(
-            lead_id=lead_id,
-            variant_index=i,
-            subject=suggestion_data.subject,
-            body=suggestion_data.body,
-            tone=request.tone.value
+    if idempotency_key:
+        fingerprint = request_fingerprint(f"generate-followups:{lead_id}", request)
+        replay = IdempotencyService.begin(db, current_user.id, idempotency_key, fingerprint)
+        if replay is not None:
+            return replay
+
+    # Identical concurrent requests (double clicks, tabs) share one generation and one write
+    flight_key = (current_user.id, lead_id, request.tone, request.context, request.template_only)
+    shard_id = shard_router.shard_for_user(primary_db, current_user.id)
+    user_id, user_name = current_user.id, current_user.email
+    try:
+        result = await followup_flights.run(
+            flight_key, lambda: _generate_and_store_followups(lead_id, request, shard_id, user_id, user_name, ai_provider)
         )
-        db.add(suggestion)
-        suggestions.append(suggestion)
-    
-    db.commit()
-    
-    # Convert database models to response schema
-    from app.schemas.followup import FollowUpSuggestionBase
-    suggestion_responses = [
-        FollowUpSuggestionBase(
-            variant_index=s.variant_index,
-            subject=s.subject,
-            body=s.body,
-            tone=s.tone
-        ) for s in suggestions
-    ]
-    
+    except Exception:
+        if idempotency_key:
+            IdempotencyService.release(db, current_user.id, idempotency_key)
+        raise
+
+    if idempotency_key:
+        IdempotencyService.complete(db, current_user.id, idempotency_key, status.HTTP_201_CREATED, result)
+    return result
+
+async def _generate_and_store_followups(
+    lead_id: int,
+    request: FollowUpGenerateRequest,
+    shard_id: int,
+    user_id: int,
+    user_name: Optional[str],
+    ai_provider: AIProvider
+) -> dict:
+    # The flight can outlive the request that started it, and with it the request's
+    # session, so it works in a session of its own
+    db = shard_router.session(shard_id)
+    try:
+        # Verify lead exists and belongs to user
+        lead = db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == user_id).first()
+        if not lead:
+            raise HTTPException(status_code=404, detail="Lead not found")
+
+        try:
+            suggestions = await FollowUpDraftService.generate(
+                db,
+                lead,
+                user_name=user_name,
+                tone=request.tone,
+                ai_provider=ai_provider,
+                slot=ai_admission.slot,
+                context=request.context,
+                template_only=request.template_only
+            )
+        except AIProviderError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+        # Convert database models to response schema
+        from app.schemas.followup import FollowUpSuggestionBase
+        suggestion_responses = [
+            FollowUpSuggestionBase(
+                variant_index=s.variant_index,
+                subject=s.subject,
+                body=s.body,
+                tone=s.tone
+            ) for s in suggestions
+        ]
+    finally:
+        db.close()
+
     # Return the generated suggestions
     return {"suggestions": suggestion_responses}
 
 @router.get("/{lead_id}/followups", response_model=List[FollowUpSuggestionSchema])
 def get_followup_suggestions(
     lead_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -290,10 +561,13 @@ def get_followup_suggestions(
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    return db.query(FollowUpSuggestion)\
+    suggestions = db.query(FollowUpSuggestion)\
+        .options(load_body(FollowUpSuggestion))\
         .filter(FollowUpSuggestion.lead_id == lead_id)\
         .order_by(FollowUpSuggestion.variant_index)\
         .all()
+    # Pre-generated drafts made before the lead's latest change are left out
+    return fresh_drafts(lead, suggestions)
 
 # --- Email Sending Endpoints ---
 
@@ -305,7 +579,7 @@ def get_followup_suggestions(
 def send_lead_email(
     lead_id: int,
     email_data: SentEmailCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -323,10 +597,13 @@ def send_lead_email(
         to_email=email_data.to_email,
         subject=email_data.subject,
         body=email_data.body,
-        provider=email_data.provider
+        provider=email_data.provider,
+        sent_at=datetime.utcnow()
     )
     
     db.add(sent_email)
+    ConversationSummaryService.record_email(db, lead_id, email_data.subject, email_data.body)
+    LeadCounterService.record_sent_email(db, current_user.id, lead_id, sent_email.sent_at)
     
     # Update the lead's last contact date
     lead.next_followup_at = None  # Reset follow-up reminder
@@ -336,25 +613,28 @@ def send_lead_email(
     
     return sent_email
 
-@router.get("/{lead_id}/sent-emails", response_model=List[SentEmailSchema])
+@router.get("/{lead_id}/sent-emails", response_model=List[SentEmailListItem], response_model_exclude_unset=True)
 def get_lead_sent_emails(
     lead_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description="Comma-separated fields; bodies are left out unless requested"),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Get all sent emails for a lead
+    Get all sent emails for a lead, without bodies unless ``fields`` includes body
     """
+    names = parse_fields(fields, SENT_EMAIL_LIST_FIELDS, SENT_EMAIL_SUMMARY_FIELDS)
     # Verify lead exists and belongs to user
-    lead = db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == current_user.id).first()
+    lead = db.query(Lead.id).filter(Lead.id == lead_id, Lead.user_id == current_user.id).first()
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    return db.query(SentEmailLog)\
+    emails = db.query(SentEmailLog)\
+        .options(*fieldset_options(SentEmailLog, names))\
         .filter(SentEmailLog.lead_id == lead_id)\
         .order_by(SentEmailLog.sent_at.desc())\
         .offset(skip)\
-        .limit(limit)\
-        .all()
\ No newline at end of file
+        .limit(limit)
+    return project(emails, names)
\ No newline at end of file
@@ -1,22 +1,93 @@
-from typing import List
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from app.db.base import get_db
+from app.api.fieldsets import fieldset_options, parse_fields, project
+from app.db.sharding import get_user_db
 from app.models.user import User
 from app.models.sent_email_log import SentEmailLog
-from app.schemas.sent_email import SentEmail as SentEmailSchema
+from app.models.archived_sent_email_log import ArchivedSentEmailLog
+from app.models.content_blob import load_body
+from app.schemas.sent_email import SentEmail as SentEmailSchema, ArchivedSentEmail as ArchivedSentEmailSchema
+from app.schemas.sent_email import SentEmailListItem, SENT_EMAIL_LIST_FIELDS, SENT_EMAIL_SUMMARY_FIELDS, TrackingLinks
+from app.services.tracking import click_url, pixel_url
 from app.core.security import get_current_active_user
 
 router = APIRouter()
 
-@router.get("/", response_model=List[SentEmailSchema])
+@router.get("/", response_model=List[SentEmailListItem], response_model_exclude_unset=True)
 def read_all_sent_emails(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description="Comma-separated fields; bodies are left out unless requested"),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    return db.query(SentEmailLog)\
+    """
+    Sent emails, newest first, without bodies unless ``fields`` includes body
+    """
+    names = parse_fields(fields, SENT_EMAIL_LIST_FIELDS, SENT_EMAIL_SUMMARY_FIELDS)
+    emails = db.query(SentEmailLog)\
+        .options(*fieldset_options(SentEmailLog, names))\
         .filter(SentEmailLog.user_id == current_user.id)\
         .order_by(SentEmailLog.sent_at.desc())\
-        .offset(skip).limit(limit).all()
\ No newline at end of file
+        .offset(skip).limit(limit).all()
+    return project(emails, names)
+
+@router.get("/archived", response_model=List[ArchivedSentEmailSchema])
+def read_archived_sent_emails(
+    skip: int = 0,
+    limit: int = 100,
+    lead_id: Optional[int] = None,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Sent emails moved to the archive (past retention or of archived leads)
+    """
+    query = db.query(ArchivedSentEmailLog)\
+        .options(load_body(ArchivedSentEmailLog))\
+        .filter(ArchivedSentEmailLog.user_id == current_user.id)
+    if lead_id is not None:
+        query = query.filter(ArchivedSentEmailLog.lead_id == lead_id)
+    return query.order_by(ArchivedSentEmailLog.sent_at.desc())\
+        .offset(skip).limit(limit).all()
+
+@router.get("/{email_id}", response_model=SentEmailSchema)
+def read_sent_email(
+    email_id: int,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    A sent email with its body
+    """
+    email = db.query(SentEmailLog)\
+        .options(load_body(SentEmailLog))\
+        .filter(SentEmailLog.id == email_id, SentEmailLog.user_id == current_user.id)\
+        .first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Sent email not found")
+    return email
+
+@router.get("/{email_id}/tracking-links", response_model=TrackingLinks)
+def read_tracking_links(
+    email_id: int,
+    url: List[str] = Query([], description="Link(s) in the email body to wrap in click tracking"),
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Open-tracking pixel URL for an email, and click-tracking URLs for its links
+    """
+    email = db.query(SentEmailLog.tracking_key)\
+        .filter(SentEmailLog.id == email_id, SentEmailLog.user_id == current_user.id)\
+        .first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Sent email not found")
+    if email.tracking_key is None:
+        # Sent before tracking keys existed and not yet migrated (python -m app.db.email_tracking migrate)
+        raise HTTPException(status_code=409, detail="Tracking is not available for this email")
+    return {
+        "pixel_url": pixel_url(current_user.id, email.tracking_key),
+        "links": {link: click_url(current_user.id, email.tracking_key, link) for link in url},
+    }
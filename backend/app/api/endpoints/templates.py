@@ -0,0 +1,122 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Path, Response, status
+from sqlalchemy.orm import Session
+
+from app.db.sharding import get_user_db
+from app.core.security import get_current_active_user
+from app.ai.templates import BUILTIN_TEMPLATES, compile_pair, lead_context, template_registry
+from app.models.user import User
+from app.models.lead import Lead
+from app.models.followup_template import FollowUpTemplate
+from app.schemas.followup import FollowUpTone
+from app.schemas.followup_template import (
+    FollowUpTemplate as FollowUpTemplateSchema,
+    FollowUpTemplateUpdate,
+    TemplateRenderRequest,
+    TemplateRenderResult
+)
+
+router = APIRouter()
+
+@router.get("/", response_model=List[FollowUpTemplateSchema])
+def read_templates(
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    List the current user's template overrides
+    """
+    return db.query(FollowUpTemplate)\
+        .filter(FollowUpTemplate.user_id == current_user.id)\
+        .order_by(FollowUpTemplate.tone, FollowUpTemplate.variant_index)\
+        .all()
+
+@router.get("/builtin")
+def read_builtin_templates():
+    """
+    Built-in templates, per tone, that user templates override by variant index
+    """
+    return {
+        tone.value: [{"variant_index": i, "subject": subject, "body": body} for i, (subject, body) in enumerate(pairs)]
+        for tone, pairs in BUILTIN_TEMPLATES.items()
+    }
+
+@router.put("/{tone}/{variant_index}", response_model=FollowUpTemplateSchema)
+def upsert_template(
+    tone: FollowUpTone,
+    template: FollowUpTemplateUpdate,
+    variant_index: int = Path(..., ge=0, le=2),
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Create or replace the user's template for one tone and variant
+    """
+    try:
+        compile_pair(template.subject, template.body)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    db_template = db.query(FollowUpTemplate).filter(
+        FollowUpTemplate.user_id == current_user.id,
+        FollowUpTemplate.tone == tone.value,
+        FollowUpTemplate.variant_index == variant_index
+    ).first()
+    if db_template is None:
+        db_template = FollowUpTemplate(user_id=current_user.id, tone=tone.value, variant_index=variant_index)
+        db.add(db_template)
+    db_template.subject = template.subject
+    db_template.body = template.body
+
+    db.commit()
+    db.refresh(db_template)
+    template_registry.invalidate(current_user.id)
+    return db_template
+
+@router.delete("/{tone}/{variant_index}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_template(
+    tone: FollowUpTone,
+    variant_index: int = Path(..., ge=0, le=2),
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Revert one tone and variant to the built-in template
+    """
+    deleted = db.query(FollowUpTemplate).filter(
+        FollowUpTemplate.user_id == current_user.id,
+        FollowUpTemplate.tone == tone.value,
+        FollowUpTemplate.variant_index == variant_index
+    ).delete(synchronize_session=False)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Template not found")
+    db.commit()
+    template_registry.invalidate(current_user.id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post("/render", response_model=List[TemplateRenderResult])
+def render_templates(
+    request: TemplateRenderRequest,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Render follow-up variants for many leads at once from the user's templates,
+    without calling the AI provider or storing suggestions
+    """
+    leads = db.query(Lead).filter(
+        Lead.user_id == current_user.id,
+        Lead.id.in_(request.lead_ids)
+    ).all()
+    templates = template_registry.for_user(db, current_user.id, request.tone)
+    rendered = template_registry.render_batch(templates, request.tone, [
+        (
+            request.context or lead_context(lead),
+            {'contact_name': lead.contact_name, 'company': lead.company, 'user_name': current_user.email}
+        )
+        for lead in leads
+    ])
+    return [
+        {"lead_id": lead.id, "suggestions": [dict(s.dict(), tone=request.tone) for s in suggestions]}
+        for lead, suggestions in zip(leads, rendered)
+    ]
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import RedirectResponse
+
+from app.services.tracking import CLICK, OPEN, PIXEL_GIF, tracking_buffer, verify_token
+
+router = APIRouter()
+
+# Every hit must reach us, not a cache
+_NO_STORE = {"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0", "Pragma": "no-cache"}
+
+@router.get("/open/{token}.gif", include_in_schema=False)
+async def track_open(token: str):
+    """
+    Tracking pixel; counts an open of the email the token was issued for
+    """
+    verified = verify_token(OPEN, token)
+    if verified is not None:
+        tracking_buffer.record(OPEN, *verified)
+    # Invalid tokens still get the image, so mail clients don't show a broken one
+    return Response(content=PIXEL_GIF, media_type="image/gif", headers=_NO_STORE)
+
+@router.get("/click/{token}", include_in_schema=False)
+async def track_click(token: str, url: str):
+    """
+    Click redirect; counts a click and sends the reader on to the signed URL
+    """
+    verified = verify_token(CLICK, token, url)
+    if verified is None or not url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=404, detail="Unknown link")
+    tracking_buffer.record(CLICK, *verified)
+    return RedirectResponse(url, status_code=302, headers=_NO_STORE)
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.db.base import get_db
+from app.services.purge_service import PurgeService
+from app.services.refresh_tokens import RefreshTokenService
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserUpdate
 from app.core.security import get_current_active_user
@@ -45,6 +47,9 @@ def update_user_me(
     if "password" in update_data:
         from app.core.security import get_password_hash
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+    # Refresh tokens issued under the old password or email must not outlive them
+    if "hashed_password" in update_data or update_data.get("email", current_user.email) != current_user.email:
+        RefreshTokenService.revoke_user(db, current_user.id)
     
     for field, value in update_data.items():
         setattr(current_user, field, value)
@@ -55,12 +60,15 @@ def update_user_me(
 
 @router.delete("/me", status_code=204)
 def delete_user_me(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Delete current user
+    Delete current user. The account is deactivated at once; its data is
+    purged in the background
     """
-    db.delete(current_user)
-    db.commit()
-    return None
+    PurgeService.schedule_user(db, current_user)
+    background_tasks.add_task(PurgeService.run_pending, [current_user.id])
+    # Returning None would send a "null" body with the 204
+    return Response(status_code=204)
@@ -0,0 +1,44 @@
+"""
+Sparse fieldsets for list endpoints.
+
+``?fields=id,subject,sent_at`` selects the attributes a client wants;
+``fieldset_options`` turns them into ``load_only`` so the database never ships
+the other columns, and ``project`` returns rows as dicts of just those keys
+(serialize with ``response_model_exclude_unset=True``). Without ``fields``
+lists return their summary fields, which leave out large text columns;
+request those explicitly or read them from the detail endpoint.
+"""
+from typing import Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import load_only
+
+from app.models.content_blob import StoredBodyMixin, load_body
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], default: Sequence[str]) -> List[str]:
+    if not fields:
+        return list(default)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown field: {', '.join(unknown)}")
+    # id is always returned so rows stay addressable
+    return ["id"] + [name for name in dict.fromkeys(requested) if name != "id"]
+
+
+def fieldset_options(model, names: Iterable[str]) -> list:
+    """Loader options fetching only the columns behind ``names``."""
+    columns, options = [], []
+    for name in names:
+        if name == "body" and issubclass(model, StoredBodyMixin):
+            # Stored bodies live in content_blobs; the inline column only serves legacy rows
+            columns += [model.body_text, model.body_hash]
+            options.append(load_body(model))
+        else:
+            columns.append(getattr(model, name))
+    return [load_only(*columns)] + options
+
+
+def project(rows: Iterable, names: Sequence[str]) -> List[dict]:
+    return [{name: getattr(row, name) for name in names} for row in rows]
@@ -0,0 +1,117 @@
+"""
+Cross-process cache invalidation for multi-worker deployments.
+
+Each worker binds a Unix datagram socket in ``INVALIDATION_BUS_DIR`` (set by
+``python -m app.serve``). ``invalidation_bus.invalidate(channel, key)`` runs the
+channel's handler locally and sends one datagram to every other worker's
+socket, whose receiver thread runs the same handler there. Without a bus
+directory (a single ``uvicorn`` process) invalidation is local only.
+
+Other processes (e.g. ``python -m app.db.sharding move``) run with the same
+``INVALIDATION_BUS_DIR`` publish to the workers without binding a socket.
+
+Delivery is best effort: a datagram to a worker that is restarting is lost, so
+caches behind the bus should also bound their staleness (size or TTL).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_BUS_DIR = os.getenv("INVALIDATION_BUS_DIR")
+SOCKET_PREFIX = "worker-"
+MAX_MESSAGE_BYTES = 4096
+
+
+class InvalidationBus:
+    def __init__(self, directory: Optional[str] = INVALIDATION_BUS_DIR):
+        self.directory = directory
+        self.counters: Counter = Counter()
+        self._handlers: Dict[str, Callable[[Any], None]] = {}
+        self._socket: Optional[socket.socket] = None  # bound, receive only
+        self._sender: Optional[socket.socket] = None  # unbound, non-blocking
+        self._path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def register(self, channel: str, handler: Callable[[Any], None]) -> None:
+        """Handler evicting ``key`` from a local cache; runs in whichever worker receives the message."""
+        self._handlers[channel] = handler
+
+    def invalidate(self, channel: str, key: Any) -> None:
+        self._handle(channel, key)
+        if self.directory:
+            self._broadcast(json.dumps({"c": channel, "k": key}).encode("utf-8"))
+
+    def start(self) -> None:
+        """Bind this worker's socket and start receiving. Call after fork, once per worker."""
+        if not self.directory or self._socket is not None:
+            return
+        self._path = os.path.join(self.directory, f"{SOCKET_PREFIX}{os.getpid()}.sock")
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self._path)
+        threading.Thread(target=self._receive, args=(self._socket,), name="invalidation-bus", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._socket is None:
+            return
+        self._socket.close()
+        self._socket = None
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+    def peers(self) -> List[str]:
+        return [
+            entry.path for entry in os.scandir(self.directory)
+            if entry.name.startswith(SOCKET_PREFIX) and entry.path != self._path
+        ]
+
+    def _broadcast(self, payload: bytes) -> None:
+        with self._lock:
+            if self._sender is None:
+                self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                # A stalled worker with a full queue must not block requests in this one
+                self._sender.setblocking(False)
+            sender = self._sender
+        for path in self.peers():
+            try:
+                sender.sendto(payload, path)
+                self.counters["sent"] += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket file left behind by a dead worker
+                self.counters["dead_peers"] += 1
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except OSError:
+                self.counters["send_errors"] += 1
+
+    def _receive(self, sock: socket.socket) -> None:
+        while True:
+            try:
+                payload = sock.recv(MAX_MESSAGE_BYTES)
+            except OSError:
+                return  # socket closed by stop()
+            try:
+                message = json.loads(payload)
+                self._handle(message["c"], message["k"])
+                self.counters["received"] += 1
+            except Exception:
+                logger.exception("Bad invalidation message")
+
+    def _handle(self, channel: str, key: Any) -> None:
+        handler = self._handlers.get(channel)
+        if handler is not None:
+            handler(key)
+
+
+invalidation_bus = InvalidationBus()
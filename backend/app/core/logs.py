@@ -0,0 +1,248 @@
+"""
+Non-blocking logging.
+
+``setup_logging()`` points the root logger at a ``QueueHandler``: a request
+only appends the record to an in-memory queue, and a ``QueueListener`` thread
+formats it and writes it to stderr. Formatting is lazy, so a record's
+``msg % args`` is only built in the listener thread. Records are structured
+JSON (``LOG_FORMAT=json``, the default) or plain text. Each record carries the
+``X-Request-ID`` of the request that logged it.
+
+Hot loggers can be sampled below WARNING with
+``LOG_SAMPLE_RATES=app.ai.providers=0.1,app.integrations.gmail=0.1``. A
+logger's rate also applies to its children. When the queue is full
+(``LOG_QUEUE_SIZE``), records are dropped instead of blocking. Drop counts
+are reported by ``log_stats()``.
+
+    python -m app.core.logs bench   # request latency while logging floods a slow sink
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "app.ai.providers=0.1,app.integrations.gmail=0.1")
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_counters: Counter = Counter()
+_listener: Optional[QueueListener] = None
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            rates[name] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps the current request's ID; runs in the logging thread, before the queue."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of a logger's records below WARNING."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            # Nearest configured ancestor: "app.ai" covers "app.ai.providers"
+            parts = name.split(".")
+            self._resolved[name] = next(
+                (self.rates[".".join(parts[:i])] for i in range(len(parts), 0, -1) if ".".join(parts[:i]) in self.rates),
+                None
+            )
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or random.random() < rate:
+            return True
+        _counters["sampled_out"] += 1
+        return False
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting them. Never blocks: a full queue
+    drops the record.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks must be rendered while the frames are still current
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            _counters["enqueued"] += 1
+        except queue.Full:
+            _counters["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    if fmt == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+
+def setup_logging(
+    stream=None,
+    fmt: str = LOG_FORMAT,
+    level: str = LOG_LEVEL,
+    sample_rates: str = LOG_SAMPLE_RATES
+) -> QueueListener:
+    """Route the root logger through the queue. Call once per process, after fork."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    sink = logging.StreamHandler(stream or sys.stderr)
+    sink.setFormatter(_formatter(fmt))
+
+    handler = LazyQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(parse_sample_rates(sample_rates)))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(handler.queue, sink, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_stats() -> Dict[str, int]:
+    return dict(_counters)
+
+
+class _SlowStream:
+    """A sink that stalls on every write, like a blocked pipe or a slow terminal."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str) -> None:
+        time.sleep(self.delay)
+
+    def flush(self) -> None:
+        pass
+
+
+def _percentiles(samples: List[float]) -> str:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return f"p50 {pick(0.5):.3f} ms, p99 {pick(0.99):.3f} ms, max {samples[-1] * 1000:.3f} ms"
+
+
+def bench(requests: int = 500, lines_per_request: int = 5, flood_threads: int = 4, sink_delay: float = 0.0005) -> None:
+    """Time a request that logs while other threads flood the log, direct vs queued."""
+    logger = logging.getLogger("bench.request")
+    flood = logging.getLogger("bench.flood")
+
+    def run(label: str) -> None:
+        stop = threading.Event()
+
+        def flooder():
+            while not stop.is_set():
+                flood.info("background event %d for %s", random.randint(0, 10 ** 6), "lead")
+
+        threads = [threading.Thread(target=flooder, daemon=True) for _ in range(flood_threads)]
+        for thread in threads:
+            thread.start()
+        timings = []
+        for i in range(requests):
+            token = request_id_var.set(new_request_id())
+            start = time.perf_counter()
+            for line in range(lines_per_request):
+                logger.info("handled step %d of request %d", line, i)
+            timings.append(time.perf_counter() - start)
+            request_id_var.reset(token)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"{label:>7}: {_percentiles(timings)}")
+
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    try:
+        direct = logging.StreamHandler(_SlowStream(sink_delay))
+        direct.setFormatter(JsonFormatter())
+        direct.addFilter(RequestIdFilter())
+        root.handlers[:] = [direct]
+        root.setLevel(logging.INFO)
+        run("direct")
+
+        setup_logging(stream=_SlowStream(sink_delay), sample_rates="bench.flood=0.01")
+        run("queued")
+        shutdown_logging()
+        print(f"pipeline: {log_stats()}")
+    finally:
+        root.handlers[:], level = saved
+        root.setLevel(level)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["bench"]:
+        sys.exit("usage: python -m app.core.logs bench")
+    bench()
@@ -0,0 +1,105 @@
+"""
+Process metrics, aggregated across workers.
+
+Modules register a callable returning a (possibly nested) dict of numbers.
+Under ``python -m app.serve`` every worker writes its snapshot to
+``<INVALIDATION_BUS_DIR>/metrics-<pid>.json`` every ``METRICS_FLUSH_SECONDS``;
+``aggregate()`` sums the snapshots of all live workers, so any worker can
+answer for the whole server.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from app.core.invalidation import INVALIDATION_BUS_DIR
+
+logger = logging.getLogger(__name__)
+
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_PREFIX = "metrics-"
+
+
+def _merge(total: Dict[str, Any], snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in snapshot.items():
+        if isinstance(value, dict):
+            total[key] = _merge(total.get(key) or {}, value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, directory: str = INVALIDATION_BUS_DIR):
+        self.directory = directory
+        self._sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._started = False
+
+    def register(self, name: str, source: Callable[[], Dict[str, Any]]) -> None:
+        self._sources[name] = source
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: source() for name, source in self._sources.items()}
+
+    def start(self) -> None:
+        """Start publishing this worker's snapshot. Call after fork, once per worker."""
+        if not self.directory or self._started:
+            return
+        self._started = True
+        threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True).start()
+
+    def _flush_periodically(self) -> None:
+        path = os.path.join(self.directory, f"{METRICS_PREFIX}{os.getpid()}.json")
+        while True:
+            try:
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(tmp, path)  # readers never see a half-written file
+            except Exception:
+                logger.exception("Could not write metrics snapshot")
+            time.sleep(METRICS_FLUSH_SECONDS)
+
+    def _worker_snapshots(self) -> List[Dict[str, Any]]:
+        snapshots = []
+        own_pid = os.getpid()
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith(METRICS_PREFIX) and entry.name.endswith(".json")):
+                continue
+            pid = int(entry.name[len(METRICS_PREFIX):-len(".json")])
+            if pid == own_pid:
+                continue
+            if not _alive(pid):
+                os.unlink(entry.path)
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def aggregate(self) -> Dict[str, Any]:
+        """Totals across all live workers (this one read live, the others as of their last flush)."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            snapshots += self._worker_snapshots()
+        total: Dict[str, Any] = {}
+        for snapshot in snapshots:
+            _merge(total, snapshot)
+        return {"workers": len(snapshots), "totals": total}
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,204 @@
+"""
+Per-user rate limiting and admission control for expensive endpoints.
+
+``RateLimiter`` keeps a token bucket per (route, key): ``rate_limit(route, ...)``
+returns a dependency that spends one token per request and answers 429 with
+``Retry-After`` once the bucket is empty. Buckets live in process memory by
+default; set ``RATE_LIMIT_REDIS_URL`` (requires the ``redis`` package) to share
+them between worker processes.
+
+``AdmissionController`` bounds concurrent AI generations. Requests beyond
+``AI_MAX_CONCURRENCY`` wait their turn, but once ``AI_MAX_QUEUE_DEPTH`` are
+already waiting new ones are shed immediately with 429 instead of piling up.
+
+Rejections of both kinds are counted per route and served by
+``GET /api/health/limits``.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from app.core.security import get_current_active_user
+from app.models.user import User
+
+try:
+    import redis
+except ImportError:  # optional; only needed for a shared backend
+    redis = None
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+AI_MAX_QUEUE_DEPTH = int(os.getenv("AI_MAX_QUEUE_DEPTH", "32"))
+AI_RETRY_AFTER_SECONDS = int(os.getenv("AI_RETRY_AFTER_SECONDS", "5"))
+
+
+def _limit(name: str, default: str) -> Tuple[float, int]:
+    """Parse ``<requests>/<seconds>`` from the environment into (tokens per second, burst)."""
+    requests, seconds = os.getenv(name, default).split("/")
+    return int(requests) / float(seconds), int(requests)
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        """Take one token from ``key``'s bucket. Returns 0 if allowed, else seconds until a token frees up."""
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Buckets in a bounded LRU dict; per process."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            # Evicting the least recently used bucket only forgets a partly used allowance
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+_REDIS_TOKEN_BUCKET = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or ARGV[3])
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """Buckets in Redis, updated atomically by a Lua script, shared by all workers."""
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        return float(self._script(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()]))
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self.rejections: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def check(self, route: str, key: str, rate: float, burst: int) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        wait = self.backend.acquire(f"{route}:{key}", rate, burst)
+        if wait > 0:
+            with self._lock:
+                self.rejections[route] += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+
+class AdmissionController:
+    """A concurrency limit with a bounded wait queue; excess requests are shed, not queued."""
+
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, max_queue_depth: int = AI_MAX_QUEUE_DEPTH):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejections = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            # Created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore.locked() and self.waiting >= self.max_queue_depth:
+            self.rejections += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="AI generation is at capacity, please retry shortly",
+                headers={"Retry-After": str(AI_RETRY_AFTER_SECONDS)}
+            )
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+rate_limiter = RateLimiter(RedisBackend(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else InMemoryBackend())
+ai_admission = AdmissionController()
+
+LIMITS: Dict[str, Tuple[float, int]] = {
+    "generate-followups": _limit("RATE_LIMIT_GENERATE", "10/60"),
+    "scan-inbox": _limit("RATE_LIMIT_SCAN_INBOX", "5/300"),
+    "login": _limit("RATE_LIMIT_LOGIN", "10/300"),
+}
+
+
+def rate_limit(route: str) -> Callable:
+    """Dependency limiting the current user on ``route`` to its configured rate."""
+    rate, burst = LIMITS[route]
+
+    def dependency(current_user: User = Depends(get_current_active_user)) -> None:
+        rate_limiter.check(route, str(current_user.id), rate, burst)
+
+    return dependency
+
+
+def login_rate_limit(request: Request, form_data: OAuth2PasswordRequestForm = Depends()) -> None:
+    """Login has no user yet, so it is limited per submitted account and per client address."""
+    rate, burst = LIMITS["login"]
+    rate_limiter.check("login", f"user:{form_data.username.lower()}", rate, burst)
+    if request.client is not None:
+        # Spraying many accounts from one address gets a looser, separate bucket
+        rate_limiter.check("login", f"ip:{request.client.host}", rate * 5, burst * 5)
+
+
+def limits_status() -> Dict[str, object]:
+    return {
+        "rate_limit_rejections": dict(rate_limiter.rejections),
+        "ai_admission": {
+            "in_flight": ai_admission.in_flight,
+            "waiting": ai_admission.waiting,
+            "max_concurrency": ai_admission.max_concurrency,
+            "max_queue_depth": ai_admission.max_queue_depth,
+            "rejections": ai_admission.rejections,
+        },
+    }
@@ -0,0 +1,39 @@
+"""
+Coalescing of identical concurrent async calls.
+
+``SingleFlight.run(key, fn)`` starts ``fn()`` for the first caller of a key;
+callers arriving while it is still running await the same result (or
+exception) instead of starting their own. The call runs as its own task, so a
+leader whose request is cancelled does not take its followers down with it.
+Coalescing is per process; retries that land on another worker are covered by
+idempotency keys (``app.services.idempotency``).
+"""
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self.counters: Counter = Counter()
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["executed"] += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()  # mark retrieved so an unawaited failure is not logged as lost
+
+    def in_flight(self) -> int:
+        return len(self._calls)
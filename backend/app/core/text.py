@@ -0,0 +1,14 @@
+"""
+Text normalization shared by lead matching and search.
+"""
+import re
+import unicodedata
+from typing import Optional
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Lowercase ASCII words of ``text``: accents stripped, punctuation turned into single spaces."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(_NON_WORD.sub(" ", text).split())
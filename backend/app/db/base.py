@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from typing import Dict
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,9 +10,29 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./followwise.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite leaves foreign keys, and so ON DELETE CASCADE, off unless asked per connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def make_engine(url: str):
+    """Create an engine, applying the SQLite-only connect args and pragmas where needed."""
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    new_engine = create_engine(url, connect_args=connect_args)
+    if url.startswith("sqlite"):
+        event.listen(new_engine, "connect", _enable_sqlite_foreign_keys)
+    return new_engine
+
+def add_missing_columns(engine, table: str, columns: Dict[str, str]) -> None:
+    """Migration helper: ``ALTER TABLE ... ADD COLUMN`` each of ``columns`` (name -> DDL) the table lacks."""
+    existing = {col["name"] for col in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        for name, ddl in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
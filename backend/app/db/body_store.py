@@ -0,0 +1,124 @@
+"""
+Maintenance for the content-addressed body store (``app.models.content_blob``).
+
+    python -m app.db.body_store migrate   # add body_hash columns, back-fill blobs
+    python -m app.db.body_store report    # bytes saved by dedup + compression
+    python -m app.db.body_store gc        # drop blobs no row points at any more
+
+All commands run against every shard.
+"""
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import LargeBinary, cast, func, inspect, select, text, union
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
+
+from app.db.base import Base
+from app.models.content_blob import BODY_GC_GRACE_SECONDS, ContentBlob
+from app.models.sent_email_log import SentEmailLog
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.models.archived_sent_email_log import ArchivedSentEmailLog
+
+BODY_MODELS = (SentEmailLog, FollowUpSuggestion, ArchivedSentEmailLog)
+
+
+def ensure_schema(engine) -> None:
+    """Create content_blobs and add body_hash to tables created before the body store existed."""
+    Base.metadata.create_all(bind=engine, tables=[ContentBlob.__table__] + [m.__table__ for m in BODY_MODELS])
+    inspector = inspect(engine)
+    for model in BODY_MODELS:
+        table = model.__table__.name
+        if "body_hash" in {col["name"] for col in inspector.get_columns(table)}:
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN body_hash VARCHAR(64) REFERENCES content_blobs(hash)"))
+            conn.execute(text(f"CREATE INDEX ix_{table}_body_hash ON {table} (body_hash)"))
+
+
+def backfill(db: Session, chunk_size: int = 500) -> Dict[str, int]:
+    """Move inline bodies into the store, one committed chunk at a time."""
+    inline_bytes = 0
+    rows = 0
+    for model in BODY_MODELS:
+        while True:
+            chunk = db.query(model)\
+                .filter(model.body_hash.is_(None), model.body_text != "")\
+                .limit(chunk_size).all()
+            if not chunk:
+                break
+            for row in chunk:
+                inline_bytes += len(row.body_text.encode("utf-8"))
+                # Marking the body dirty lets the before_flush hook intern it
+                flag_modified(row, "body_text")
+            rows += len(chunk)
+            db.commit()
+    return {"rows": rows, "inline_bytes": inline_bytes}
+
+
+def _byte_length(db: Session, column):
+    # length() counts characters on text columns; bodies are measured in UTF-8 bytes
+    if db.get_bind().dialect.name == "sqlite":
+        return func.length(cast(column, LargeBinary))
+    return func.octet_length(column)
+
+
+def report(db: Session) -> Dict[str, int]:
+    """Logical body bytes referenced by rows versus bytes actually stored."""
+    referenced = 0  # uncompressed size of blob-backed bodies, once per row
+    inline = 0
+    for model in BODY_MODELS:
+        referenced += db.query(func.coalesce(func.sum(ContentBlob.size), 0))\
+            .select_from(model)\
+            .join(ContentBlob, model.body_hash == ContentBlob.hash)\
+            .scalar()
+        inline += db.query(func.coalesce(func.sum(_byte_length(db, model.body_text)), 0)).scalar()
+    blobs, blob_bytes = db.query(
+        func.count(ContentBlob.hash), func.coalesce(func.sum(func.length(ContentBlob.data)), 0)
+    ).one()
+    logical = referenced + inline
+    stored = blob_bytes + inline
+    return {"blobs": blobs, "logical_bytes": logical, "stored_bytes": stored, "bytes_saved": logical - stored}
+
+
+def collect_garbage(db: Session) -> int:
+    """
+    Delete blobs that no longer back any row (e.g. after purges or regenerations).
+    Blobs stored or reused within ``BODY_GC_GRACE_SECONDS`` are kept: a writer may
+    have matched one by hash and not committed the row pointing at it yet.
+    """
+    referenced = union(*[select(model.body_hash).where(model.body_hash.isnot(None)) for model in BODY_MODELS])
+    cutoff = datetime.utcnow() - timedelta(seconds=BODY_GC_GRACE_SECONDS)
+    deleted = db.query(ContentBlob)\
+        .filter(ContentBlob.created_at < cutoff, ContentBlob.hash.notin_(referenced))\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain the deduplicated body store")
+    parser.add_argument("command", choices=["migrate", "report", "gc"])
+    args = parser.parse_args(argv)
+
+    from app.db.sharding import shard_router
+
+    for shard_id, engine in enumerate(shard_router.engines):
+        if args.command == "migrate":
+            ensure_schema(engine)
+        db = shard_router.session(shard_id)
+        try:
+            if args.command == "migrate":
+                print(f"shard {shard_id}: back-filled {backfill(db)}")
+            if args.command == "gc":
+                print(f"shard {shard_id}: removed {collect_garbage(db)} unreferenced blobs")
+            stats = report(db)
+            print(f"shard {shard_id}: {stats['blobs']} blobs, {stats['logical_bytes']} bytes of bodies "
+                  f"stored in {stats['stored_bytes']} bytes ({stats['bytes_saved']} saved)")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
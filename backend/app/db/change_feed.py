@@ -0,0 +1,87 @@
+"""
+Schema migration for lead delta sync (``app.services.lead_changes``).
+
+    python -m app.db.change_feed migrate   # add leads.change_seq, stamp existing leads
+
+Runs against every shard. Existing leads all get one sequence number, so the
+first delta sync after migrating is equivalent to a full sync. A shard-wide
+``change_sequences`` table from before the counters were kept per user is
+split into one row per user, seeded with the shard's values so existing
+cursors stay valid.
+"""
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.models.lead import Lead
+from app.models.lead_tombstone import LeadTombstone
+from app.models.change_sequence import ChangeSequence, next_change_seqs
+
+
+def _split_shard_sequences(engine) -> None:
+    """Replace shard-wide counters with per-user ones starting from the same values."""
+    inspector = inspect(engine)
+    if "change_sequences" not in inspector.get_table_names():
+        return
+    if "user_id" in {col["name"] for col in inspector.get_columns("change_sequences")}:
+        return
+    with engine.begin() as conn:
+        values = dict(conn.execute(text("SELECT name, value FROM change_sequences")).fetchall())
+        users = [user_id for (user_id,) in conn.execute(text(
+            "SELECT user_id FROM leads UNION SELECT user_id FROM lead_tombstones"
+        ))]
+        conn.execute(text("DROP TABLE change_sequences"))
+        ChangeSequence.__table__.create(bind=conn)
+        if values and users:
+            conn.execute(
+                ChangeSequence.__table__.insert(),
+                [{"user_id": user_id, "name": name, "value": value} for user_id in users for name, value in values.items()]
+            )
+
+
+def ensure_schema(engine) -> None:
+    """Create the change-feed tables and add change_seq to a leads table that predates it."""
+    _split_shard_sequences(engine)
+    Base.metadata.create_all(bind=engine, tables=[ChangeSequence.__table__, LeadTombstone.__table__])
+    if "change_seq" in {col["name"] for col in inspect(engine).get_columns("leads")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE leads ADD COLUMN change_seq BIGINT"))
+        conn.execute(text("CREATE INDEX ix_leads_user_change_seq ON leads (user_id, change_seq)"))
+
+
+def backfill(db: Session) -> int:
+    """Stamp leads that have no change sequence yet. Returns leads stamped."""
+    owners = [user_id for (user_id,) in db.query(Lead.user_id).filter(Lead.change_seq.is_(None)).distinct()]
+    if not owners:
+        return 0
+    stamped = 0
+    for user_id, seq in next_change_seqs(db, owners).items():
+        stamped += db.query(Lead)\
+            .filter(Lead.user_id == user_id, Lead.change_seq.is_(None))\
+            .update({Lead.change_seq: seq}, synchronize_session=False)
+    db.commit()
+    return stamped
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Migrate shards for lead delta sync")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args(argv)
+
+    from app.db.sharding import shard_router
+
+    for shard_id, engine in enumerate(shard_router.engines):
+        ensure_schema(engine)
+        db = shard_router.session(shard_id)
+        try:
+            print(f"shard {shard_id}: stamped {backfill(db)} leads")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Schema migration for open and click tracking (``app.services.tracking``).
+
+    python -m app.db.email_tracking migrate   # add email_events and the counter columns, issue tracking keys
+
+Runs against every shard. Emails sent before tracking keys existed get one,
+so tracking links can be generated for them.
+"""
+import argparse
+import secrets
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app.db.base import add_missing_columns
+from app.models.email_event import EmailEvent
+from app.models.sent_email_log import SentEmailLog
+
+_COLUMNS = {
+    "leads": {
+        "opens_count": "INTEGER NOT NULL DEFAULT 0",
+        "clicks_count": "INTEGER NOT NULL DEFAULT 0",
+        "last_opened_at": "TIMESTAMP",
+    },
+    "sent_email_logs": {
+        "opens_count": "INTEGER NOT NULL DEFAULT 0",
+        "clicks_count": "INTEGER NOT NULL DEFAULT 0",
+        "first_opened_at": "TIMESTAMP",
+        "tracking_key": "VARCHAR(24)",
+    },
+}
+
+
+def ensure_schema(engine) -> None:
+    """Create email_events and add the tracking columns to tables that predate them."""
+    EmailEvent.__table__.create(bind=engine, checkfirst=True)
+    for table, columns in _COLUMNS.items():
+        add_missing_columns(engine, table, columns)
+    if "ix_sent_email_logs_tracking_key" not in {index["name"] for index in inspect(engine).get_indexes("sent_email_logs")}:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE UNIQUE INDEX ix_sent_email_logs_tracking_key ON sent_email_logs (tracking_key)"))
+
+
+def fill_tracking_keys(db: Session, chunk_size: int = 1000) -> int:
+    """Give every sent email without a tracking key one. Returns emails updated."""
+    filled = 0
+    while True:
+        ids = [email_id for (email_id,) in db.query(SentEmailLog.id).filter(SentEmailLog.tracking_key.is_(None)).limit(chunk_size)]
+        if not ids:
+            return filled
+        db.bulk_update_mappings(SentEmailLog, [{"id": email_id, "tracking_key": secrets.token_urlsafe(12)} for email_id in ids])
+        db.commit()
+        filled += len(ids)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Migrate shards for open and click tracking")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args(argv)
+
+    from app.db.sharding import shard_router
+
+    for shard_id, engine in enumerate(shard_router.engines):
+        ensure_schema(engine)
+        db = shard_router.session(shard_id)
+        try:
+            print(f"shard {shard_id}: tracking keys for {fill_tracking_keys(db)} sent emails")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
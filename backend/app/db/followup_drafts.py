@@ -0,0 +1,38 @@
+"""
+Schema migration for pre-generated drafts (``app.services.followup_drafts``).
+
+    python -m app.db.followup_drafts migrate   # add followup_suggestions.origin and lead_fingerprint
+
+Runs against every shard. Existing suggestions have no origin, which counts
+as generated by the user, so pre-generation never replaces them.
+"""
+import argparse
+from typing import List, Optional
+
+from app.db.base import add_missing_columns
+
+_COLUMNS = {
+    "origin": "VARCHAR(16)",
+    "lead_fingerprint": "VARCHAR(64)",
+}
+
+
+def ensure_schema(engine) -> None:
+    """Add the draft bookkeeping columns to a followup_suggestions table that predates them."""
+    add_missing_columns(engine, "followup_suggestions", _COLUMNS)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Migrate shards for pre-generated drafts")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args(argv)
+
+    from app.db.sharding import shard_router
+
+    for shard_id, engine in enumerate(shard_router.engines):
+        ensure_schema(engine)
+        print(f"shard {shard_id}: draft columns present")
+
+
+if __name__ == "__main__":
+    main()
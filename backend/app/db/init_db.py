@@ -1,5 +1,4 @@
-from sqlalchemy import create_engine
-from app.db.base import Base
+from app.db.base import Base, make_engine
 
 # Import the models package to ensure model modules are loaded
 # which registers all models with SQLAlchemy metadata via app.models.__init__
@@ -16,13 +15,21 @@ def init_db():
     database_url = os.getenv("DATABASE_URL", "sqlite:///./followwise.db")
     
     # Create engine and tables
-    engine = create_engine(database_url, connect_args={"check_same_thread": False})
+    engine = make_engine(database_url)
     
     print(f"Creating database tables at: {database_url}")
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
     
+    # Shards hold the user-scoped tables; the primary shard reuses DATABASE_URL
+    from app.db.sharding import shard_router
+    for shard_id, shard_engine in enumerate(shard_router.engines):
+        if shard_router.is_primary(shard_id):
+            continue
+        print(f"Creating shard {shard_id} tables at: {shard_router.urls[shard_id]}")
+        Base.metadata.create_all(bind=shard_engine)
+    
     print("Database tables created successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+"""
+Schema migration for the denormalized lead counters (``app.services.lead_counters``).
+
+    python -m app.db.lead_counters migrate   # add the columns, then fill them from the logs
+
+Runs against every shard. Run ``python -m app.db.email_tracking migrate``
+first: filling the counters also recomputes open and click counts.
+"""
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+
+from app.db.base import add_missing_columns
+from app.services.lead_counters import LeadCounterService
+
+_COLUMNS = {
+    "emails_sent_count": "INTEGER NOT NULL DEFAULT 0",
+    "last_sent_at": "TIMESTAMP",
+    "last_suggestion_at": "TIMESTAMP",
+}
+_INDEXES = {
+    "ix_leads_user_last_sent_at": "(user_id, last_sent_at)",
+    "ix_leads_user_emails_sent_count": "(user_id, emails_sent_count)",
+}
+
+
+def ensure_schema(engine) -> None:
+    """Add the counter columns and their sort indexes to a leads table that predates them."""
+    add_missing_columns(engine, "leads", _COLUMNS)
+    indexes = {index["name"] for index in inspect(engine).get_indexes("leads")}
+    with engine.begin() as conn:
+        for name, columns in _INDEXES.items():
+            if name not in indexes:
+                conn.execute(text(f"CREATE INDEX {name} ON leads {columns}"))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Migrate shards for denormalized lead counters")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args(argv)
+
+    from app.db.sharding import shard_router
+
+    for shard_id, engine in enumerate(shard_router.engines):
+        ensure_schema(engine)
+        db = shard_router.session(shard_id)
+        try:
+            print(f"shard {shard_id}: filled counters for {LeadCounterService.reconcile(db)} leads")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
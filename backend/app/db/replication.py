@@ -0,0 +1,204 @@
+"""
+Read replicas for shard databases.
+
+Each shard may have replicas, configured through ``DATABASE_REPLICA_URLS``:
+shards are separated by ``;`` and replicas of one shard by ``,`` (in the same
+order as ``DATABASE_SHARD_URLS``, or just the primary database when unsharded).
+
+Lag is measured with a heartbeat row: a background loop (``beat_periodically``)
+bumps each primary's heartbeat every ``REPLICA_LAG_CHECK_SECONDS``, and requests
+read each replica's copy back at most that often, so the request path never
+writes. The lag is the age of the replica's copy, which overstates it by up to
+one interval. Replicas lagging more than ``REPLICA_MAX_LAG_SECONDS`` are
+skipped until they catch up; without a running heartbeat they all are.
+
+For local testing a plain copy of a SQLite file works as a replica; keep it
+refreshed with:
+
+    python -m app.db.replication sync --interval 2
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from app.core.invalidation import invalidation_bus
+from app.db.base import make_engine
+from app.models.replication_heartbeat import ReplicationHeartbeat
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "1"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+heartbeat_table = ReplicationHeartbeat.__table__
+
+
+class ReplicaSet:
+    """The replicas of one primary engine, with lag tracking and round-robin selection."""
+
+    def __init__(self, primary_engine, replica_urls: List[str], max_lag_seconds: float = REPLICA_MAX_LAG_SECONDS):
+        self.primary = primary_engine
+        self.urls = replica_urls
+        self.engines = [make_engine(url) for url in replica_urls]
+        self._sessionmakers = [sessionmaker(autocommit=False, autoflush=False, bind=eng) for eng in self.engines]
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_seconds: List[float] = [float("inf")] * len(self.engines)
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._round_robin = itertools.count()
+
+    def beat(self, now: datetime) -> None:
+        with self.primary.begin() as conn:
+            updated = conn.execute(
+                heartbeat_table.update().where(heartbeat_table.c.id == 1).values(beat_at=now)
+            ).rowcount
+            if not updated:
+                conn.execute(heartbeat_table.insert().values(id=1, beat_at=now))
+
+    def refresh_lag(self) -> None:
+        """Re-measure every replica's lag from the age of its copy of the heartbeat."""
+        now = datetime.utcnow()
+        for i, eng in enumerate(self.engines):
+            try:
+                with eng.connect() as conn:
+                    beat_at = conn.execute(
+                        heartbeat_table.select().where(heartbeat_table.c.id == 1)
+                    ).first()
+                self.lag_seconds[i] = (now - beat_at.beat_at).total_seconds() if beat_at else float("inf")
+            except SQLAlchemyError:
+                self.lag_seconds[i] = float("inf")
+        self._checked_at = time.monotonic()
+
+    def healthy_replicas(self) -> List[int]:
+        if time.monotonic() - self._checked_at >= REPLICA_LAG_CHECK_SECONDS:
+            # Only one request pays for the check; others use the last measurement
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self.refresh_lag()
+                finally:
+                    self._refresh_lock.release()
+        return [i for i, lag in enumerate(self.lag_seconds) if lag <= self.max_lag_seconds]
+
+    def session(self) -> Optional[Session]:
+        """Session on a replica within the lag threshold, or None to fall back to the primary."""
+        healthy = self.healthy_replicas()
+        if not healthy:
+            return None
+        return self._sessionmakers[healthy[next(self._round_robin) % len(healthy)]]()
+
+
+class ReadYourWrites:
+    """Remembers recent writers so their reads stay on the primary for a while."""
+
+    def __init__(self, window_seconds: float = READ_YOUR_WRITES_SECONDS, max_entries: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._last_write: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        invalidation_bus.register("read_your_writes", self._mark_local)
+
+    def mark(self, user_id: int) -> None:
+        """Record a write by the user in every worker, so none of them reads from a replica."""
+        invalidation_bus.invalidate("read_your_writes", user_id)
+
+    def _mark_local(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[user_id] = now
+            if len(self._last_write) > self.max_entries:
+                self._last_write = {
+                    uid: ts for uid, ts in self._last_write.items()
+                    if now - ts < self.window_seconds
+                }
+
+    def is_sticky(self, user_id: int) -> bool:
+        last_write = self._last_write.get(user_id)
+        return last_write is not None and time.monotonic() - last_write < self.window_seconds
+
+
+read_your_writes = ReadYourWrites()
+
+
+def replica_urls_from_env(shard_count: int) -> List[List[str]]:
+    """Parse DATABASE_REPLICA_URLS into one list of replica URLs per shard."""
+    groups = os.getenv("DATABASE_REPLICA_URLS", "").split(";")
+    groups += [""] * (shard_count - len(groups))
+    return [[url.strip() for url in group.split(",") if url.strip()] for group in groups[:shard_count]]
+
+
+def beat_all() -> None:
+    """Bump the heartbeat of every primary that has replicas."""
+    from app.db.sharding import shard_router
+
+    now = datetime.utcnow()
+    for rs in shard_router.replica_sets:
+        if rs is None:
+            continue
+        try:
+            rs.beat(now)
+        except SQLAlchemyError:
+            # Primary busy (e.g. SQLite write lock); its replicas look a beat older
+            logger.warning("Replication heartbeat failed for %s", rs.primary.url, exc_info=True)
+
+
+async def beat_periodically(interval_seconds: float = REPLICA_LAG_CHECK_SECONDS):
+    """Background loop for the API process; the writes run in a worker thread."""
+    while True:
+        await run_in_threadpool(beat_all)
+        await asyncio.sleep(interval_seconds)
+
+
+def sync_sqlite_replica(primary_path: str, replica_path: str) -> None:
+    """Copy a SQLite primary into its replica file using the online backup API."""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect and locally simulate read replicas")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show measured lag of every replica")
+    sync = sub.add_parser("sync", help="Copy SQLite primaries into their SQLite replicas")
+    sync.add_argument("--interval", type=float, default=0, help="Repeat every N seconds (0 = once)")
+    args = parser.parse_args(argv)
+
+    from app.db.sharding import shard_router
+
+    replica_sets = [rs for rs in shard_router.replica_sets if rs is not None]
+    if args.command == "status":
+        for rs in replica_sets:
+            rs.refresh_lag()
+            for url, lag in zip(rs.urls, rs.lag_seconds):
+                print(f"{url}: lag {lag:.1f}s")
+        return
+
+    while True:
+        for rs in replica_sets:
+            for eng in rs.engines:
+                if rs.primary.url.get_backend_name() == "sqlite" and eng.url.get_backend_name() == "sqlite":
+                    rs.beat(datetime.utcnow())
+                    sync_sqlite_replica(rs.primary.url.database, eng.url.database)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
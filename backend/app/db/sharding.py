@@ -0,0 +1,474 @@
+"""
+Per-tenant sharding of user-scoped data.
+
+Users and the shard map (``user_shards``) always live in the primary database
+configured by ``DATABASE_URL``. A user's leads, follow-up suggestions and
+sent-email logs live on exactly one shard, chosen from the comma-separated
+``DATABASE_SHARD_URLS``. Shards can be separate SQLite files locally or
+separate Postgres databases/schemas (e.g. ``?options=-csearch_path=shard_1``).
+
+When ``DATABASE_SHARD_URLS`` is unset there is a single shard backed by the
+primary engine, so single-database deployments behave exactly as before.
+
+Read-only requests are served from a shard's replicas when any are configured
+(see ``app.db.replication``), unless the user wrote recently.
+
+Rebalancing tooling:
+
+    python -m app.db.sharding status
+    python -m app.db.sharding move <user_id> <shard_id>
+    python -m app.db.sharding migrate   # drop foreign keys from shard tables to users
+
+While a user is being moved (a ``user_moves`` row exists) their writes are
+refused with 503. The move waits ``SHARD_MOVE_DRAIN_SECONDS`` for writes
+already in flight, copies, and aborts if the source changed during the copy.
+"""
+import argparse
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.base import SQLALCHEMY_DATABASE_URL, SessionLocal, engine, get_db, make_engine
+from app.core.invalidation import invalidation_bus
+from app.db.replication import ReplicaSet, read_your_writes, replica_urls_from_env
+from app.core.security import get_current_active_user
+from app.models.user import User
+from app.models.user_shard import UserShard
+from app.models.user_move import UserMove
+from app.models.content_blob import StoredBodyMixin
+from app.models.lead import Lead
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.models.lead_summary import LeadSummary
+from app.models.lead_tombstone import LeadTombstone
+from app.models.change_sequence import ChangeSequence
+from app.models.sent_email_log import SentEmailLog
+from app.models.archived_lead import ArchivedLead
+from app.models.archived_sent_email_log import ArchivedSentEmailLog
+from app.models.followup_template import FollowUpTemplate
+from app.models.idempotency_key import IdempotencyKey
+from app.models.email_event import EmailEvent
+
+# Longer than any write request runs, including an AI generation (AI_TIMEOUT_SECONDS)
+SHARD_MOVE_DRAIN_SECONDS = float(os.getenv("SHARD_MOVE_DRAIN_SECONDS", "30"))
+
+# Tables keyed only by user_id whose rows copy between shards unchanged
+USER_SCOPED_MODELS = (ArchivedLead, ArchivedSentEmailLog, FollowUpTemplate, IdempotencyKey)
+# Tables keyed by lead_id, whose lead_id is remapped when a user moves
+LEAD_CHILD_MODELS = (FollowUpSuggestion, LeadSummary, EmailEvent)
+
+
+class UserMoving(Exception):
+    """The user's data is being moved between shards; writes must wait."""
+
+    def __init__(self, user_id: int):
+        super().__init__(f"User {user_id} is being moved to another shard")
+        self.user_id = user_id
+
+
+def _remap(ids: Dict[int, int], old_id: int, what: str) -> int:
+    try:
+        return ids[old_id]
+    except KeyError:
+        raise ValueError(f"{what} {old_id} references a row that was not copied") from None
+
+
+def _source_state(src: Session, user_id: int) -> Tuple:
+    """Row counts and high-water marks of a user's data; any write changes at least one."""
+    state = (
+        src.query(func.count(Lead.id), func.max(Lead.change_seq)).filter(Lead.user_id == user_id).one(),
+        src.query(func.count(SentEmailLog.id), func.max(SentEmailLog.id)).filter(SentEmailLog.user_id == user_id).one(),
+        src.query(func.count(EmailEvent.id), func.max(EmailEvent.id)).filter(EmailEvent.user_id == user_id).one(),
+        src.query(func.count(FollowUpSuggestion.id), func.max(FollowUpSuggestion.id))
+            .join(Lead, FollowUpSuggestion.lead_id == Lead.id).filter(Lead.user_id == user_id).one(),
+        src.query(func.count(FollowUpTemplate.id), func.max(FollowUpTemplate.updated_at))
+            .filter(FollowUpTemplate.user_id == user_id).one(),
+    )
+    src.commit()  # end the read transaction so the next call sees newer commits
+    return tuple(tuple(row) for row in state)
+
+
+def _row_values(obj, exclude=("id",)) -> Dict:
+    values = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs if attr.key not in exclude}
+    if isinstance(obj, StoredBodyMixin):
+        # The target shard's content store may not have the blob; re-intern the text there
+        values.update(body_text=obj.body, body_hash=None)
+    return values
+
+
+class ShardRouter:
+    """Maps users to shard databases and hands out sessions for them."""
+
+    def __init__(self, shard_urls: List[str], replica_urls: Optional[List[List[str]]] = None):
+        if not shard_urls:
+            shard_urls = [SQLALCHEMY_DATABASE_URL]
+        self.urls = shard_urls
+        self.engines = [engine if url == SQLALCHEMY_DATABASE_URL else make_engine(url) for url in shard_urls]
+        self._sessionmakers = [
+            SessionLocal if eng is engine else sessionmaker(autocommit=False, autoflush=False, bind=eng)
+            for eng in self.engines
+        ]
+        self.replica_sets: List[Optional[ReplicaSet]] = [
+            ReplicaSet(eng, urls) if urls else None
+            for eng, urls in zip(self.engines, replica_urls or [[]] * len(self.engines))
+        ]
+        self._cache: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        invalidation_bus.register("user_shard", self._evict)
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.engines)
+
+    def is_primary(self, shard_id: int) -> bool:
+        return self.engines[shard_id] is engine
+
+    def default_shard(self, user_id: int) -> int:
+        """Placement for users that have no shard map entry yet."""
+        return user_id % self.shard_count
+
+    def session(self, shard_id: int) -> Session:
+        return self._sessionmakers[shard_id]()
+
+    def replica_session(self, shard_id: int) -> Optional[Session]:
+        """Session on a fresh-enough replica of the shard, or None if there is none."""
+        replicas = self.replica_sets[shard_id]
+        return replicas.session() if replicas is not None else None
+
+    def shard_for_user(self, db: Session, user_id: int) -> int:
+        """Look up (or lazily assign) the shard of a user using a primary-db session."""
+        shard_id = self._cache.get(user_id)
+        if shard_id is not None:
+            return shard_id
+
+        entry = db.query(UserShard).get(user_id)
+        if entry is None:
+            entry = UserShard(user_id=user_id, shard_id=self.default_shard(user_id))
+            db.add(entry)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another request assigned the shard first
+                db.rollback()
+                entry = db.query(UserShard).get(user_id)
+
+        with self._lock:
+            self._cache[user_id] = entry.shard_id
+        return entry.shard_id
+
+    def shard_for_write(self, db: Session, user_id: int) -> int:
+        """
+        Shard for a write, read from the shard map rather than the cache so a missed
+        invalidation cannot send the write to a shard the user has left. Raises
+        ``UserMoving`` while the user's data is being moved.
+        """
+        if db.query(UserMove.user_id).filter(UserMove.user_id == user_id).first() is not None:
+            raise UserMoving(user_id)
+        self._evict(user_id)
+        return self.shard_for_user(db, user_id)
+
+    def moving_users(self, db: Session, user_ids: List[int], chunk_size: int = 500) -> Set[int]:
+        """Those of ``user_ids`` whose data is being moved right now."""
+        moving = set()
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            moving.update(user_id for (user_id,) in db.query(UserMove.user_id).filter(UserMove.user_id.in_(chunk)))
+        return moving
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget a user's cached shard in every worker (after a move or removal)."""
+        invalidation_bus.invalidate("user_shard", user_id)
+
+    def _evict(self, user_id: int) -> None:
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def purge_user_data(self, session: Session, user_id: int) -> None:
+        """Delete all user-scoped rows for a user from one shard session (not committed)."""
+        lead_ids = select(Lead.id).where(Lead.user_id == user_id)
+        for model in LEAD_CHILD_MODELS:
+            session.query(model)\
+                .filter(model.lead_id.in_(lead_ids))\
+                .delete(synchronize_session=False)
+        session.query(SentEmailLog)\
+            .filter(SentEmailLog.user_id == user_id)\
+            .delete(synchronize_session=False)
+        session.query(Lead)\
+            .filter(Lead.user_id == user_id)\
+            .delete(synchronize_session=False)
+        # Tombstones carry the user's change sequence on this shard, so they are dropped rather
+        # than moved. The counters stay: should the user come back, sequences keep increasing
+        # and cursors from the earlier stay cannot be mistaken for new ones.
+        for model in USER_SCOPED_MODELS + (LeadTombstone,):
+            session.query(model)\
+                .filter(model.user_id == user_id)\
+                .delete(synchronize_session=False)
+
+    def _remove_user_rows(self, session: Session, user_id: int) -> None:
+        """``purge_user_data`` plus the user's change-sequence counters (not committed)."""
+        self.purge_user_data(session, user_id)
+        session.query(ChangeSequence)\
+            .filter(ChangeSequence.user_id == user_id)\
+            .delete(synchronize_session=False)
+
+    def remove_user(self, db: Session, user_id: int) -> None:
+        """
+        Drop a user's shard data and shard map entry ahead of deleting the user.
+        On the primary shard the purge joins the caller's transaction.
+        """
+        shard_id = self.shard_for_user(db, user_id)
+        if self.is_primary(shard_id):
+            self._remove_user_rows(db, user_id)
+        else:
+            shard_db = self.session(shard_id)
+            try:
+                self._remove_user_rows(shard_db, user_id)
+                shard_db.commit()
+            finally:
+                shard_db.close()
+        db.query(UserShard).filter(UserShard.user_id == user_id).delete(synchronize_session=False)
+        self.invalidate(user_id)
+
+    def move_user(
+        self,
+        user_id: int,
+        target_shard: int,
+        chunk_size: int = 500,
+        drain_seconds: float = SHARD_MOVE_DRAIN_SECONDS
+    ) -> Dict[str, int]:
+        """
+        Copy a user's rows to another shard, flip the shard map, then purge the source.
+
+        The user's writes are refused for the duration (see ``shard_for_write``);
+        the copy starts once writes already in flight have had ``drain_seconds``
+        to finish, and the move is abandoned if the source still changed under it.
+        Rows get new primary keys on the target shard, so lead and email IDs
+        change. Any leftovers of an interrupted move on the target are purged
+        first, which makes the operation safe to re-run.
+        """
+        if not 0 <= target_shard < self.shard_count:
+            raise ValueError(f"Shard {target_shard} does not exist (have {self.shard_count})")
+
+        db = SessionLocal()
+        try:
+            source_shard = self.shard_for_write(db, user_id)
+            if source_shard == target_shard:
+                return {"leads": 0, "followup_suggestions": 0, "sent_emails": 0, "other": 0}
+            db.add(UserMove(user_id=user_id, target_shard=target_shard))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise UserMoving(user_id)
+            self.invalidate(user_id)
+
+            src = self.session(source_shard)
+            dst = self.session(target_shard)
+            try:
+                time.sleep(drain_seconds)
+                before = _source_state(src, user_id)
+                self.purge_user_data(dst, user_id)
+
+                lead_ids: Dict[int, int] = {}
+                for lead in src.query(Lead).filter(Lead.user_id == user_id).order_by(Lead.id).yield_per(chunk_size):
+                    copy = Lead(**_row_values(lead))
+                    dst.add(copy)
+                    dst.flush()
+                    lead_ids[lead.id] = copy.id
+
+                email_ids: Dict[int, int] = {}
+                query = src.query(SentEmailLog)\
+                    .filter(SentEmailLog.user_id == user_id)\
+                    .order_by(SentEmailLog.id)\
+                    .yield_per(chunk_size)
+                for email in query:
+                    values = _row_values(email)
+                    values["lead_id"] = _remap(lead_ids, email.lead_id, "Sent email")
+                    copy = SentEmailLog(**values)
+                    dst.add(copy)
+                    dst.flush()
+                    email_ids[email.id] = copy.id
+
+                # Events of emails archived for age keep pointing at the archived row's original_id
+                archived_email_ids = {
+                    original_id for (original_id,) in src.query(ArchivedSentEmailLog.original_id)
+                    .filter(ArchivedSentEmailLog.user_id == user_id)
+                }
+                suggestions = 0
+                for model in LEAD_CHILD_MODELS:
+                    query = src.query(model)\
+                        .join(Lead, model.lead_id == Lead.id)\
+                        .filter(Lead.user_id == user_id)\
+                        .yield_per(chunk_size)
+                    for child in query:
+                        values = _row_values(child)
+                        values["lead_id"] = _remap(lead_ids, child.lead_id, model.__name__)
+                        if model is EmailEvent and child.email_id not in archived_email_ids:
+                            values["email_id"] = _remap(email_ids, child.email_id, "Email event")
+                        dst.add(model(**values))
+                        if model is FollowUpSuggestion:
+                            suggestions += 1
+
+                # Archived rows reference original IDs and copy as-is, except emails
+                # archived for age whose lead is still active
+                other_rows = 0
+                for model in USER_SCOPED_MODELS:
+                    for row in src.query(model).filter(model.user_id == user_id).yield_per(chunk_size):
+                        values = _row_values(row)
+                        if model is ArchivedSentEmailLog and row.lead_id in lead_ids:
+                            values["lead_id"] = lead_ids[row.lead_id]
+                        dst.add(model(**values))
+                        other_rows += 1
+
+                if _source_state(src, user_id) != before:
+                    raise RuntimeError(f"User {user_id} was written to during the move; nothing was moved")
+                dst.commit()
+
+                db.query(UserShard).filter(UserShard.user_id == user_id).update(
+                    {UserShard.shard_id: target_shard}, synchronize_session=False
+                )
+                db.commit()
+                self.invalidate(user_id)
+
+                self.purge_user_data(src, user_id)
+                src.commit()
+            except Exception:
+                dst.rollback()
+                src.rollback()
+                raise
+            finally:
+                src.close()
+                dst.close()
+                db.query(UserMove).filter(UserMove.user_id == user_id).delete(synchronize_session=False)
+                db.commit()
+                self.invalidate(user_id)
+        finally:
+            db.close()
+
+        return {"leads": len(lead_ids), "followup_suggestions": suggestions, "sent_emails": len(email_ids), "other": other_rows}
+
+    def status(self) -> List[Dict[str, int]]:
+        """Per-shard user and lead counts, for deciding what to rebalance."""
+        db = SessionLocal()
+        try:
+            stats = []
+            for shard_id in range(self.shard_count):
+                shard_db = self.session(shard_id)
+                try:
+                    stats.append({
+                        "shard_id": shard_id,
+                        "users": db.query(UserShard).filter(UserShard.shard_id == shard_id).count(),
+                        "leads": shard_db.query(Lead).count(),
+                        "sent_emails": shard_db.query(SentEmailLog).count(),
+                    })
+                finally:
+                    shard_db.close()
+            return stats
+        finally:
+            db.close()
+
+
+def _shard_urls_from_env() -> List[str]:
+    raw = os.getenv("DATABASE_SHARD_URLS", "")
+    return [url.strip() for url in raw.split(",") if url.strip()]
+
+
+_shard_urls = _shard_urls_from_env()
+shard_router = ShardRouter(_shard_urls, replica_urls_from_env(max(len(_shard_urls), 1)))
+
+READ_ONLY_METHODS = ("GET", "HEAD")
+
+
+def get_user_db(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Session on the shard holding the current user's data. Read-only requests go
+    to a replica when one is within the lag threshold and the user has not
+    written recently; everything else uses the shard primary, which for users
+    on the primary shard is the same session as ``get_db``. Writes are refused
+    with 503 while the user is being moved between shards.
+    """
+    if request.method in READ_ONLY_METHODS:
+        shard_id = shard_router.shard_for_user(db, current_user.id)
+        if not read_your_writes.is_sticky(current_user.id):
+            replica_db = shard_router.replica_session(shard_id)
+            if replica_db is not None:
+                try:
+                    yield replica_db
+                finally:
+                    replica_db.close()
+                return
+    else:
+        try:
+            shard_id = shard_router.shard_for_write(db, current_user.id)
+        except UserMoving:
+            raise HTTPException(
+                status_code=503,
+                detail="Account data is being moved; retry shortly",
+                headers={"Retry-After": str(int(SHARD_MOVE_DRAIN_SECONDS))}
+            )
+        read_your_writes.mark(current_user.id)
+
+    shard_db = db if shard_router.is_primary(shard_id) else shard_router.session(shard_id)
+    try:
+        yield shard_db
+    finally:
+        if request.method not in READ_ONLY_METHODS:
+            # Stickiness counts from the end of the write, not its start
+            read_your_writes.mark(current_user.id)
+        if shard_db is not db:
+            shard_db.close()
+
+
+# Shard tables created with a foreign key to users, which a separate shard database cannot satisfy
+_USER_FK_TABLES = ("leads", "sent_email_logs", "lead_tombstones", "followup_templates", "idempotency_keys")
+
+
+def drop_user_foreign_keys(engine) -> int:
+    """Drop foreign keys from shard tables to ``users``. Returns constraints dropped."""
+    if engine.dialect.name == "sqlite":  # SQLite cannot drop constraints; recreate old local shard files instead
+        return 0
+    dropped = 0
+    with engine.begin() as conn:
+        for table in _USER_FK_TABLES:
+            for fk in inspect(engine).get_foreign_keys(table):
+                if fk["referred_table"] == "users" and fk["name"]:
+                    conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {fk['name']}"))
+                    dropped += 1
+    return dropped
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect and rebalance user shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show users and rows per shard")
+    sub.add_parser("migrate", help="Drop foreign keys from shard tables to users")
+    move = sub.add_parser("move", help="Move a user's data to another shard")
+    move.add_argument("user_id", type=int)
+    move.add_argument("shard_id", type=int)
+    move.add_argument("--drain-seconds", type=float, default=SHARD_MOVE_DRAIN_SECONDS,
+                      help="How long in-flight writes get to finish before copying")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for stats in shard_router.status():
+            print(f"shard {stats['shard_id']}: {stats['users']} users, "
+                  f"{stats['leads']} leads, {stats['sent_emails']} sent emails")
+    elif args.command == "migrate":
+        for shard_id, shard_engine in enumerate(shard_router.engines):
+            print(f"shard {shard_id}: dropped {drop_user_foreign_keys(shard_engine)} foreign keys to users")
+    elif args.command == "move":
+        moved = shard_router.move_user(args.user_id, args.shard_id, drain_seconds=args.drain_seconds)
+        print(f"Moved user {args.user_id} to shard {args.shard_id}: {moved}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import logging
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 class GmailService:
     def __init__(self):
         # In the future, initialize OAuth creds here
@@ -14,11 +17,11 @@ class GmailService:
         Stub that mimics sending an email.
         In a real app, this would use the Gmail API.
         """
-        print(f"\n-------- GMAIL SERVICE (STUB) --------")
-        print(f"To: {to_email}")
-        print(f"Subject: {subject}")
-        print(f"Body: {body[:50]}...")
-        print(f"------------------------------------\n")
+        logger.info(
+            "Gmail stub sent email to %s: %r",
+            to_email, subject,
+            extra={"body_chars": len(body)}
+        )
         return True
 
 # Singleton instance
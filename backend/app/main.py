@@ -1,10 +1,25 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
 # Import routers (using the correct path)
-from app.api.endpoints import auth, leads, users, sent_emails
+from app.api.endpoints import auth, leads, users, sent_emails, templates, tracking
+from app.core.rate_limit import limits_status
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import metrics
+from app.db.replication import beat_periodically
+from app.db.sharding import shard_router
+from app.core.logs import log_stats, new_request_id, request_id_var, setup_logging, shutdown_logging
+from app.services.archive_service import ARCHIVE_INTERVAL_SECONDS, archive_periodically
+from app.services.similarity_index import similarity_index
+from app.services.prefix_index import prefix_index
+from app.services.purge_service import PURGE_INTERVAL_SECONDS, purge_periodically
+from app.services.tracking import flush_periodically, tracking_buffer
+from app.services.pregeneration import PREGEN_INTERVAL_SECONDS, PregenerationService, pregenerate_periodically
 
 
 # Load environment variables
@@ -33,6 +48,18 @@ app.add_middleware(
     allow_headers=["*"],       # Allow all headers
 )
 
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    # Every log line written while handling the request carries this ID
+    request_id = request.headers.get("X-Request-ID", "")[:128] or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # 3. CONFIGURE ROUTES
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -40,6 +67,41 @@ app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(leads.router, prefix="/api/leads", tags=["leads"])
 app.include_router(sent_emails.router, prefix="/api/sent-emails", tags=["sent-emails"])
+app.include_router(templates.router, prefix="/api/templates", tags=["templates"])
+app.include_router(tracking.router, prefix="/api/track", tags=["tracking"])
+
+metrics.register("limits", limits_status)
+metrics.register("invalidation", lambda: dict(invalidation_bus.counters))
+metrics.register("followup_single_flight", lambda: dict(leads.followup_flights.counters))
+metrics.register("similarity_index", similarity_index.stats)
+metrics.register("prefix_index", prefix_index.stats)
+metrics.register("logging", log_stats)
+metrics.register("pregeneration", lambda: dict(PregenerationService.stats))
+metrics.register("tracking", lambda: dict(tracking_buffer.stats, buffered=len(tracking_buffer)))
+
+@app.on_event("startup")
+async def start_background_jobs():
+    setup_logging()
+    invalidation_bus.start()
+    metrics.start()
+    # Each worker buffers its own tracking hits, so each one flushes
+    asyncio.create_task(flush_periodically())
+    # Under app.serve only the first worker runs periodic jobs
+    if os.getenv("APP_WORKER_ID", "0") == "0":
+        if ARCHIVE_INTERVAL_SECONDS > 0:
+            asyncio.create_task(archive_periodically())
+        if PURGE_INTERVAL_SECONDS > 0:
+            asyncio.create_task(purge_periodically())
+        if PREGEN_INTERVAL_SECONDS > 0:
+            asyncio.create_task(pregenerate_periodically())
+        if any(shard_router.replica_sets):
+            asyncio.create_task(beat_periodically())
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    invalidation_bus.stop()
+    await run_in_threadpool(tracking_buffer.flush)
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -47,4 +109,13 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/api/health/limits")
+async def limits_check():
+    return limits_status()
+
+@app.get("/api/health/metrics")
+async def metrics_check():
+    """Counters summed over all worker processes"""
+    return metrics.aggregate()
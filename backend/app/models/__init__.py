@@ -1,12 +1,40 @@
+from .content_blob import ContentBlob
 from .user import User
 from .lead import Lead
 from .followup_suggestion import FollowUpSuggestion
 from .sent_email_log import SentEmailLog
+from .user_shard import UserShard
+from .replication_heartbeat import ReplicationHeartbeat
+from .archived_lead import ArchivedLead
+from .archived_sent_email_log import ArchivedSentEmailLog
+from .followup_template import FollowUpTemplate
+from .lead_summary import LeadSummary
+from .lead_tombstone import LeadTombstone
+from .change_sequence import ChangeSequence
+from .idempotency_key import IdempotencyKey
+from .user_purge import UserPurge
+from .refresh_session import RefreshSession
+from .email_event import EmailEvent
+from .user_move import UserMove
 
 # This will ensure all models are imported for SQLAlchemy to register them
 __all__ = [
+    'ContentBlob',
     'User',
     'Lead',
     'FollowUpSuggestion',
     'SentEmailLog',
+    'UserShard',
+    'ReplicationHeartbeat',
+    'ArchivedLead',
+    'ArchivedSentEmailLog',
+    'FollowUpTemplate',
+    'LeadSummary',
+    'LeadTombstone',
+    'ChangeSequence',
+    'IdempotencyKey',
+    'UserPurge',
+    'RefreshSession',
+    'EmailEvent',
+    'UserMove',
 ]
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Boolean
+from app.db.base import Base
+from app.models.lead import LeadStatus, LeadSource
+
+class ArchivedLead(Base):
+    """Cold copy of a soft-deleted lead, moved out of the hot ``leads`` table."""
+    __tablename__ = "archived_leads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    original_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    contact_name = Column(String, nullable=False)
+    contact_email = Column(String, nullable=False)
+    company = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    source = Column(Enum(LeadSource), nullable=False)
+    last_email_snippet = Column(Text, nullable=True)
+    lead_score = Column(Integer, nullable=False)
+    status = Column(Enum(LeadStatus), nullable=False)
+    next_followup_at = Column(DateTime, nullable=True)
+    notes = Column(Text, nullable=True)
+    is_active = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
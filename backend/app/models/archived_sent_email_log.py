@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index
+from app.db.base import Base
+from app.models.content_blob import StoredBodyMixin
+from app.models.sent_email_log import EmailProvider
+
+class ArchivedSentEmailLog(StoredBodyMixin, Base):
+    """Cold copy of a sent email past the retention window or belonging to an archived lead."""
+    __tablename__ = "archived_sent_email_logs"
+    __table_args__ = (
+        Index("ix_archived_sent_email_logs_user_sent_at", "user_id", "sent_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    original_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    lead_id = Column(Integer, nullable=False, index=True)  # original lead id, hot or archived
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    provider = Column(Enum(EmailProvider), nullable=False)
+    status = Column(String, nullable=False)
+    sent_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
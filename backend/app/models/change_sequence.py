@@ -0,0 +1,100 @@
+"""
+Monotonic per-user change sequences for delta sync of leads.
+
+Every flush that inserts, modifies or deletes a user's leads takes the next
+value of that user's ``change_sequences`` counter and stamps it on the touched
+rows (``Lead.change_seq``), leaving a ``LeadTombstone`` for each delete. The
+counter row is updated in the writing transaction, so its lock orders the
+user's commits and a client that has seen sequence N has seen every change of
+that user up to N. Each user has their own row, so tenants sharing a shard do
+not serialize on one counter; a write touching several users bumps their rows
+in ``user_id`` order.
+
+Bulk ``query.update()``/``delete()`` calls bypass the ORM flush and must call
+``next_change_seq`` (or ``lead_tombstones_from``) themselves.
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import Column, Integer, String, BigInteger, event, insert, literal, select, update
+from sqlalchemy.orm import Session
+from app.db.base import Base
+from app.models.lead import Lead
+from app.models.lead_tombstone import LeadTombstone
+
+LEADS_SEQUENCE = "leads"
+
+
+class ChangeSequence(Base):
+    __tablename__ = "change_sequences"
+
+    user_id = Column(Integer, primary_key=True)
+    name = Column(String(32), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+def current_change_seq(session: Session, user_id: int, name: str = LEADS_SEQUENCE) -> int:
+    value = session.execute(
+        select(ChangeSequence.value).where(ChangeSequence.user_id == user_id, ChangeSequence.name == name)
+    ).scalar()
+    return value or 0
+
+
+def _create_counter(session: Session, user_id: int, name: str) -> None:
+    table = ChangeSequence.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        session.execute(insert(table).values(user_id=user_id, name=name, value=0))
+        return
+    # Two first writers may race to create the counter; both then bump it
+    session.execute(
+        dialect_insert(table).values(user_id=user_id, name=name, value=0)
+        .on_conflict_do_nothing(index_elements=["user_id", "name"])
+    )
+
+
+def next_change_seq(session: Session, user_id: int, name: str = LEADS_SEQUENCE) -> int:
+    """Increment and return the user's counter inside the session's current transaction."""
+    table = ChangeSequence.__table__
+    bump = update(table).where(table.c.user_id == user_id, table.c.name == name).values(value=table.c.value + 1)
+    if not session.execute(bump).rowcount:
+        _create_counter(session, user_id, name)
+        session.execute(bump)
+    return current_change_seq(session, user_id, name)
+
+
+def next_change_seqs(session: Session, user_ids: Iterable[int]) -> Dict[int, int]:
+    """``next_change_seq`` for several users, taken in ``user_id`` order so concurrent writers cannot deadlock."""
+    return {user_id: next_change_seq(session, user_id) for user_id in sorted(set(user_ids))}
+
+
+def lead_tombstones_from(session: Session, lead_ids) -> None:
+    """Bulk-insert tombstones for leads (a list or a SELECT of IDs) about to be removed by a set-based DELETE."""
+    owners = session.execute(select(Lead.user_id).where(Lead.id.in_(lead_ids)).distinct()).scalars()
+    for user_id, seq in next_change_seqs(session, owners).items():
+        session.execute(
+            insert(LeadTombstone.__table__).from_select(
+                ["lead_id", "user_id", "change_seq"],
+                select(Lead.id, Lead.user_id, literal(seq)).where(Lead.id.in_(lead_ids), Lead.user_id == user_id)
+            )
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_lead_changes(session, flush_context, instances):
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Lead) and (obj in session.new or session.is_modified(obj, include_collections=False))
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Lead)]
+    if not changed and not deleted:
+        return
+
+    seqs = next_change_seqs(session, (lead.user_id for lead in changed + deleted))
+    for lead in changed:
+        lead.change_seq = seqs[lead.user_id]
+    for lead in deleted:
+        session.add(LeadTombstone(lead_id=lead.id, user_id=lead.user_id, change_seq=seqs[lead.user_id]))
@@ -0,0 +1,140 @@
+"""
+Content-addressed storage for email and suggestion bodies.
+
+Bodies are keyed by the SHA-256 of their text and stored once per database,
+compressed when larger than ``BODY_COMPRESS_MIN_BYTES``. Models using
+``StoredBodyMixin`` keep a ``body`` property: assigning it stages the text
+inline, and a ``before_flush`` hook moves it into ``content_blobs`` and points
+the row at its hash. Unmigrated rows keep serving their inline text.
+"""
+import hashlib
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from sqlalchemy import Column, String, Integer, Text, DateTime, LargeBinary, ForeignKey, event
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.orm import Session, deferred, relationship, selectinload
+from app.db.base import Base
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+BODY_COMPRESS_MIN_BYTES = int(os.getenv("BODY_COMPRESS_MIN_BYTES", "256"))
+BODY_COMPRESSION = os.getenv("BODY_COMPRESSION", "zlib")
+# gc only removes blobs unreferenced and untouched for this long
+BODY_GC_GRACE_SECONDS = int(os.getenv("BODY_GC_GRACE_SECONDS", "3600"))
+
+
+def body_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_body(text: str) -> Tuple[bytes, str]:
+    """Return (stored bytes, encoding), compressing only when it pays off."""
+    raw = text.encode("utf-8")
+    if len(raw) < BODY_COMPRESS_MIN_BYTES:
+        return raw, "raw"
+    if BODY_COMPRESSION == "zstd" and zstandard is not None:
+        data, encoding = zstandard.ZstdCompressor().compress(raw), "zstd"
+    else:
+        data, encoding = zlib.compress(raw), "zlib"
+    return (data, encoding) if len(data) < len(raw) else (raw, "raw")
+
+
+def decode_body(data: bytes, encoding: str) -> str:
+    if encoding == "zlib":
+        data = zlib.decompress(data)
+    elif encoding == "zstd":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode("utf-8")
+
+
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    encoding = Column(String(8), nullable=False)
+    size = Column(Integer, nullable=False)  # uncompressed UTF-8 bytes
+    data = deferred(Column(LargeBinary, nullable=False))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # re-stamped when an old blob is reused
+
+    @property
+    def text(self) -> str:
+        return decode_body(self.data, self.encoding)
+
+
+class StoredBodyMixin:
+    """Adds a ``body`` backed by the content store to a model."""
+
+    # Inline text: legacy rows, or a new body waiting to be interned on flush
+    body_text = Column("body", Text, nullable=False, default="")
+
+    @declared_attr
+    def body_hash(cls):
+        return Column(String(64), ForeignKey("content_blobs.hash"), nullable=True, index=True)
+
+    @declared_attr
+    def body_blob(cls):
+        return relationship("ContentBlob", lazy="select")
+
+    @property
+    def body(self) -> str:
+        if self.body_text:
+            return self.body_text
+        return self.body_blob.text if self.body_blob is not None else ""
+
+    @body.setter
+    def body(self, value: str) -> None:
+        self.body_text = value
+
+
+def load_body(model):
+    """Loader option fetching the bodies of a list of rows in one extra query."""
+    return selectinload(model.body_blob).undefer(ContentBlob.data)
+
+
+def _insert_blob_if_missing(session: Session, text: str, digest: str) -> None:
+    data, encoding = encode_body(text)
+    values = dict(hash=digest, encoding=encoding, size=len(text.encode("utf-8")), data=data, created_at=datetime.utcnow())
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        session.execute(ContentBlob.__table__.insert().values(**values))
+        return
+    # Concurrent writers of the same body race harmlessly
+    session.execute(insert(ContentBlob.__table__).values(**values).on_conflict_do_nothing(index_elements=["hash"]))
+
+
+def intern_body(session: Session, text: str) -> ContentBlob:
+    """Get the blob for a body, storing it first if this database has not seen it."""
+    digest = body_hash(text)
+    blob = session.query(ContentBlob).get(digest)
+    if blob is not None and blob.created_at < datetime.utcnow() - timedelta(seconds=BODY_GC_GRACE_SECONDS / 2):
+        # Re-stamp an old blob before pointing at it so a concurrent gc leaves it alone
+        touched = session.query(ContentBlob)\
+            .filter(ContentBlob.hash == digest)\
+            .update({ContentBlob.created_at: datetime.utcnow()}, synchronize_session=False)
+        if touched:
+            session.expire(blob, ["created_at"])
+        else:  # gc removed it after we read it
+            session.expunge(blob)
+            blob = None
+    if blob is None:
+        _insert_blob_if_missing(session, text, digest)
+        blob = session.query(ContentBlob).get(digest)
+    return blob
+
+
+@event.listens_for(Session, "before_flush")
+def _intern_pending_bodies(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, StoredBodyMixin) and obj.body_text:
+            obj.body_blob = intern_body(session, obj.body_text)
+            obj.body_text = ""
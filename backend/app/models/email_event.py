@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.db.base import Base
+
+class EmailEvent(Base):
+    """An open (tracking pixel) or click (redirect link) of a sent email, written in batches by app.services.tracking."""
+    __tablename__ = "email_events"
+    __table_args__ = (
+        Index("ix_email_events_lead_kind", "lead_id", "kind"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), nullable=False)
+    email_id = Column(Integer, nullable=False, index=True)  # no FK: events outlive the email's archival
+    kind = Column(String(8), nullable=False)  # "open" or "click"
+    occurred_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,18 +1,21 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.models.content_blob import StoredBodyMixin
 
-class FollowUpSuggestion(Base):
+class FollowUpSuggestion(StoredBodyMixin, Base):
     __tablename__ = "followup_suggestions"
 
     id = Column(Integer, primary_key=True, index=True)
-    lead_id = Column(Integer, ForeignKey("leads.id"), nullable=False)
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), nullable=False)
     variant_index = Column(Integer, nullable=False)  # 0, 1, or 2 for the three variants
     subject = Column(String, nullable=False)
-    body = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     tone = Column(String, nullable=False)
+    # See app.services.followup_drafts: "pregenerated" drafts go stale once the lead's fingerprint moves on
+    origin = Column(String(16), nullable=True)
+    lead_fingerprint = Column(String(64), nullable=True)
     
     # Relationships
     lead = relationship("Lead", back_populates="followup_suggestions")
@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from app.db.base import Base
+
+class FollowUpTemplate(Base):
+    """A user's override of one built-in template variant for a tone."""
+    __tablename__ = "followup_templates"
+    __table_args__ = (
+        UniqueConstraint("user_id", "tone", "variant_index", name="uq_followup_templates_user_tone_variant"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key to users: users live on the primary, this table on the user's shard
+    user_id = Column(Integer, nullable=False, index=True)
+    tone = Column(String, nullable=False)
+    variant_index = Column(Integer, nullable=False)  # 0, 1, or 2, like FollowUpSuggestion
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
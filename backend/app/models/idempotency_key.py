@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from app.db.base import Base
+
+class IdempotencyKey(Base):
+    """Stored outcome of a request sent with an ``Idempotency-Key`` header, replayed on retries."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key to users: users live on the primary, this table on the user's shard
+    user_id = Column(Integer, nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 of route and request body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is still running
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Enum, Boolean, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 import enum
@@ -20,7 +20,8 @@ class Lead(Base):
     __tablename__ = "leads"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # No foreign key to users: users live on the primary, this table on the user's shard
+    user_id = Column(Integer, nullable=False)
     contact_name = Column(String, nullable=False)
     contact_email = Column(String, nullable=False, index=True)
     company = Column(String, nullable=True)
@@ -34,8 +35,23 @@ class Lead(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    change_seq = Column(BigInteger, nullable=True)  # stamped on every write, see app.models.change_sequence
+    # Maintained by app.services.lead_counters so lists never aggregate the log tables
+    emails_sent_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_sent_at = Column(DateTime, nullable=True)
+    last_suggestion_at = Column(DateTime, nullable=True)
+    # Folded in from email_events by app.services.tracking
+    opens_count = Column(Integer, default=0, server_default="0", nullable=False)
+    clicks_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_opened_at = Column(DateTime, nullable=True)
 
     # Relationships
-    user = relationship("User", back_populates="leads")
-    followup_suggestions = relationship("FollowUpSuggestion", back_populates="lead", cascade="all, delete-orphan")
-    sent_emails = relationship("SentEmailLog", back_populates="lead", cascade="all, delete-orphan")
+    followup_suggestions = relationship("FollowUpSuggestion", back_populates="lead", cascade="all, delete-orphan", passive_deletes=True)
+    sent_emails = relationship("SentEmailLog", back_populates="lead", cascade="all, delete-orphan", passive_deletes=True)
+    summary = relationship("LeadSummary", back_populates="lead", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index("ix_leads_user_change_seq", "user_id", "change_seq"),
+        Index("ix_leads_user_last_sent_at", "user_id", "last_sent_at"),
+        Index("ix_leads_user_emails_sent_count", "user_id", "emails_sent_count"),
+    )
@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+class LeadSummary(Base):
+    """Rolling digest of a lead's sent emails, extended one email at a time."""
+    __tablename__ = "lead_summaries"
+
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    emails_summarized = Column(Integer, nullable=False, default=0)
+    emails_dropped = Column(Integer, nullable=False, default=0)  # oldest entries trimmed to fit the budget
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    # Relationships
+    lead = relationship("Lead", back_populates="summary")
@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Index
+from app.db.base import Base
+
+class LeadTombstone(Base):
+    """Marker left behind by a deleted lead so delta-sync clients can drop it."""
+    __tablename__ = "lead_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer, nullable=False)
+    # No foreign key to users: users live on the primary, this table on the user's shard
+    user_id = Column(Integer, nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_lead_tombstones_user_seq", "user_id", "change_seq"),
+    )
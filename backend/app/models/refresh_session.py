@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from app.db.base import Base
+
+class RefreshSession(Base):
+    """
+    One signed-in session: the family of refresh tokens rotated from one login.
+    Only the newest token's ID is kept, so the store holds a row per live session
+    rather than one per token issued; revoking deletes the row.
+    """
+    __tablename__ = "refresh_sessions"
+
+    id = Column(String(32), primary_key=True)  # family ID, the "fam" claim
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    jti = Column(String(32), nullable=False)  # the only token of the family still accepted
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    rotated_at = Column(DateTime, nullable=True)
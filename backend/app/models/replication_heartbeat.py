@@ -0,0 +1,10 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime
+from app.db.base import Base
+
+class ReplicationHeartbeat(Base):
+    """Single-row timestamp written on primaries and read back from replicas to measure lag."""
+    __tablename__ = "replication_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(DateTime, default=datetime.utcnow, nullable=False)
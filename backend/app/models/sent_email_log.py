@@ -1,8 +1,10 @@
 from datetime import datetime
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+import secrets
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.models.content_blob import StoredBodyMixin
 
 class EmailProvider(str, enum.Enum):
     GMAIL = "gmail"
@@ -10,19 +12,24 @@ class EmailProvider(str, enum.Enum):
     SMTP = "smtp"
     OTHER = "other"
 
-class SentEmailLog(Base):
+class SentEmailLog(StoredBodyMixin, Base):
     __tablename__ = "sent_email_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    lead_id = Column(Integer, ForeignKey("leads.id"), nullable=False)
+    # No foreign key to users: users live on the primary, this table on the user's shard
+    user_id = Column(Integer, nullable=False)
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), nullable=False)
     to_email = Column(String, nullable=False)
     subject = Column(String, nullable=False)
-    body = Column(Text, nullable=False)
     provider = Column(Enum(EmailProvider), default=EmailProvider.GMAIL, nullable=False)
     status = Column(String, default="sent", nullable=False)
     sent_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Folded in from email_events by app.services.tracking
+    opens_count = Column(Integer, default=0, server_default="0", nullable=False)
+    clicks_count = Column(Integer, default=0, server_default="0", nullable=False)
+    first_opened_at = Column(DateTime, nullable=True)
+    # Names the email in tracking links; unlike id it survives a move to another shard
+    tracking_key = Column(String(24), default=lambda: secrets.token_urlsafe(12), nullable=True, unique=True, index=True)
     
     # Relationships
-    user = relationship("User", back_populates="sent_emails")
     lead = relationship("Lead", back_populates="sent_emails")
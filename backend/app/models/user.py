@@ -1,7 +1,5 @@
 from datetime import datetime
-from typing import List
 from sqlalchemy import Column, Integer, String, DateTime, Boolean
-from sqlalchemy.orm import relationship
 from app.db.base import Base
 from passlib.context import CryptContext
 
@@ -18,9 +16,8 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relationships
-    leads = relationship("Lead", back_populates="user", cascade="all, delete-orphan")
-    sent_emails = relationship("SentEmailLog", back_populates="user", cascade="all, delete-orphan")
+    # No relationships to leads or sent emails: they live on the user's shard, possibly another
+    # database. app.services.purge_service removes them when the account is deleted.
 
     def verify_password(self, password: str) -> bool:
         return pwd_context.verify(password, self.hashed_password)
@@ -0,0 +1,11 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from app.db.base import Base
+
+class UserMove(Base):
+    """A user's data being copied to another shard; writes for the user are refused until it is gone."""
+    __tablename__ = "user_moves"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    target_shard = Column(Integer, nullable=False)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
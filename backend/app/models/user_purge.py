@@ -0,0 +1,12 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey
+from app.db.base import Base
+
+class UserPurge(Base):
+    """Pending deletion of a deactivated user's data, worked off in chunks by app.services.purge_service."""
+    __tablename__ = "user_purges"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    requested_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    rows_deleted = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
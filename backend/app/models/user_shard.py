@@ -0,0 +1,11 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from app.db.base import Base
+
+class UserShard(Base):
+    """Shard map entry: which shard database holds a user's leads and emails."""
+    __tablename__ = "user_shards"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    shard_id = Column(Integer, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
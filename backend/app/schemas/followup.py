@@ -39,6 +39,7 @@ class FollowUpSuggestionInDB(FollowUpSuggestionInDBBase):
 class FollowUpGenerateRequest(BaseModel):
     context: Optional[str] = None
     tone: FollowUpTone = FollowUpTone.POLITE
+    template_only: bool = False  # render the user's templates without calling the AI provider
 
 class FollowUpGenerateResponse(BaseModel):
     suggestions: List[FollowUpSuggestionBase]
@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+from app.schemas.followup import FollowUpTone, FollowUpSuggestionBase
+
+class FollowUpTemplateBase(BaseModel):
+    subject: str
+    body: str
+
+class FollowUpTemplateUpdate(FollowUpTemplateBase):
+    pass
+
+class FollowUpTemplate(FollowUpTemplateBase):
+    id: int
+    user_id: int
+    tone: FollowUpTone
+    variant_index: int = Field(..., ge=0, le=2)
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class TemplateRenderRequest(BaseModel):
+    lead_ids: List[int] = Field(..., max_items=1000)
+    tone: FollowUpTone = FollowUpTone.POLITE
+    context: Optional[str] = None
+
+class TemplateRenderResult(BaseModel):
+    lead_id: int
+    suggestions: List[FollowUpSuggestionBase]
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, root_validator, validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from enum import Enum
 
+from app.schemas.followup import FollowUpSuggestion, SentEmail
+
 # Enums
 class LeadStatus(str, Enum):
     NEW = "new"
@@ -46,6 +48,47 @@ class LeadUpdate(BaseModel):
     notes: Optional[str] = None
     is_active: Optional[bool] = None
 
+    @validator("contact_name", "contact_email", "source", "lead_score", "status", "is_active", pre=True)
+    def reject_null(cls, value, field):
+        # These columns are NOT NULL: leave the field out to keep the current value
+        if value is None:
+            raise ValueError(f"{field.name} cannot be null")
+        return value
+
+# Bulk operations: select leads by explicit IDs or by filter (an empty filter selects all)
+class LeadFilter(BaseModel):
+    status: Optional[LeadStatus] = None
+    source: Optional[LeadSource] = None
+    is_active: Optional[bool] = None
+    search: Optional[str] = None
+    next_followup_before: Optional[datetime] = None
+    next_followup_after: Optional[datetime] = None
+
+class LeadBulkSelection(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_items=10000)
+    filter: Optional[LeadFilter] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_one_selector(cls, values):
+        if (values.get("ids") is None) == (values.get("filter") is None):
+            raise ValueError("Provide exactly one of 'ids' or 'filter'")
+        return values
+
+class LeadBulkUpdate(LeadBulkSelection):
+    update: LeadUpdate
+
+class LeadBulkResult(BaseModel):
+    affected: int
+
+# Duplicate detection and merging
+class LeadDuplicateGroup(BaseModel):
+    lead_ids: List[int]
+    score: float  # weakest match holding the group together
+
+class LeadMergeRequest(BaseModel):
+    primary_id: int
+    duplicate_ids: List[int] = Field(..., min_items=1, max_items=1000)
+
 # Response schemas
 class LeadInDBBase(LeadBase):
     id: int
@@ -53,6 +96,12 @@ class LeadInDBBase(LeadBase):
     is_active: bool
     created_at: datetime
     updated_at: datetime
+    emails_sent_count: int = 0
+    last_sent_at: Optional[datetime] = None
+    last_suggestion_at: Optional[datetime] = None
+    opens_count: int = 0
+    clicks_count: int = 0
+    last_opened_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -63,7 +112,70 @@ class Lead(LeadInDBBase):
 class LeadInDB(LeadInDBBase):
     pass
 
+# Row of the leads list; only the requested (?fields=) or summary fields are present
+class LeadListItem(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    contact_name: Optional[str] = None
+    contact_email: Optional[str] = None
+    company: Optional[str] = None
+    phone: Optional[str] = None
+    source: Optional[LeadSource] = None
+    last_email_snippet: Optional[str] = None
+    lead_score: Optional[int] = None
+    status: Optional[LeadStatus] = None
+    next_followup_at: Optional[datetime] = None
+    notes: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    emails_sent_count: Optional[int] = None
+    last_sent_at: Optional[datetime] = None
+    last_suggestion_at: Optional[datetime] = None
+    opens_count: Optional[int] = None
+    clicks_count: Optional[int] = None
+    last_opened_at: Optional[datetime] = None
+
+LEAD_LIST_FIELDS = list(LeadListItem.__fields__)
+LEAD_SUMMARY_FIELDS = [name for name in LEAD_LIST_FIELDS if name not in ("notes", "last_email_snippet")]
+
+class LeadSuggestion(BaseModel):
+    id: int
+    contact_name: str
+    contact_email: str
+    company: Optional[str] = None
+
+class LeadSimilar(BaseModel):
+    lead: Lead
+    score: float  # cosine similarity of the leads' notes and email history, 0 to 1
+
+# Lead with related rows requested through ?include=; absent relations are omitted
+class LeadDetail(Lead):
+    followups: Optional[List[FollowUpSuggestion]] = None
+    sent_emails: Optional[List[SentEmail]] = None
+    sent_emails_has_more: Optional[bool] = None
+
+class ArchivedLead(LeadBase):
+    id: int
+    original_id: int
+    user_id: int
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+    archived_at: datetime
+
+    class Config:
+        orm_mode = True
+
 # For listing leads with pagination
 class LeadList(BaseModel):
     total: int
     items: List[Lead]
+
+# Delta sync page: leads written and IDs deleted since the request cursor
+class LeadChanges(BaseModel):
+    cursor: str
+    reset: bool = False  # cursor was unusable; drop local state and apply this as a full sync
+    has_more: bool = False
+    changed: List[Lead]
+    deleted: List[int]
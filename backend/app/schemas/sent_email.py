@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 from enum import Enum
 
 class EmailProvider(str, Enum):
@@ -28,9 +28,12 @@ class SentEmailInDBBase(SentEmailBase):
     id: int
     user_id: int
     sent_at: datetime
+    opens_count: int = 0
+    clicks_count: int = 0
+    first_opened_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
+        orm_mode = True
 
 class SentEmail(SentEmailInDBBase):
     pass
@@ -41,3 +44,36 @@ class SentEmailInDB(SentEmailInDBBase):
 class SentEmailList(BaseModel):
     total: int
     items: List[SentEmail]
+
+# Row of a sent-email list; only the requested (?fields=) or summary fields are present
+class SentEmailListItem(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    lead_id: Optional[int] = None
+    to_email: Optional[str] = None
+    subject: Optional[str] = None
+    body: Optional[str] = None
+    provider: Optional[EmailProvider] = None
+    status: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    opens_count: Optional[int] = None
+    clicks_count: Optional[int] = None
+    first_opened_at: Optional[datetime] = None
+
+SENT_EMAIL_LIST_FIELDS = list(SentEmailListItem.__fields__)
+SENT_EMAIL_SUMMARY_FIELDS = [name for name in SENT_EMAIL_LIST_FIELDS if name != "body"]
+
+class TrackingLinks(BaseModel):
+    pixel_url: str
+    links: Dict[str, str]  # original URL -> click-tracking URL
+
+class ArchivedSentEmail(SentEmailBase):
+    id: int
+    original_id: int
+    user_id: int
+    status: str
+    sent_at: datetime
+    archived_at: datetime
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,147 @@
+"""
+Production launcher: a preforking supervisor around uvicorn.
+
+    python -m app.serve --host 0.0.0.0 --port 8000 [--workers N]
+
+The app is imported once in the supervisor (``--preload``, the default) and
+workers are forked from it, so they share the imported code pages and start
+in milliseconds. Workers accept on one shared listening socket, the
+supervisor replaces any worker that dies, and SIGTERM/SIGINT shut all of them
+down gracefully.
+
+Workers default to ``WEB_CONCURRENCY`` or one per CPU available to the
+process. Each worker joins the invalidation bus and metrics directory under a
+per-server run directory, so cache evictions reach every worker and
+``GET /api/health/metrics`` reports totals for the whole server. Only worker 0
+runs background jobs such as archival.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+WORKER_ID_ENV = "APP_WORKER_ID"
+
+
+def default_workers() -> int:
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    try:
+        cpus = len(os.sched_getaffinity(0))  # respects taskset/cgroup CPU pinning
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, cpus)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(worker_id: int, sock: socket.socket, args) -> None:
+    os.environ[WORKER_ID_ENV] = str(worker_id)
+    # Leave the terminal's process group: a Ctrl+C reaching both the supervisor and the
+    # workers would arrive twice and make uvicorn skip the graceful shutdown
+    os.setpgrp()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    import uvicorn
+    from app.db.sharding import shard_router
+
+    # Connections opened by the supervisor while importing must not be shared across processes
+    for engine in shard_router.engines:
+        engine.dispose()
+
+    app = "app.main:app"
+    if args.preload:
+        from app.main import app
+    config = uvicorn.Config(
+        app,
+        lifespan="on",  # startup/shutdown hooks start and stop the bus and metrics threads
+        log_level=args.log_level,
+        proxy_headers=True,
+        timeout_keep_alive=args.keep_alive
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(args) -> None:
+    run_dir = tempfile.mkdtemp(prefix="followwise-")
+    # Set before the app is imported so the bus and metrics pick it up in every worker
+    os.environ["INVALIDATION_BUS_DIR"] = run_dir
+
+    if args.preload:
+        import app.main  # noqa: F401
+
+    sock = _bind(args.host, args.port)
+    workers: Dict[int, int] = {}  # pid -> worker id
+    stopping = False
+
+    def spawn(worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(worker_id, sock, args)
+            finally:
+                os._exit(0)
+        workers[pid] = worker_id
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers (run dir {run_dir})", flush=True)
+    for worker_id in range(args.workers):
+        spawn(worker_id)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        worker_id = workers.pop(pid, None)
+        if worker_id is None or stopping:
+            continue
+        print(f"Worker {worker_id} (pid {pid}) exited with status {status}; restarting", file=sys.stderr, flush=True)
+        time.sleep(args.restart_delay)
+        spawn(worker_id)
+
+    for entry in os.scandir(run_dir):
+        os.unlink(entry.path)
+    os.rmdir(run_dir)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the API with multiple worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="import the app in each worker instead of once before forking")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--restart-delay", type=float, default=1.0)
+    serve(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Hot/cold archival of inactive leads and old sent-email logs.
+
+Soft-deleted leads (``is_active = False``) and sent emails older than
+``ARCHIVE_EMAIL_RETENTION_DAYS`` are moved into the ``archived_*`` tables of
+the same shard, one chunk per transaction, so the hot tables stay small and
+write locks stay short. Run it from the API process by setting
+``ARCHIVE_INTERVAL_SECONDS``, or from cron:
+
+    python -m app.services.archive_service
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, literal, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.db.base import SessionLocal
+from app.models.lead import Lead
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.models.lead_summary import LeadSummary
+from app.models.email_event import EmailEvent
+from app.models.change_sequence import lead_tombstones_from
+from app.models.sent_email_log import SentEmailLog
+from app.models.archived_lead import ArchivedLead
+from app.models.archived_sent_email_log import ArchivedSentEmailLog
+from app.services.lead_changes import LeadChangeFeed
+from app.services.idempotency import IdempotencyService
+from app.services.refresh_tokens import RefreshTokenService
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EMAIL_RETENTION_DAYS = int(os.getenv("ARCHIVE_EMAIL_RETENTION_DAYS", "365"))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+
+_LEAD_COLUMNS = [
+    c.key for c in Lead.__table__.columns
+    if c.key not in (
+        "id", "change_seq", "emails_sent_count", "last_sent_at", "last_suggestion_at",
+        "opens_count", "clicks_count", "last_opened_at"
+    )
+]
+_EMAIL_COLUMNS = [
+    c.key for c in SentEmailLog.__table__.columns
+    if c.key not in ("id", "opens_count", "clicks_count", "first_opened_at", "tracking_key")
+]
+
+
+def _copy_rows(db: Session, source, target, columns: List[str], where, now: datetime) -> None:
+    """INSERT INTO target SELECT ... FROM source, keeping the source id as original_id."""
+    src = source.__table__
+    db.execute(
+        insert(target.__table__).from_select(
+            ["original_id"] + columns + ["archived_at"],
+            select(src.c.id, *[src.c[name] for name in columns], literal(now)).where(where)
+        )
+    )
+
+
+class ArchiveService:
+    @staticmethod
+    def archive_inactive_leads(db: Session, chunk_size: int = ARCHIVE_CHUNK_SIZE, user_id: Optional[int] = None) -> int:
+        """Archive one chunk of inactive leads with their sent emails. Returns leads moved."""
+        query = db.query(Lead.id).filter(Lead.is_active == False)
+        if user_id is not None:
+            query = query.filter(Lead.user_id == user_id)
+        lead_ids = [row.id for row in query.order_by(Lead.id).limit(chunk_size)]
+        if not lead_ids:
+            return 0
+
+        now = datetime.utcnow()
+        _copy_rows(db, Lead, ArchivedLead, _LEAD_COLUMNS, Lead.id.in_(lead_ids), now)
+        _copy_rows(db, SentEmailLog, ArchivedSentEmailLog, _EMAIL_COLUMNS, SentEmailLog.lead_id.in_(lead_ids), now)
+
+        # Suggestions, summaries and tracking events are derived data; they are dropped rather than archived
+        db.query(FollowUpSuggestion).filter(FollowUpSuggestion.lead_id.in_(lead_ids)).delete(synchronize_session=False)
+        db.query(EmailEvent).filter(EmailEvent.lead_id.in_(lead_ids)).delete(synchronize_session=False)
+        db.query(LeadSummary).filter(LeadSummary.lead_id.in_(lead_ids)).delete(synchronize_session=False)
+        db.query(SentEmailLog).filter(SentEmailLog.lead_id.in_(lead_ids)).delete(synchronize_session=False)
+        # Archived leads leave the hot table, so delta-sync clients see them as deleted
+        lead_tombstones_from(db, lead_ids)
+        db.query(Lead).filter(Lead.id.in_(lead_ids)).delete(synchronize_session=False)
+        db.commit()
+        return len(lead_ids)
+
+    @staticmethod
+    def archive_old_emails(
+        db: Session,
+        retention_days: int = ARCHIVE_EMAIL_RETENTION_DAYS,
+        chunk_size: int = ARCHIVE_CHUNK_SIZE
+    ) -> int:
+        """Archive one chunk of sent emails older than the retention window. Returns emails moved."""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        email_ids = [
+            row.id for row in db.query(SentEmailLog.id)
+            .filter(SentEmailLog.sent_at < cutoff)
+            .order_by(SentEmailLog.id)
+            .limit(chunk_size)
+        ]
+        if not email_ids:
+            return 0
+
+        _copy_rows(db, SentEmailLog, ArchivedSentEmailLog, _EMAIL_COLUMNS, SentEmailLog.id.in_(email_ids), datetime.utcnow())
+        db.query(SentEmailLog).filter(SentEmailLog.id.in_(email_ids)).delete(synchronize_session=False)
+        db.commit()
+        return len(email_ids)
+
+    @staticmethod
+    def run(db: Session, max_chunks: Optional[int] = None) -> Dict[str, int]:
+        """Archive chunk after chunk on one database until nothing is left (or max_chunks)."""
+        moved = {
+            "leads": 0,
+            "sent_emails": 0,
+            "tombstones": LeadChangeFeed.prune_tombstones(db),
+            "idempotency_keys": IdempotencyService.prune(db),
+        }
+        chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            leads = ArchiveService.archive_inactive_leads(db)
+            emails = ArchiveService.archive_old_emails(db)
+            moved["leads"] += leads
+            moved["sent_emails"] += emails
+            chunks += 1
+            if not leads and not emails:
+                break
+        return moved
+
+    @staticmethod
+    def run_all_shards(max_chunks: Optional[int] = None) -> Dict[str, int]:
+        from app.db.sharding import shard_router
+
+        moved: Dict[str, int] = {}
+        for shard_id in range(shard_router.shard_count):
+            db = shard_router.session(shard_id)
+            try:
+                shard_moved = ArchiveService.run(db, max_chunks=max_chunks)
+            finally:
+                db.close()
+            for key, count in shard_moved.items():
+                moved[key] = moved.get(key, 0) + count
+
+        # Sessions live with the users on the primary, not on the shards
+        primary = SessionLocal()
+        try:
+            moved["refresh_sessions"] = RefreshTokenService.prune(primary)
+        finally:
+            primary.close()
+        if moved["leads"] or moved["sent_emails"]:
+            logger.info("Archived %(leads)d leads and %(sent_emails)d sent emails", moved)
+        return moved
+
+
+async def archive_periodically(interval_seconds: float = ARCHIVE_INTERVAL_SECONDS):
+    """Background loop for the API process; each pass runs in a worker thread."""
+    while True:
+        try:
+            await run_in_threadpool(ArchiveService.run_all_shards)
+        except Exception:
+            logger.exception("Archival pass failed")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    print(f"Archived: {ArchiveService.run_all_shards()}")
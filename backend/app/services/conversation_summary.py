@@ -0,0 +1,110 @@
+"""
+Rolling per-lead conversation summaries.
+
+Each sent email adds one dated digest line to the lead's ``LeadSummary``; the
+oldest lines are dropped once the summary exceeds ``SUMMARY_TOKEN_BUDGET``.
+Generation reads the stored summary instead of walking the whole email
+history, and history is only folded in full once, for leads that predate
+summaries.
+"""
+import os
+import re
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from ..ai.tokenizer import count_tokens, truncate_to_tokens
+from ..models.lead_summary import LeadSummary
+from ..models.sent_email_log import SentEmailLog
+from ..models.content_blob import load_body
+
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))
+DIGEST_BODY_TOKENS = 30
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _insert_summary_if_missing(db: Session, seed: LeadSummary) -> None:
+    values = dict(
+        lead_id=seed.lead_id,
+        summary=seed.summary,
+        emails_summarized=seed.emails_summarized,
+        emails_dropped=seed.emails_dropped,
+        updated_at=datetime.utcnow()
+    )
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        db.execute(LeadSummary.__table__.insert().values(**values))
+        return
+    # Two generations for the same lead may seed at once; the second keeps the first's row
+    db.execute(insert(LeadSummary.__table__).values(**values).on_conflict_do_nothing(index_elements=["lead_id"]))
+
+
+class ConversationSummaryService:
+    @staticmethod
+    def digest_line(sent_at: Optional[datetime], subject: str, body: str) -> str:
+        """One line per email: date, subject and the first sentence of the body."""
+        first_sentence = _SENTENCE_END.split(" ".join(body.split()), maxsplit=1)[0]
+        date = (sent_at or datetime.utcnow()).strftime("%Y-%m-%d")
+        return f"{date} sent \"{subject}\": {truncate_to_tokens(first_sentence, DIGEST_BODY_TOKENS)}"
+
+    @staticmethod
+    def _append(summary: LeadSummary, line: str) -> None:
+        lines = summary.summary.splitlines() if summary.summary else []
+        lines.append(line)
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > SUMMARY_TOKEN_BUDGET:
+            lines.pop(0)
+            summary.emails_dropped = (summary.emails_dropped or 0) + 1
+        summary.summary = "\n".join(lines)
+        summary.emails_summarized = (summary.emails_summarized or 0) + 1
+
+    @staticmethod
+    def record_email(
+        db: Session,
+        lead_id: int,
+        subject: str,
+        body: str,
+        sent_at: Optional[datetime] = None
+    ) -> LeadSummary:
+        """Fold a just-sent email into the lead's summary (joins the caller's transaction)."""
+        summary = ConversationSummaryService.get_or_seed(db, lead_id)
+        ConversationSummaryService._append(summary, ConversationSummaryService.digest_line(sent_at, subject, body))
+        return summary
+
+    @staticmethod
+    def get_or_seed(db: Session, lead_id: int) -> LeadSummary:
+        """The lead's summary, built once from existing history if it has none yet."""
+        summary = db.query(LeadSummary).get(lead_id)
+        if summary is not None:
+            return summary
+
+        seed = LeadSummary(lead_id=lead_id, summary="", emails_summarized=0, emails_dropped=0)
+        history = db.query(SentEmailLog)\
+            .options(load_body(SentEmailLog))\
+            .filter(SentEmailLog.lead_id == lead_id)\
+            .order_by(SentEmailLog.sent_at)\
+            .yield_per(200)
+        for email in history:
+            ConversationSummaryService._append(
+                seed, ConversationSummaryService.digest_line(email.sent_at, email.subject, email.body)
+            )
+        _insert_summary_if_missing(db, seed)
+        # Ours or a concurrent generation's seed, whichever was stored first
+        return db.query(LeadSummary).get(lead_id)
+
+    @staticmethod
+    def render(summary: Optional[LeadSummary], skip_latest: int = 0) -> str:
+        """The summary as prompt text, without the digests of the ``skip_latest`` newest emails."""
+        if summary is None or not summary.summary:
+            return ""
+        lines = summary.summary.splitlines()
+        text = "\n".join(lines[:max(len(lines) - skip_latest, 0)])
+        if summary.emails_dropped:
+            notice = f"({summary.emails_dropped} earlier emails not shown)"
+            return f"{notice}\n{text}" if text else notice
+        return text
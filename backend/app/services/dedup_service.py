@@ -0,0 +1,266 @@
+"""
+Duplicate-lead detection and merging.
+
+Leads are normalized (email aliases folded, names and company names stripped
+of punctuation, accents, titles and legal suffixes) and grouped into blocks by
+cheap keys: the normalized email, the email's company domain, and a phonetic
+key of the name. Only leads sharing a block are compared, and blocks larger
+than ``DEDUP_MAX_BLOCK_SIZE`` fall back to comparing each lead with its
+``DEDUP_WINDOW`` neighbours in name order. Accounts above
+``DEDUP_PARALLEL_MIN_LEADS`` spread the comparisons over a process pool.
+
+Matches above ``DEDUP_THRESHOLD`` are clustered (a transitive match joins two
+clusters), and ``DedupService.merge`` folds a cluster into one lead, moving
+sent emails and suggestions over with set-based UPDATEs.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from functools import partial
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.text import fold
+from app.models.lead import Lead
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.models.sent_email_log import SentEmailLog
+from app.models.archived_sent_email_log import ArchivedSentEmailLog
+from app.models.lead_summary import LeadSummary
+from app.models.email_event import EmailEvent
+from app.models.change_sequence import current_change_seq, lead_tombstones_from
+from app.services.lead_counters import LeadCounterService
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+DEDUP_MAX_BLOCK_SIZE = int(os.getenv("DEDUP_MAX_BLOCK_SIZE", "200"))
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "20"))
+DEDUP_PARALLEL_MIN_LEADS = int(os.getenv("DEDUP_PARALLEL_MIN_LEADS", "20000"))
+DEDUP_WORKERS = int(os.getenv("DEDUP_WORKERS", "0")) or os.cpu_count() or 1
+
+FREE_MAIL_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "mail.com",
+})
+NAME_TITLES = frozenset({"mr", "mrs", "ms", "miss", "dr", "prof", "sir", "jr", "sr", "ii", "iii"})
+COMPANY_SUFFIXES = frozenset({
+    "inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "co", "company",
+    "gmbh", "ag", "sa", "srl", "bv", "plc", "pty", "oy", "ab",
+})
+
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"]) for c in letters}
+
+
+class LeadRecord(NamedTuple):
+    """Normalized, picklable view of a lead for comparison in worker processes."""
+    id: int
+    email: str
+    domain: str
+    name: str
+    company: str
+
+
+def normalize_email(email: Optional[str]) -> str:
+    email = (email or "").strip().lower()
+    local, _, domain = email.partition("@")
+    local = local.split("+", 1)[0]
+    if domain in ("gmail.com", "googlemail.com"):
+        local, domain = local.replace(".", ""), "gmail.com"
+    return f"{local}@{domain}" if domain else local
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join(word for word in fold(name).split() if word not in NAME_TITLES)
+
+
+def normalize_company(company: Optional[str]) -> str:
+    return " ".join(word for word in fold(company).split() if word not in COMPANY_SUFFIXES)
+
+
+def soundex(word: str) -> str:
+    if not word:
+        return ""
+    codes = [_SOUNDEX_CODES.get(c, "") for c in word]
+    key, last = word[0].upper(), codes[0]
+    for char, code in zip(word[1:], codes[1:]):
+        if code and code != "0" and code != last:
+            key += code
+        if char not in "hw":  # h and w do not separate equal codes
+            last = code
+    return (key + "000")[:4]
+
+
+def to_record(lead: Lead) -> LeadRecord:
+    email = normalize_email(lead.contact_email)
+    return LeadRecord(
+        id=lead.id,
+        email=email,
+        domain=email.partition("@")[2],
+        name=normalize_name(lead.contact_name),
+        company=normalize_company(lead.company),
+    )
+
+
+def blocking_keys(record: LeadRecord) -> List[Tuple[str, str]]:
+    keys = [("email", record.email)]
+    if record.domain and record.domain not in FREE_MAIL_DOMAINS:
+        keys.append(("domain", record.domain))
+    words = record.name.split()
+    if words:
+        # First initial plus phonetic surname: "Jon Smyth" and "John Smith" share S530
+        keys.append(("name", words[0][0] + soundex(words[-1])))
+    return keys
+
+
+def similarity(a: LeadRecord, b: LeadRecord, threshold: float = 0.0) -> float:
+    """Match score in [0, 1]. Scores that cannot reach ``threshold`` may come back as upper bounds."""
+    if a.email and a.email == b.email:
+        return 1.0
+    score = 0.0
+    if a.domain and a.domain == b.domain and a.domain not in FREE_MAIL_DOMAINS:
+        score += 0.15
+    fuzzy_company = bool(a.company and b.company and a.company != b.company)
+    if a.company and a.company == b.company:
+        score += 0.25
+    # Full ratios are the expensive part; stop once cheap upper bounds already fall short
+    matcher = SequenceMatcher(None, a.name, b.name)
+    for ratio in (matcher.real_quick_ratio, matcher.quick_ratio, matcher.ratio):
+        name_score = 0.6 * ratio()
+        bound = score + name_score + (0.25 if fuzzy_company else 0.0)
+        if bound < threshold:
+            return bound
+    if fuzzy_company:
+        score += 0.25 * SequenceMatcher(None, a.company, b.company).ratio()
+    return score + name_score
+
+
+def compare_block(block: List[LeadRecord], threshold: float = DEDUP_THRESHOLD) -> List[Tuple[int, int, float]]:
+    """Matching pairs within one block. Large blocks only compare name-order neighbours."""
+    if len(block) > DEDUP_MAX_BLOCK_SIZE:
+        block = sorted(block, key=lambda r: r.name)
+        candidates = ((a, b) for i, a in enumerate(block) for b in block[i + 1:i + 1 + DEDUP_WINDOW])
+    else:
+        candidates = ((a, b) for i, a in enumerate(block) for b in block[i + 1:])
+    pairs = []
+    for a, b in candidates:
+        score = similarity(a, b, threshold)
+        if score >= threshold:
+            pairs.append((min(a.id, b.id), max(a.id, b.id), score))
+    return pairs
+
+
+def _compare_blocks(blocks: List[List[LeadRecord]], threshold: float = DEDUP_THRESHOLD) -> List[Tuple[int, int, float]]:
+    # Top-level so worker processes can unpickle it
+    return [pair for block in blocks for pair in compare_block(block, threshold)]
+
+
+def _chunks(items: List, count: int) -> Iterable[List]:
+    for i in range(count):
+        chunk = items[i::count]
+        if chunk:
+            yield chunk
+
+
+def _clusters(pairs: Iterable[Tuple[int, int, float]]) -> Dict[int, Tuple[Set[int], float]]:
+    """Union-find over matching pairs; returns root -> (member ids, lowest pair score)."""
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    scores: Dict[Tuple[int, int], float] = {}
+    for a, b, score in pairs:
+        scores[(a, b)] = max(score, scores.get((a, b), 0.0))
+        parent[find(a)] = find(b)
+
+    groups: Dict[int, Tuple[Set[int], float]] = {}
+    for (a, b), score in scores.items():
+        members, low = groups.get(find(a), (set(), 1.0))
+        members.update((a, b))
+        groups[find(a)] = (members, min(low, score))
+    return groups
+
+
+class DedupService:
+    @staticmethod
+    def find_duplicates(db: Session, user_id: int, threshold: float = DEDUP_THRESHOLD) -> List[Dict]:
+        """Groups of likely-duplicate leads for a user, the oldest lead of each first."""
+        leads = db.query(Lead.id, Lead.contact_email, Lead.contact_name, Lead.company)\
+            .filter(Lead.user_id == user_id)\
+            .all()
+
+        blocks: Dict[Tuple[str, str], List[LeadRecord]] = {}
+        for lead in leads:
+            record = to_record(lead)
+            for key in blocking_keys(record):
+                blocks.setdefault(key, []).append(record)
+        candidate_blocks = [block for block in blocks.values() if len(block) > 1]
+
+        if len(leads) >= DEDUP_PARALLEL_MIN_LEADS and len(candidate_blocks) > 1:
+            with ProcessPoolExecutor(max_workers=DEDUP_WORKERS) as pool:
+                # Several chunks per worker keeps the pool busy when block sizes are uneven
+                results = pool.map(partial(_compare_blocks, threshold=threshold), _chunks(candidate_blocks, DEDUP_WORKERS * 4))
+                pairs = [pair for result in results for pair in result]
+        else:
+            pairs = _compare_blocks(candidate_blocks, threshold)
+
+        return sorted(
+            ({"lead_ids": sorted(members), "score": round(score, 3)} for members, score in _clusters(pairs).values()),
+            key=lambda group: (-group["score"], group["lead_ids"][0])
+        )
+
+    @staticmethod
+    def merge(db: Session, user_id: int, primary_id: int, duplicate_ids: List[int]) -> Optional[Lead]:
+        """
+        Fold duplicates into the primary lead: fill its empty fields, move their sent
+        emails (hot and archived) and tracking events over, and delete them with their
+        suggestions. Returns None unless the user owns all of the leads.
+        """
+        duplicate_ids = sorted(set(duplicate_ids) - {primary_id})
+        leads = db.query(Lead)\
+            .filter(Lead.user_id == user_id, Lead.id.in_([primary_id] + duplicate_ids))\
+            .all()
+        if len(leads) != len(duplicate_ids) + 1:
+            return None
+        primary = next(lead for lead in leads if lead.id == primary_id)
+        duplicates = sorted((lead for lead in leads if lead.id != primary_id), key=lambda lead: lead.created_at)
+
+        for duplicate in duplicates:
+            for field in ("company", "phone", "last_email_snippet", "next_followup_at"):
+                if getattr(primary, field) is None and getattr(duplicate, field) is not None:
+                    setattr(primary, field, getattr(duplicate, field))
+            if duplicate.notes and duplicate.notes != primary.notes:
+                primary.notes = f"{primary.notes}\n\n{duplicate.notes}" if primary.notes else duplicate.notes
+            primary.lead_score = max(primary.lead_score, duplicate.lead_score)
+            primary.created_at = min(primary.created_at, duplicate.created_at)
+
+        if duplicate_ids:
+            for model in (SentEmailLog, ArchivedSentEmailLog, EmailEvent):
+                db.query(model)\
+                    .filter(model.user_id == user_id, model.lead_id.in_(duplicate_ids))\
+                    .update({model.lead_id: primary_id}, synchronize_session=False)
+            # Each lead keeps one draft per variant_index; the primary's own drafts stay
+            db.query(FollowUpSuggestion)\
+                .filter(FollowUpSuggestion.lead_id.in_(duplicate_ids))\
+                .delete(synchronize_session=False)
+            # The merged history is summarized again on the next generation
+            db.query(LeadSummary)\
+                .filter(LeadSummary.lead_id.in_([primary_id] + duplicate_ids))\
+                .delete(synchronize_session=False)
+            lead_tombstones_from(db, duplicate_ids)
+            seq = current_change_seq(db, user_id)
+            # Readers that follow the sequence (snapshots) re-read the primary's moved emails
+            db.query(Lead)\
+                .filter(Lead.id == primary_id)\
+                .update({Lead.change_seq: seq, Lead.updated_at: Lead.updated_at}, synchronize_session=False)
+            db.query(Lead)\
+                .filter(Lead.user_id == user_id, Lead.id.in_(duplicate_ids))\
+                .delete(synchronize_session=False)
+        db.commit()
+        if duplicate_ids:
+            LeadCounterService.reconcile(db, [primary_id])
+        db.refresh(primary)
+        return primary
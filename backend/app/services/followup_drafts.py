@@ -0,0 +1,142 @@
+"""
+Generation and storage of a lead's follow-up drafts (``FollowUpSuggestion``).
+
+Shared by the interactive ``generate-followups`` endpoint and background
+pre-generation (``app.services.pregeneration``). Every stored draft records
+``lead_fingerprint``, a hash of the lead fields and email history the
+generation read. Pre-generated drafts (``origin="pregenerated"``) whose
+fingerprint no longer matches the lead are stale: reads skip them and the
+next pre-generation pass replaces them. Drafts the user generated are always
+shown, and a pre-generation never replaces them, even one that was already
+waiting on the provider when the user generated.
+"""
+import hashlib
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from app.ai.providers import AIProvider
+from app.ai.templates import lead_context, render_variants, template_registry
+from app.ai.prompt_builder import PROMPT_RECENT_EMAILS, prompt_builder
+from app.models.lead import Lead
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.models.sent_email_log import SentEmailLog
+from app.models.content_blob import load_body
+from app.schemas.followup import FollowUpTone
+from app.services.conversation_summary import ConversationSummaryService
+from app.services.lead_counters import LeadCounterService
+
+PREGENERATED = "pregenerated"
+
+
+def draft_fingerprint(lead: Lead) -> str:
+    """Hash of everything a generation reads from the lead; a sent email changes it too."""
+    parts = (
+        lead.contact_name, lead.company, lead.last_email_snippet, lead.notes,
+        lead.emails_sent_count, lead.last_sent_at.isoformat() if lead.last_sent_at else None,
+    )
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+def fresh_drafts(lead: Lead, suggestions: List[FollowUpSuggestion]) -> List[FollowUpSuggestion]:
+    """``suggestions`` without pre-generated drafts made for an earlier version of the lead."""
+    fingerprint = draft_fingerprint(lead)
+    return [s for s in suggestions if s.origin != PREGENERATED or s.lead_fingerprint == fingerprint]
+
+
+class FollowUpDraftService:
+    @staticmethod
+    async def generate(
+        db: Session,
+        lead: Lead,
+        user_name: Optional[str],
+        tone: FollowUpTone,
+        ai_provider: AIProvider,
+        slot: Callable,
+        context: Optional[str] = None,
+        template_only: bool = False,
+        origin: Optional[str] = None
+    ) -> List[FollowUpSuggestion]:
+        """
+        Generate the lead's drafts and replace its stored ones. ``slot()`` is the async
+        context manager the provider call runs under. Commits. A pre-generation
+        (``origin=PREGENERATED``) that finds drafts the user generated meanwhile
+        stores nothing and returns an empty list.
+        """
+        fingerprint = draft_fingerprint(lead)
+        seen_suggestion_at = lead.last_suggestion_at
+        context = context or lead_context(lead)
+        lead_info = {
+            'contact_name': lead.contact_name,
+            'company': lead.company,
+            'user_name': user_name
+        }
+
+        if template_only:
+            # Zero-LLM path: the user's compiled templates, rendered in-process
+            templates = template_registry.for_user(db, lead.user_id, tone)
+            suggestions_data = render_variants(templates, tone, context, lead_info)
+        else:
+            # History goes in under a token budget: rolling summary plus the latest emails
+            recent_emails = db.query(SentEmailLog)\
+                .options(load_body(SentEmailLog))\
+                .filter(SentEmailLog.lead_id == lead.id)\
+                .order_by(SentEmailLog.sent_at.desc())\
+                .limit(PROMPT_RECENT_EMAILS)\
+                .all()
+            prompt = prompt_builder.build(
+                lead,
+                context=context,
+                summary=ConversationSummaryService.get_or_seed(db, lead.id),
+                recent_emails=recent_emails
+            )
+            async with slot():
+                suggestions_data = await ai_provider.generate_followup_variants(
+                    context=prompt.context,
+                    tone=tone,
+                    lead_info=lead_info,
+                    previous_interactions=prompt.previous_interactions
+                )
+
+        # The provider call can take seconds: claim the lead with one conditional UPDATE
+        # of its row, which also orders this replacement after any other one for the lead
+        generated_at = datetime.utcnow()
+        if origin == PREGENERATED:
+            user_drafts = exists().where(
+                FollowUpSuggestion.lead_id == lead.id,
+                FollowUpSuggestion.origin.is_distinct_from(PREGENERATED)
+            )
+            # Compare-and-swap: no drafts stored since we read the lead, and none of the user's
+            claimed = LeadCounterService.record_suggestions(
+                db, lead.user_id, lead.id, generated_at,
+                Lead.last_suggestion_at.isnot_distinct_from(seen_suggestion_at),
+                ~user_drafts
+            )
+            if not claimed:
+                db.rollback()
+                return []
+        else:
+            LeadCounterService.record_suggestions(db, lead.user_id, lead.id, generated_at)
+
+        # Delete any existing suggestions for this lead
+        db.query(FollowUpSuggestion).filter(FollowUpSuggestion.lead_id == lead.id).delete()
+
+        suggestions = []
+        for i, suggestion_data in enumerate(suggestions_data):
+            suggestion = FollowUpSuggestion(
+                lead_id=lead.id,
+                variant_index=i,
+                subject=suggestion_data.subject,
+                body=suggestion_data.body,
+                tone=tone.value,
+                origin=origin,
+                lead_fingerprint=fingerprint,
+                created_at=generated_at  # matches the lead's stamp, which reconcile recomputes from it
+            )
+            db.add(suggestion)
+            suggestions.append(suggestion)
+
+        db.commit()
+        return suggestions
@@ -0,0 +1,100 @@
+"""
+Idempotency keys for retried POSTs.
+
+A client sending ``Idempotency-Key: <key>`` gets the stored response of the
+first request with that key replayed (``Idempotent-Replayed: true``) instead
+of the work being repeated. Reusing a key with a different request is
+rejected with 422, and a retry arriving while the first request is still
+running gets 409. Keys are per user and expire after ``IDEMPOTENCY_TTL_HOURS``;
+failed requests release their key so the client can retry.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.idempotency_key import IdempotencyKey
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+
+def request_fingerprint(route: str, body: Any) -> str:
+    payload = json.dumps([route, jsonable_encoder(body)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IdempotencyService:
+    @staticmethod
+    def begin(db: Session, user_id: int, key: str, fingerprint: str) -> Optional[JSONResponse]:
+        """
+        Claim ``key`` for this request. Returns the stored response to replay if the
+        key was already used for the same request, or None if the caller should proceed.
+        """
+        cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        # Expired claims are released rather than replayed
+        db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.created_at < cutoff)\
+            .delete(synchronize_session=False)
+
+        db.add(IdempotencyKey(user_id=user_id, key=key, fingerprint=fingerprint))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        stored = db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).first()
+        if stored is None:
+            # Released by a failed first attempt in the meantime
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Request with this Idempotency-Key failed; retry")
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        if stored.status_code is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "1"}
+            )
+        return JSONResponse(
+            status_code=stored.status_code,
+            content=json.loads(stored.response),
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    @staticmethod
+    def complete(db: Session, user_id: int, key: str, status_code: int, body: Any) -> None:
+        db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)\
+            .update({
+                IdempotencyKey.status_code: status_code,
+                IdempotencyKey.response: json.dumps(jsonable_encoder(body)),
+            }, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def release(db: Session, user_id: int, key: str) -> None:
+        db.rollback()
+        db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)\
+            .delete(synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def prune(db: Session) -> int:
+        """Delete expired keys. Returns rows deleted."""
+        cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        deleted = db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.created_at < cutoff)\
+            .delete(synchronize_session=False)
+        db.commit()
+        return deleted
@@ -0,0 +1,131 @@
+"""
+Delta sync for leads.
+
+``LeadChangeFeed.since`` returns the leads written and the tombstones left
+after a cursor, in change-sequence order, so a polling client downloads only
+what changed. Cursors are ``<shard>.<sequence>`` on the user's own counter: a
+cursor from another shard (the user was moved) or from ahead of the user's
+counter (restored database) cannot be trusted, and the client is told to resync from scratch. The same
+happens to cursors older than the tombstones pruned by archival
+(``TOMBSTONE_RETENTION_DAYS``).
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.models.lead import Lead
+from app.models.lead_tombstone import LeadTombstone
+from app.models.change_sequence import ChangeSequence, current_change_seq, next_change_seq
+
+CHANGE_FEED_PAGE_SIZE = int(os.getenv("CHANGE_FEED_PAGE_SIZE", "500"))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+# Per user: highest change sequence whose tombstones may have been pruned
+PRUNED_SEQUENCE = "lead_tombstones_pruned"
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not cursor:
+        return None
+    try:
+        shard, seq = cursor.split(".")
+        return int(shard), int(seq)
+    except ValueError:
+        raise ValueError("Malformed cursor")
+
+
+def format_cursor(shard_id: int, seq: int) -> str:
+    return f"{shard_id}.{seq}"
+
+
+class LeadChangeFeed:
+    @staticmethod
+    def since(
+        db: Session,
+        user_id: int,
+        shard_id: int,
+        cursor: Optional[str],
+        limit: int = CHANGE_FEED_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """One page of changes after ``cursor`` (``None`` for a full sync)."""
+        head = current_change_seq(db, user_id)
+        parsed = parse_cursor(cursor)
+        reset = parsed is not None and (
+            parsed[0] != shard_id or parsed[1] > head or parsed[1] < current_change_seq(db, user_id, PRUNED_SEQUENCE)
+        )
+        since = 0 if parsed is None or reset else parsed[1]
+
+        # Fetch one extra row per stream to know whether another page follows
+        leads = db.query(Lead)\
+            .filter(Lead.user_id == user_id, Lead.change_seq > since).order_by(Lead.change_seq, Lead.id).limit(limit + 1).all()
+
+        tombstones: List[LeadTombstone] = []
+        if since:
+            # A full sync has nothing to delete on the client
+            tombstones = db.query(LeadTombstone)\
+                .filter(LeadTombstone.user_id == user_id, LeadTombstone.change_seq > since)\
+                .order_by(LeadTombstone.change_seq, LeadTombstone.id)\
+                .limit(limit + 1).all()
+
+        merged = sorted(
+            [(lead.change_seq, False, lead) for lead in leads] +
+            [(t.change_seq, True, t) for t in tombstones],
+            key=lambda item: item[0]
+        )
+        has_more = len(merged) > limit
+        if has_more:
+            # Never split one sequence number across pages, or the cursor would skip its rest
+            boundary = merged[limit][0]
+            page = [item for item in merged[:limit] if item[0] < boundary]
+            if not page:
+                # The overflow group itself was cut by the per-stream limit; fetch it whole
+                page = LeadChangeFeed._whole_group(db, user_id, boundary)
+            cursor_seq = page[-1][0]
+        else:
+            page = merged
+            cursor_seq = head
+
+        return {
+            "cursor": format_cursor(shard_id, cursor_seq),
+            "reset": reset,
+            "has_more": has_more,
+            "changed": [row for _, is_tombstone, row in page if not is_tombstone],
+            "deleted": [row.lead_id for _, is_tombstone, row in page if is_tombstone],
+        }
+
+    @staticmethod
+    def _whole_group(db: Session, user_id: int, seq: int) -> List[Tuple[int, bool, Any]]:
+        leads = db.query(Lead).filter(Lead.user_id == user_id, Lead.change_seq == seq).all()
+        tombstones = db.query(LeadTombstone)\
+            .filter(LeadTombstone.user_id == user_id, LeadTombstone.change_seq == seq).all()
+        return [(seq, False, lead) for lead in leads] + [(seq, True, t) for t in tombstones]
+
+    @staticmethod
+    def prune_tombstones(db: Session, retention_days: int = TOMBSTONE_RETENTION_DAYS) -> int:
+        """Delete old tombstones, invalidating cursors that could still need them. Returns rows deleted."""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        horizons = db.query(LeadTombstone.user_id, func.max(LeadTombstone.change_seq))\
+            .filter(LeadTombstone.deleted_at < cutoff)\
+            .group_by(LeadTombstone.user_id)\
+            .order_by(LeadTombstone.user_id).all()
+        deleted = 0
+        for user_id, horizon in horizons:
+            if current_change_seq(db, user_id, PRUNED_SEQUENCE) == 0:
+                next_change_seq(db, user_id, PRUNED_SEQUENCE)  # creates the row
+            db.execute(
+                update(ChangeSequence.__table__)
+                .where(
+                    ChangeSequence.user_id == user_id,
+                    ChangeSequence.name == PRUNED_SEQUENCE,
+                    ChangeSequence.value < horizon
+                )
+                .values(value=horizon)
+            )
+            deleted += db.query(LeadTombstone)\
+                .filter(LeadTombstone.user_id == user_id, LeadTombstone.change_seq <= horizon)\
+                .delete(synchronize_session=False)
+        db.commit()
+        return deleted
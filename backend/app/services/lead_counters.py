@@ -0,0 +1,135 @@
+"""
+Denormalized engagement counters on ``Lead``.
+
+``emails_sent_count``, ``last_sent_at`` and ``last_suggestion_at`` are bumped
+by the code that logs a sent email or stores suggestions, in the same
+transaction, so lead lists can show and sort by them without touching the
+log tables. The increment is a single ``UPDATE ... SET n = n + 1`` and is safe
+under concurrent sends.
+
+Writes that bypass these helpers (imports, manual SQL, a crash between
+statements on a database without transactions) can leave the counters off;
+``reconcile`` recomputes them from ``sent_email_logs`` (hot and archived),
+``followup_suggestions`` and ``email_events`` (the open and click counters
+kept by ``app.services.tracking``) and rewrites only the leads that drifted:
+
+    python -m app.services.lead_counters
+"""
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.lead import Lead
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.models.sent_email_log import SentEmailLog
+from app.models.archived_sent_email_log import ArchivedSentEmailLog
+from app.models.email_event import EmailEvent
+from app.models.change_sequence import next_change_seq, next_change_seqs
+
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "1000"))
+
+
+class LeadCounterService:
+    @staticmethod
+    def record_sent_email(db: Session, user_id: int, lead_id: int, sent_at: datetime) -> None:
+        """Count one more sent email for the user's lead. Does not commit."""
+        db.query(Lead)\
+            .filter(Lead.id == lead_id, Lead.user_id == user_id)\
+            .update({
+                Lead.emails_sent_count: Lead.emails_sent_count + 1,
+                Lead.last_sent_at: sent_at,
+                Lead.updated_at: Lead.updated_at,  # engagement is not an edit of the lead
+                Lead.change_seq: next_change_seq(db, user_id),
+            }, synchronize_session=False)
+
+    @staticmethod
+    def record_suggestions(db: Session, user_id: int, lead_id: int, generated_at: datetime, *criteria) -> bool:
+        """
+        Stamp the user's lead's latest suggestion generation, only if the lead also
+        matches ``criteria``. Returns whether it did. Does not commit.
+        """
+        return bool(db.query(Lead)\
+            .filter(Lead.id == lead_id, Lead.user_id == user_id, *criteria)\
+            .update({
+                Lead.last_suggestion_at: generated_at,
+                Lead.updated_at: Lead.updated_at,
+                Lead.change_seq: next_change_seq(db, user_id),
+            }, synchronize_session=False))
+
+    @staticmethod
+    def reconcile(db: Session, lead_ids: Optional[List[int]] = None, chunk_size: int = RECONCILE_CHUNK_SIZE) -> int:
+        """
+        Recompute the counters from the log tables, for ``lead_ids`` or every lead
+        one chunk per transaction. Returns the number of leads corrected.
+        """
+        emails = union_all(
+            select(SentEmailLog.lead_id, SentEmailLog.sent_at),
+            select(ArchivedSentEmailLog.lead_id, ArchivedSentEmailLog.sent_at)
+        ).subquery()
+        sent_count = select(func.count()).where(emails.c.lead_id == Lead.id).scalar_subquery()
+        last_sent = select(func.max(emails.c.sent_at)).where(emails.c.lead_id == Lead.id).scalar_subquery()
+        last_suggestion = select(func.max(FollowUpSuggestion.created_at))\
+            .where(FollowUpSuggestion.lead_id == Lead.id)\
+            .scalar_subquery()
+        def events(kind, aggregate):
+            return select(aggregate)\
+                .where(EmailEvent.lead_id == Lead.id, EmailEvent.kind == kind)\
+                .scalar_subquery()
+        opens, clicks = events("open", func.count()), events("click", func.count())
+        last_opened = events("open", func.max(EmailEvent.occurred_at))
+        drifted = (
+            Lead.emails_sent_count.is_distinct_from(sent_count)
+            | Lead.last_sent_at.is_distinct_from(last_sent)
+            | Lead.last_suggestion_at.is_distinct_from(last_suggestion)
+            | Lead.opens_count.is_distinct_from(opens)
+            | Lead.clicks_count.is_distinct_from(clicks)
+            | Lead.last_opened_at.is_distinct_from(last_opened)
+        )
+
+        if lead_ids is not None:
+            chunks = [lead_ids[start:start + chunk_size] for start in range(0, len(lead_ids), chunk_size)]
+        else:
+            max_id = db.query(func.max(Lead.id)).scalar() or 0
+            chunks = [(start, start + chunk_size) for start in range(0, max_id + 1, chunk_size)]
+
+        corrected = 0
+        for chunk in chunks:
+            in_chunk = Lead.id.in_(chunk) if lead_ids is not None else Lead.id.between(chunk[0], chunk[1] - 1)
+            owners = [user_id for (user_id,) in db.query(Lead.user_id).filter(in_chunk, drifted).distinct()]
+            if not owners:
+                continue
+            for user_id, seq in next_change_seqs(db, owners).items():
+                corrected += db.query(Lead)\
+                    .filter(in_chunk, Lead.user_id == user_id, drifted)\
+                    .update({
+                        Lead.emails_sent_count: sent_count,
+                        Lead.last_sent_at: last_sent,
+                        Lead.last_suggestion_at: last_suggestion,
+                        Lead.opens_count: opens,
+                        Lead.clicks_count: clicks,
+                        Lead.last_opened_at: last_opened,
+                        Lead.updated_at: Lead.updated_at,
+                        Lead.change_seq: seq,
+                    }, synchronize_session=False)
+            db.commit()
+        return corrected
+
+    @staticmethod
+    def reconcile_all_shards() -> Dict[int, int]:
+        from app.db.sharding import shard_router
+
+        corrected = {}
+        for shard_id in range(shard_router.shard_count):
+            db = shard_router.session(shard_id)
+            try:
+                corrected[shard_id] = LeadCounterService.reconcile(db)
+            finally:
+                db.close()
+        return corrected
+
+
+if __name__ == "__main__":
+    print(f"Leads corrected per shard: {LeadCounterService.reconcile_all_shards()}")
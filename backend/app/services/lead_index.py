@@ -0,0 +1,117 @@
+"""
+Per-user in-memory indexes over leads, shared by ``app.services.similarity_index``
+and ``app.services.prefix_index``.
+
+An index is built on a user's first query and kept current incrementally:
+every query first applies the leads written or tombstoned since the index's
+change sequence. Sending an email or merging duplicates advances the lead's
+sequence too, so writes from every worker and from set-based updates show up
+on the next query, at the cost of two indexed range queries when nothing
+changed. Least recently used indexes are dropped once all of them together
+exceed the cache's byte budget.
+"""
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Dict, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.lead import Lead
+from app.models.lead_tombstone import LeadTombstone
+from app.models.change_sequence import current_change_seq
+from app.services.lead_changes import PRUNED_SEQUENCE
+
+
+class LeadIndex(ABC):
+    """One user's index; subclasses hold the data and report its size."""
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self.built = False
+        self.lead_seq = 0  # change sequence applied so far
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of leads indexed."""
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """Approximate memory held by the index, counted against the cache's budget."""
+
+
+class LeadIndexCache:
+    """LRU of per-user indexes, each brought up to date before it answers."""
+
+    index_class = LeadIndex
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.counters: Counter = Counter()
+        self._indexes: "OrderedDict[int, LeadIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return dict(
+            self.counters,
+            users=len(indexes),
+            leads=sum(len(index) for index in indexes),
+            bytes=sum(index.nbytes for index in indexes)
+        )
+
+    def _build(self, db: Session, user_id: int, index: LeadIndex) -> None:
+        """Fill an empty index with all of the user's leads."""
+        raise NotImplementedError
+
+    def _update(self, db: Session, user_id: int, index: LeadIndex, removed: Set[int], changed: Tuple) -> None:
+        """Drop ``removed`` leads and re-index those matching the ``changed`` filter criteria."""
+        raise NotImplementedError
+
+    def _index_for(self, db: Session, user_id: int, shard_id: int) -> LeadIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.shard_id != shard_id:
+                index = None  # the user moved shards: their lead IDs and sequences changed
+            if index is None:
+                index = self._indexes[user_id] = self.index_class(shard_id)
+            self._indexes.move_to_end(user_id)
+        with index.lock:
+            self._catch_up(db, user_id, index)
+        self._enforce_budget()
+        return index
+
+    def _catch_up(self, db: Session, user_id: int, index: LeadIndex) -> None:
+        head = current_change_seq(db, user_id)
+        if index.built and (index.lead_seq > head or index.lead_seq < current_change_seq(db, user_id, PRUNED_SEQUENCE)):
+            # Restored database, or deletes we can no longer see: start over
+            index.clear()
+
+        if not index.built:
+            self.counters["builds"] += 1
+            self._build(db, user_id, index)
+            index.built = True
+        elif head > index.lead_seq:
+            self.counters["updates"] += 1
+            removed = {lead_id for (lead_id,) in db.query(LeadTombstone.lead_id).filter(
+                LeadTombstone.user_id == user_id,
+                LeadTombstone.change_seq > index.lead_seq,
+                LeadTombstone.change_seq <= head
+            )}
+            changed = (Lead.user_id == user_id, Lead.change_seq > index.lead_seq, Lead.change_seq <= head)
+            self._update(db, user_id, index, removed, changed)
+        index.lead_seq = head
+
+    def _enforce_budget(self) -> None:
+        with self._lock:
+            total = sum(index.nbytes for index in self._indexes.values())
+            while total > self.max_bytes and len(self._indexes) > 1:
+                _, evicted = self._indexes.popitem(last=False)
+                total -= evicted.nbytes
+                self.counters["evictions"] += 1
@@ -4,9 +4,9 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
 from .. import models, schemas
-from ..ai.providers import DummyAIProvider
-
-ai_provider = DummyAIProvider()
+from ..ai.providers import get_ai_provider
+from .conversation_summary import ConversationSummaryService
+from .lead_counters import LeadCounterService
 
 class LeadService:
     @staticmethod
@@ -125,7 +125,7 @@ class LeadService:
         
         # Generate follow-up variants using the AI provider
         try:
-            suggestions = await ai_provider.generate_followup_variants(
+            suggestions = await get_ai_provider().generate_followup_variants(
                 context=context,
                 tone=tone,
                 lead_info=lead_info
@@ -142,6 +142,7 @@ class LeadService:
                 )
                 db.add(db_suggestion)
                 db_suggestions.append(db_suggestion)
+            LeadCounterService.record_suggestions(db, user_id, lead_id, datetime.utcnow())
             
             db.commit()
             
@@ -175,9 +176,12 @@ class LeadService:
             to_email=to_email,
             subject=subject,
             body=body,
-            provider=provider
+            provider=provider,
+            sent_at=datetime.utcnow()
         )
         db.add(email_log)
+        ConversationSummaryService.record_email(db, lead_id, subject, body)
+        LeadCounterService.record_sent_email(db, user_id, lead_id, email_log.sent_at)
         db.commit()
         db.refresh(email_log)
         return email_log
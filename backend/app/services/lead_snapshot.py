@@ -0,0 +1,460 @@
+"""
+Columnar snapshots of a user's leads and sent-email facts for batch jobs.
+
+A snapshot is a directory of column files, one per field, in the Arrow memory
+layout. Numbers and timestamps are fixed-width little-endian arrays;
+timestamps are float64 epoch seconds, with NaN for null. Strings are an int64
+offsets file plus a UTF-8 data file; null reads back as ``""``. Enums and other low-cardinality strings
+are int16 codes into a dictionary kept in ``manifest.json``. Readers
+memory-map the files read-only. A scan touches only the columns it reads and
+never builds ORM objects. Columns are ``numpy`` arrays when NumPy is installed
+and zero-copy ``memoryview``s otherwise.
+
+Refreshes are incremental. Leads changed since the manifest's change
+sequence, and tombstones for deleted ones, are merged into a new generation
+of the lead files in id order; unchanged rows are copied from the old files,
+not re-read from the database. Every sent email, and every dedup merge that
+moves emails between leads, also advances the lead's change sequence, so the
+emails of changed and deleted leads are swapped out the same way in a new
+generation of the email files. A manifest swap (``os.replace``) publishes each refresh, and readers keep the
+files they opened.
+
+    python -m app.services.lead_snapshot refresh <user_id>
+    python -m app.services.lead_snapshot stats <user_id>
+"""
+import argparse
+import fcntl
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.lead import Lead
+from app.models.lead_tombstone import LeadTombstone
+from app.models.sent_email_log import SentEmailLog
+from app.models.change_sequence import current_change_seq
+from app.services.lead_changes import PRUNED_SEQUENCE
+
+try:
+    import numpy
+except ImportError:  # optional; columns are memoryviews without it
+    numpy = None
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "10000"))
+
+# (name, kind): kinds are array typecodes, "ts" (float64 epoch seconds),
+# "dict" (int16 codes into the manifest's dictionary) and "str"
+LEAD_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "q"),
+    ("contact_name", "str"),
+    ("contact_email", "str"),
+    ("company", "str"),
+    ("source", "dict"),
+    ("status", "dict"),
+    ("lead_score", "i"),
+    ("is_active", "b"),
+    ("emails_sent_count", "i"),
+    ("created_at", "ts"),
+    ("updated_at", "ts"),
+    ("next_followup_at", "ts"),
+    ("last_sent_at", "ts"),
+    ("last_suggestion_at", "ts"),
+]
+EMAIL_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "q"),
+    ("lead_id", "q"),
+    ("provider", "dict"),
+    ("status", "dict"),
+    ("sent_at", "ts"),
+    ("subject", "str"),
+]
+_NUMPY_TYPES = {"q": "<i8", "i": "<i4", "b": "i1", "h": "<i2", "d": "<f8"}
+_STORAGE = {"ts": "d", "dict": "h"}
+
+
+def user_dir(user_id: int, root: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(root, f"user-{user_id}")
+
+
+def _map(path: str, size: int):
+    """Read-only mapping of the first ``size`` bytes of a file."""
+    if not size:
+        return memoryview(b"")
+    with open(path, "rb") as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))[:size]
+
+
+def _as_array(buffer, typecode: str):
+    if numpy is not None:
+        return numpy.frombuffer(buffer, dtype=_NUMPY_TYPES[typecode])
+    return buffer.cast(typecode)
+
+
+class StringColumn:
+    """Read-only sequence of strings over an offsets file and a data file."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return max(0, len(self.offsets) - 1)
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class SnapshotTable:
+    """One table of a snapshot: mapped columns of ``rows`` rows."""
+
+    def __init__(self, directory: str, prefix: str, columns: Sequence[Tuple[str, str]], rows: int, dictionaries: Dict):
+        self.rows = rows
+        self.table = prefix.split(".")[0]
+        self.dictionaries = dictionaries
+        self._columns = {}
+        for name, kind in columns:
+            path = os.path.join(directory, f"{prefix}.{name}")
+            if kind == "str":
+                offsets = _as_array(_map(f"{path}.offsets", 8 * (rows + 1)), "q") if rows else array("q", [0])
+                self._columns[name] = StringColumn(offsets, _map(f"{path}.data", int(offsets[rows]) if rows else 0))
+            else:
+                typecode = _STORAGE.get(kind, kind)
+                self._columns[name] = _as_array(_map(path, array(typecode).itemsize * rows), typecode)
+        self._kinds = dict(columns)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def column(self, name: str):
+        """Zero-copy column: dictionary columns hold codes (see ``decode``), timestamps epoch seconds."""
+        return self._columns[name]
+
+    def decode(self, name: str, code: int) -> Optional[str]:
+        return self.dictionaries[f"{self.table}.{name}"][code] if code >= 0 else None
+
+    def row(self, i: int) -> Dict[str, Any]:
+        values = {}
+        for name, kind in self._kinds.items():
+            value = self._columns[name][i]
+            if kind == "dict":
+                value = self.decode(name, int(value))
+            elif kind == "ts":
+                value = None if math.isnan(value) else float(value)
+            elif kind != "str":
+                value = int(value)
+            values[name] = value
+        return values
+
+
+class Snapshot:
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        self.directory = directory
+        self.manifest = manifest
+        self.leads = SnapshotTable(
+            directory, f"leads.{manifest['lead_generation']}", LEAD_COLUMNS, manifest["leads"], manifest["dictionaries"]
+        )
+        self.emails = SnapshotTable(
+            directory, f"emails.{manifest['email_generation']}", EMAIL_COLUMNS, manifest["emails"], manifest["dictionaries"]
+        )
+
+    @classmethod
+    def open(cls, user_id: int, root: str = SNAPSHOT_DIR) -> Optional["Snapshot"]:
+        directory = user_dir(user_id, root)
+        manifest = _read_manifest(directory)
+        return cls(directory, manifest) if manifest else None
+
+
+def _read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(directory, "manifest.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+class _TableWriter:
+    """Appends rows to a table's column files, buffering ``SNAPSHOT_BATCH_SIZE`` rows per write."""
+
+    def __init__(self, directory: str, prefix: str, columns: Sequence[Tuple[str, str]], dictionaries: Dict, rows: int = 0):
+        self.columns = columns
+        self.table = prefix.split(".")[0]
+        self.dictionaries = dictionaries
+        self.rows = rows
+        self._files = {}
+        self._buffers = {}
+        self._codes = {name: {value: code for code, value in enumerate(dictionaries.get(f"{self.table}.{name}", []))}
+                       for name, kind in columns if kind == "dict"}
+        for name, kind in columns:
+            path = os.path.join(directory, f"{prefix}.{name}")
+            if kind == "str":
+                offsets = self._open(f"{path}.offsets", 8 * (rows + 1) if rows else 0)
+                if rows:
+                    offsets.seek(8 * rows)
+                    end = array("q", offsets.read(8))[0]
+                    offsets.seek(8 * (rows + 1))
+                else:
+                    offsets.write(array("q", [0]).tobytes())
+                    end = 0
+                data = self._open(f"{path}.data", end)
+                self._files[name] = (offsets, data)
+                self._buffers[name] = [array("q"), bytearray(), end]
+            else:
+                typecode = _STORAGE.get(kind, kind)
+                self._files[name] = self._open(path, array(typecode).itemsize * rows)
+                self._buffers[name] = array(typecode)
+
+    @staticmethod
+    def _open(path: str, size: int):
+        # Drop anything past the published size: leftovers of a refresh that died before its manifest
+        f = open(path, "r+b" if os.path.exists(path) else "w+b")
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+    def append(self, values: Dict[str, Any]) -> None:
+        for name, kind in self.columns:
+            value = values.get(name)
+            if isinstance(value, Enum):
+                value = value.value
+            buffer = self._buffers[name]
+            if kind == "str":
+                encoded = (value or "").encode("utf-8")
+                buffer[1] += encoded
+                buffer[2] += len(encoded)
+                buffer[0].append(buffer[2])
+            elif kind == "ts":
+                if isinstance(value, datetime):
+                    value = (value - datetime(1970, 1, 1)).total_seconds()
+                buffer.append(math.nan if value is None else value)
+            elif kind == "dict":
+                buffer.append(-1 if value is None else self._code(name, str(value)))
+            else:
+                buffer.append(int(value or 0))
+        self.rows += 1
+        if self.rows % SNAPSHOT_BATCH_SIZE == 0:
+            self._flush()
+
+    def _code(self, name: str, value: str) -> int:
+        codes = self._codes[name]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.dictionaries.setdefault(f"{self.table}.{name}", []).append(value)
+        return codes[value]
+
+    def _flush(self) -> None:
+        for name, kind in self.columns:
+            buffer = self._buffers[name]
+            if kind == "str":
+                offsets, data = self._files[name]
+                offsets.write(buffer[0].tobytes())
+                data.write(buffer[1])
+                buffer[0], buffer[1] = array("q"), bytearray()
+            else:
+                self._files[name].write(buffer.tobytes())
+                self._buffers[name] = array(buffer.typecode)
+
+    def close(self) -> None:
+        self._flush()
+        for files in self._files.values():
+            for f in files if isinstance(files, tuple) else (files,):
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+
+def _lead_rows(db: Session, user_id: int, since: int, head: int) -> Iterator[Dict[str, Any]]:
+    """Leads written in (since, head], in id order, as plain rows."""
+    query = db.query(*[getattr(Lead, name) for name, _ in LEAD_COLUMNS])\
+        .filter(Lead.user_id == user_id, Lead.change_seq <= head)
+    if since:
+        query = query.filter(Lead.change_seq > since)
+    for row in query.order_by(Lead.id).yield_per(SNAPSHOT_BATCH_SIZE):
+        yield row._asdict()
+
+
+def _noting_ids(rows: Iterator[Dict[str, Any]], ids: set) -> Iterator[Dict[str, Any]]:
+    for row in rows:
+        ids.add(row["id"])
+        yield row
+
+
+def _email_rows(db: Session, user_id: int, since: int) -> Iterator[Dict[str, Any]]:
+    """Sent emails of the leads written after ``since``, in id order, as plain rows."""
+    query = db.query(*[getattr(SentEmailLog, name) for name, _ in EMAIL_COLUMNS])\
+        .filter(SentEmailLog.user_id == user_id)
+    if since:
+        # No upper bound: also covers leads written after the lead files were read
+        query = query.filter(SentEmailLog.lead_id.in_(
+            select(Lead.id).where(Lead.user_id == user_id, Lead.change_seq > since)
+        ))
+    for row in query.order_by(SentEmailLog.id).yield_per(SNAPSHOT_BATCH_SIZE):
+        yield row._asdict()
+
+
+def _merge(
+    old: Optional[SnapshotTable],
+    changed: Iterator[Dict[str, Any]],
+    removed: set,
+    key: str = "id"
+) -> Iterator[Dict[str, Any]]:
+    """Old rows minus changed ones and those whose ``key`` is in ``removed``, interleaved with changed rows, all by id."""
+    upcoming = next(changed, None)
+    for i in range(len(old) if old else 0):
+        row_id = int(old.column("id")[i])
+        while upcoming is not None and upcoming["id"] < row_id:
+            yield upcoming
+            upcoming = next(changed, None)
+        if upcoming is not None and upcoming["id"] == row_id:
+            continue  # replaced by the changed row, emitted on the next iteration
+        if int(old.column(key)[i]) not in removed:
+            yield old.row(i)
+    while upcoming is not None:
+        yield upcoming
+        upcoming = next(changed, None)
+
+
+class SnapshotService:
+    @staticmethod
+    def refresh(db: Session, user_id: int, shard_id: int, root: str = SNAPSHOT_DIR) -> Dict[str, Any]:
+        """Bring a user's snapshot up to date. Returns the new manifest."""
+        directory = user_dir(user_id, root)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # one writer per user, across processes
+            return SnapshotService._refresh_locked(db, user_id, shard_id, directory)
+
+    @staticmethod
+    def _refresh_locked(db: Session, user_id: int, shard_id: int, directory: str) -> Dict[str, Any]:
+        head = current_change_seq(db, user_id)
+        stored = _read_manifest(directory)
+        # Moved shards, restored database, or deletes no longer visible: rebuild from scratch
+        full = stored is None or (
+            stored["shard_id"] != shard_id
+            or stored["lead_seq"] > head
+            or stored["lead_seq"] < current_change_seq(db, user_id, PRUNED_SEQUENCE)
+        )
+        if not full and stored["lead_seq"] == head:
+            return stored
+
+        previous = None if full else Snapshot(directory, stored)
+        since = 0 if full else stored["lead_seq"]
+        manifest = {
+            "shard_id": shard_id,
+            "generation": stored["generation"] if stored else 0,  # highest generation ever written
+            "lead_generation": None,
+            "email_generation": None,
+            "lead_seq": head,
+            "leads": 0,
+            "emails": 0,
+            "dictionaries": {} if full else {name: list(values) for name, values in stored["dictionaries"].items()},
+        }
+        removed = set() if full else {
+            lead_id for (lead_id,) in db.query(LeadTombstone.lead_id).filter(
+                LeadTombstone.user_id == user_id,
+                LeadTombstone.change_seq > since,
+                LeadTombstone.change_seq <= head
+            )
+        }
+
+        # Rows change in place, so changes go into a new generation of the files
+        changed_leads = set()
+        manifest["generation"] += 1
+        manifest["lead_generation"] = manifest["generation"]
+        leads = _TableWriter(directory, f"leads.{manifest['lead_generation']}", LEAD_COLUMNS, manifest["dictionaries"])
+        changed = _noting_ids(_lead_rows(db, user_id, since, head), changed_leads)
+        for row in _merge(previous.leads if previous else None, changed, removed):
+            leads.append(row)
+        leads.close()
+        manifest["leads"] = leads.rows
+
+        # A changed lead's emails are re-read whole: a send or a merge may have added any of them
+        manifest["generation"] += 1
+        manifest["email_generation"] = manifest["generation"]
+        emails = _TableWriter(directory, f"emails.{manifest['email_generation']}", EMAIL_COLUMNS, manifest["dictionaries"])
+        changed = _email_rows(db, user_id, since)
+        for row in _merge(previous.emails if previous else None, changed, removed | changed_leads, key="lead_id"):
+            emails.append(row)
+        emails.close()
+        manifest["emails"] = emails.rows
+        _write_manifest(directory, manifest)
+
+        # Open readers keep their mappings of superseded files after the unlink
+        current = (f"leads.{manifest['lead_generation']}.", f"emails.{manifest['email_generation']}.")
+        for entry in os.scandir(directory):
+            if entry.name.startswith(("leads.", "emails.")) and not entry.name.startswith(current):
+                os.unlink(entry.path)
+        return manifest
+
+    @staticmethod
+    def drop(user_id: int, root: str = SNAPSHOT_DIR) -> None:
+        shutil.rmtree(user_dir(user_id, root), ignore_errors=True)
+
+
+def stats(snapshot: Snapshot) -> Dict[str, Any]:
+    """Example scan: per-status lead counts and emails per lead, from the mapped columns only."""
+    leads, emails = snapshot.leads, snapshot.emails
+    by_status: Dict[str, int] = {}
+    for code in leads.column("status"):
+        status = leads.decode("status", int(code))
+        by_status[status] = by_status.get(status, 0) + 1
+    return {
+        "leads": len(leads),
+        "emails": len(emails),
+        "leads_by_status": by_status,
+        "emails_per_lead": round(len(emails) / len(leads), 2) if len(leads) else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Columnar lead snapshots")
+    parser.add_argument("command", choices=["refresh", "stats"])
+    parser.add_argument("user_id", type=int)
+    args = parser.parse_args(argv)
+
+    from app.db.base import SessionLocal
+    from app.db.sharding import shard_router
+
+    if args.command == "refresh":
+        primary = SessionLocal()
+        try:
+            shard_id = shard_router.shard_for_user(primary, args.user_id)
+        finally:
+            primary.close()
+        db = shard_router.session(shard_id)
+        try:
+            manifest = SnapshotService.refresh(db, args.user_id, shard_id)
+        finally:
+            db.close()
+        print(f"user {args.user_id}: {manifest['leads']} leads, {manifest['emails']} sent emails")
+    else:
+        snapshot = Snapshot.open(args.user_id)
+        if snapshot is None:
+            sys.exit(f"No snapshot for user {args.user_id}; run refresh first")
+        print(json.dumps(stats(snapshot), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Typeahead over lead names, emails and companies.
+
+Each user gets a sorted array of keys built from their leads: every word of
+the contact name and company, the full name and company, and the email
+address with its local part and domain. All keys are lowercased and accent
+folded. A lookup is a binary search for the typed prefix followed by a
+short scan, so its cost depends on the number of results, not the size of
+the account. Leads matching several typed words are found by scanning the
+longest word and checking the others against the lead's keys.
+
+Indexes are built and kept current by ``app.services.lead_index``, so writes
+from any worker show up on the next keystroke. Least recently used indexes are
+dropped once all of them together exceed ``PREFIX_INDEX_MAX_MB``.
+"""
+import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.text import fold
+from app.models.lead import Lead
+from app.services.lead_index import LeadIndex, LeadIndexCache
+
+PREFIX_INDEX_MAX_MB = float(os.getenv("PREFIX_INDEX_MAX_MB", "64"))
+
+_LOAD_CHUNK = 500
+# Above this many changed leads, re-sorting everything beats inserting one by one
+_REBUILD_THRESHOLD = 256
+# Approximate bytes per key entry and per lead (strings, list slots, dict entries), measured with tracemalloc
+_ENTRY_BYTES = 85
+_LEAD_BYTES = 200
+# Multi-word lookups stop scanning after this many keys
+_MAX_SCAN = 5000
+
+Display = Tuple[str, str, Optional[str]]  # contact name, email, company
+_COLUMNS = (Lead.id, Lead.contact_name, Lead.contact_email, Lead.company)
+
+
+def lead_keys(contact_name: Optional[str], contact_email: Optional[str], company: Optional[str]) -> Set[str]:
+    keys = set()
+    for text in (fold(contact_name), fold(company)):
+        if text:
+            keys.add(text)
+            keys.update(text.split())
+    email = (contact_email or "").strip().lower()
+    if email:
+        local, _, domain = email.partition("@")
+        keys.update(part for part in (email, local, domain) if part)
+    return keys
+
+
+class UserPrefixIndex(LeadIndex):
+    """One user's keys as a sorted array, each entry pointing at its lead."""
+
+    def clear(self) -> None:
+        super().clear()
+        self.load([])
+
+    def __len__(self) -> int:
+        return len(self._leads)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.keys) * _ENTRY_BYTES + len(self._leads) * _LEAD_BYTES
+
+    def load(self, rows: Iterable[Tuple[int, str, str, Optional[str]]]) -> None:
+        """Replace the contents with ``rows`` of (id, contact_name, contact_email, company)."""
+        self._leads: Dict[int, Tuple[Display, Tuple[str, ...]]] = {}
+        entries = []
+        for lead_id, name, email, company in rows:
+            keys = tuple(sorted(lead_keys(name, email, company)))
+            self._leads[lead_id] = ((name, email, company), keys)
+            entries.extend((key, lead_id) for key in keys)
+        entries.sort()
+        self.keys: List[str] = [key for key, _ in entries]
+        self.owners: List[int] = [lead_id for _, lead_id in entries]  # lead ID of each key, same positions
+
+    def apply(self, removed: Set[int], upserted: List[Tuple[int, str, str, Optional[str]]]) -> None:
+        """Drop ``removed`` leads and (re)index ``upserted`` ones."""
+        stale = removed | {row[0] for row in upserted}
+        if len(stale) > _REBUILD_THRESHOLD:
+            kept = [(lead_id, *display) for lead_id, (display, _) in self._leads.items() if lead_id not in stale]
+            self.load(kept + list(upserted))
+            return
+        for lead_id in stale:
+            self._remove(lead_id)
+        for lead_id, name, email, company in upserted:
+            keys = tuple(sorted(lead_keys(name, email, company)))
+            self._leads[lead_id] = ((name, email, company), keys)
+            for key in keys:
+                position = bisect_right(self.keys, key)
+                self.keys.insert(position, key)
+                self.owners.insert(position, lead_id)
+
+    def _remove(self, lead_id: int) -> None:
+        entry = self._leads.pop(lead_id, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            position = bisect_left(self.keys, key)
+            while self.owners[position] != lead_id:
+                position += 1
+            del self.keys[position]
+            del self.owners[position]
+
+    def _scan(self, prefix: str) -> Iterable[Tuple[str, int]]:
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            yield self.keys[position], self.owners[position]
+            position += 1
+
+    def suggest(self, query: str, limit: int) -> List[Tuple[int, Display]]:
+        """Up to ``limit`` leads with keys starting with the query, exact matches first."""
+        email_like = query.strip().lower()
+        folded = fold(query)
+        words = folded.split()
+        if not words:
+            return []
+
+        found: "OrderedDict[int, bool]" = OrderedDict()  # lead ID -> exact match
+        for prefix in dict.fromkeys((email_like, folded)):
+            # A key equal to the prefix sorts before its extensions, so exact matches come first
+            for key, lead_id in self._scan(prefix):
+                if len(found) >= limit:
+                    break
+                found[lead_id] = found.get(lead_id, False) or key == prefix
+        if len(words) > 1 and len(found) < limit:
+            # "ann acme": scan the most selective word, keep leads matching every other word too
+            anchor = max(words, key=len)
+            others = [word for word in words if word != anchor]
+            for scanned, (_, lead_id) in enumerate(self._scan(anchor)):
+                if scanned >= _MAX_SCAN or len(found) >= limit:
+                    break
+                if lead_id in found:
+                    continue
+                keys = self._leads[lead_id][1]
+                if all(any(key.startswith(word) for key in keys) for word in others):
+                    found[lead_id] = False
+
+        ranked = sorted(found.items(), key=lambda item: not item[1])[:limit]
+        return [(lead_id, self._leads[lead_id][0]) for lead_id, _ in ranked]
+
+
+class PrefixIndex(LeadIndexCache):
+    """LRU of per-user prefix indexes."""
+
+    index_class = UserPrefixIndex
+
+    def __init__(self, max_bytes: int = int(PREFIX_INDEX_MAX_MB * 1024 * 1024)):
+        super().__init__(max_bytes)
+
+    def suggest(self, db: Session, user_id: int, shard_id: int, query: str, limit: int) -> List[Tuple[int, Display]]:
+        index = self._index_for(db, user_id, shard_id)
+        with index.lock:
+            return index.suggest(query, limit)
+
+    def _build(self, db: Session, user_id: int, index: UserPrefixIndex) -> None:
+        index.load(db.query(*_COLUMNS).filter(Lead.user_id == user_id).yield_per(_LOAD_CHUNK))
+
+    def _update(self, db: Session, user_id: int, index: UserPrefixIndex, removed: Set[int], changed: Tuple) -> None:
+        upserted = db.query(*_COLUMNS).filter(*changed).all()
+        if removed or upserted:
+            index.apply(removed, upserted)
+
+
+prefix_index = PrefixIndex()
@@ -0,0 +1,210 @@
+"""
+Background pre-generation of follow-up drafts.
+
+Opening a lead that is due for a follow-up should show drafts at once, not
+wait on the AI provider. A pre-generation pass finds active leads whose
+``next_followup_at`` is at most ``PREGEN_LOOKAHEAD_HOURS`` away (or already
+past) and that have no current drafts. It generates those drafts in
+``PREGEN_TONE`` and stores them as ``origin="pregenerated"``. Drafts the
+user generated are left alone. Drafts made for an older version of the lead
+(edited, or emailed since) are hidden on read and replaced by the next pass.
+
+Cost and load are bounded:
+
+- at most ``PREGEN_MAX_PER_RUN`` generations per pass, soonest-due first
+- at most ``PREGEN_CONCURRENCY`` generations in flight
+- passes run only in the UTC hours of ``PREGEN_HOURS`` (for example ``1-6``;
+  empty means any hour)
+- inside the API process, a generation waits while that process's
+  interactive AI requests are running or queued; other workers' traffic is
+  not visible to it, and a pass run from cron sees none at all, so there
+  only ``PREGEN_CONCURRENCY`` and ``PREGEN_HOURS`` bound its load
+
+The API process runs a pass every ``PREGEN_INTERVAL_SECONDS`` (``0``, the
+default, disables it). From cron:
+
+    python -m app.services.pregeneration
+"""
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.ai.providers import AIProviderError, get_ai_provider
+from app.core.rate_limit import ai_admission
+from app.db.base import SessionLocal
+from app.db.sharding import shard_router
+from app.models.user import User
+from app.models.lead import Lead, LeadStatus
+from app.models.followup_suggestion import FollowUpSuggestion
+from app.schemas.followup import FollowUpTone
+from app.services.followup_drafts import PREGENERATED, FollowUpDraftService, draft_fingerprint
+
+logger = logging.getLogger(__name__)
+
+PREGEN_LOOKAHEAD_HOURS = float(os.getenv("PREGEN_LOOKAHEAD_HOURS", "24"))
+PREGEN_MAX_PER_RUN = int(os.getenv("PREGEN_MAX_PER_RUN", "50"))
+PREGEN_CONCURRENCY = int(os.getenv("PREGEN_CONCURRENCY", "2"))
+PREGEN_HOURS = os.getenv("PREGEN_HOURS", "")
+PREGEN_INTERVAL_SECONDS = float(os.getenv("PREGEN_INTERVAL_SECONDS", "0"))
+PREGEN_TONE = FollowUpTone(os.getenv("PREGEN_TONE", FollowUpTone.POLITE.value))
+
+# How long a generation waits between checks for interactive AI traffic to drain
+_YIELD_SECONDS = 0.5
+
+
+def in_window(hours: str, now: datetime) -> bool:
+    """Whether ``now`` (UTC) falls in ``hours``, a range like ``1-6`` or ``22-4``; empty means always."""
+    if not hours.strip():
+        return True
+    start, _, end = hours.partition("-")
+    start, end = int(start), int(end or start)
+    if start <= end:
+        return start <= now.hour <= end
+    return now.hour >= start or now.hour <= end
+
+
+class PregenerationService:
+    stats: Counter = Counter()
+
+    @staticmethod
+    def candidates(db: Session, now: datetime, limit: int) -> List[Tuple[int, int]]:
+        """(lead_id, user_id) of due-soon leads without current drafts, soonest first."""
+        horizon = now + timedelta(hours=PREGEN_LOOKAHEAD_HOURS)
+        found: List[Tuple[int, int]] = []
+        offset, page_size = 0, max(limit * 2, 50)
+        while len(found) < limit:
+            leads = db.query(Lead)\
+                .filter(
+                    Lead.is_active.is_(True),
+                    Lead.next_followup_at.isnot(None),
+                    Lead.next_followup_at <= horizon,
+                    Lead.status.notin_([LeadStatus.WON, LeadStatus.LOST])
+                )\
+                .order_by(Lead.next_followup_at, Lead.id)\
+                .offset(offset).limit(page_size)\
+                .all()
+            if not leads:
+                break
+            offset += page_size
+
+            drafts: Dict[int, set] = defaultdict(set)
+            rows = db.query(FollowUpSuggestion.lead_id, FollowUpSuggestion.origin, FollowUpSuggestion.lead_fingerprint)\
+                .filter(FollowUpSuggestion.lead_id.in_([lead.id for lead in leads]))\
+                .distinct()
+            for lead_id, origin, fingerprint in rows:
+                drafts[lead_id].add((origin, fingerprint))
+
+            for lead in leads:
+                fingerprint = draft_fingerprint(lead)
+                existing = drafts.get(lead.id, set())
+                # The user's own drafts win; so do pre-generated ones still matching the lead
+                if any(origin != PREGENERATED for origin, _ in existing):
+                    continue
+                if (PREGENERATED, fingerprint) in existing:
+                    continue
+                found.append((lead.id, lead.user_id))
+                if len(found) >= limit:
+                    break
+        return found
+
+    @staticmethod
+    @asynccontextmanager
+    async def _background_slot(semaphore: asyncio.Semaphore):
+        async with semaphore:
+            # Interactive generations of this process go first (ai_admission is per process)
+            while ai_admission.in_flight or ai_admission.waiting:
+                PregenerationService.stats["yielded"] += 1
+                await asyncio.sleep(_YIELD_SECONDS)
+            yield
+
+    @staticmethod
+    async def _pregenerate(shard_id: int, lead_id: int, user_name: Optional[str], semaphore: asyncio.Semaphore) -> bool:
+        db = shard_router.session(shard_id)
+        try:
+            lead = db.query(Lead).get(lead_id)
+            if lead is None:
+                return False
+            drafts = await FollowUpDraftService.generate(
+                db,
+                lead,
+                user_name=user_name,
+                tone=PREGEN_TONE,
+                ai_provider=get_ai_provider(),
+                slot=lambda: PregenerationService._background_slot(semaphore),
+                origin=PREGENERATED
+            )
+            if not drafts:
+                # The user generated drafts while this one waited on the provider; theirs stay
+                PregenerationService.stats["superseded"] += 1
+                return False
+            return True
+        except AIProviderError as e:
+            db.rollback()
+            PregenerationService.stats["failed"] += 1
+            logger.warning("Pre-generation for lead %d failed: %s", lead_id, e)
+            return False
+        except Exception:
+            db.rollback()
+            PregenerationService.stats["failed"] += 1
+            logger.exception("Pre-generation for lead %d failed", lead_id)
+            return False
+        finally:
+            db.close()
+
+    @staticmethod
+    async def run(max_drafts: int = PREGEN_MAX_PER_RUN, concurrency: int = PREGEN_CONCURRENCY) -> Dict[str, int]:
+        """One pass over every shard. Returns drafts generated."""
+        now = datetime.utcnow()
+        semaphore = asyncio.Semaphore(concurrency)
+        primary = SessionLocal()
+        try:
+            jobs = []
+            for shard_id in range(shard_router.shard_count):
+                if len(jobs) >= max_drafts:
+                    break
+                shard_db = shard_router.session(shard_id)
+                try:
+                    jobs += [(shard_id, lead_id, user_id)
+                             for lead_id, user_id in PregenerationService.candidates(shard_db, now, max_drafts - len(jobs))]
+                finally:
+                    shard_db.close()
+            moving = shard_router.moving_users(primary, sorted({user_id for _, _, user_id in jobs}))
+            # Skip users being moved between shards, and rows a move left behind on the old shard
+            jobs = [(shard_id, lead_id, user_id) for shard_id, lead_id, user_id in jobs
+                    if user_id not in moving and shard_router.shard_for_user(primary, user_id) == shard_id]
+            user_ids = {user_id for _, _, user_id in jobs}
+            emails = dict(primary.query(User.id, User.email).filter(User.id.in_(user_ids))) if user_ids else {}
+        finally:
+            primary.close()
+
+        results = await asyncio.gather(*[
+            PregenerationService._pregenerate(shard_id, lead_id, emails.get(user_id), semaphore)
+            for shard_id, lead_id, user_id in jobs
+        ])
+        generated = sum(results)
+        PregenerationService.stats["generated"] += generated
+        PregenerationService.stats["passes"] += 1
+        return {"candidates": len(jobs), "generated": generated}
+
+
+async def pregenerate_periodically(interval_seconds: float = PREGEN_INTERVAL_SECONDS):
+    """Background loop for the API process; passes outside ``PREGEN_HOURS`` are skipped."""
+    while True:
+        if in_window(PREGEN_HOURS, datetime.utcnow()):
+            try:
+                result = await PregenerationService.run()
+                if result["generated"]:
+                    logger.info("Pre-generated drafts for %d leads", result["generated"])
+            except Exception:
+                logger.exception("Pre-generation pass failed")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    print(f"Pre-generated: {asyncio.run(PregenerationService.run())}")
@@ -0,0 +1,162 @@
+"""
+Deletion of leads and whole accounts without loading their rows.
+
+Lead deletes are set-based: children, tombstones and the leads go in a few
+DELETE statements. Deleting an account deactivates the user at once and
+queues a ``user_purges`` entry. The purge then removes the user's data one
+chunk of ``PURGE_CHUNK_SIZE`` leads (with their emails and suggestions) per
+transaction, so write locks stay short however large the account. It runs
+right after the request, and again every ``PURGE_INTERVAL_SECONDS`` for purges
+interrupted by a restart. From cron:
+
+    python -m app.services.purge_service
+
+Foreign keys declare ``ON DELETE CASCADE`` for databases created with them
+(and enforcing them), but the purge deletes children explicitly, so it also
+works on SQLite and on tables created before the cascades.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.db.base import SessionLocal
+from app.db.sharding import LEAD_CHILD_MODELS, USER_SCOPED_MODELS, shard_router
+from app.models.user import User
+from app.models.user_shard import UserShard
+from app.models.user_purge import UserPurge
+from app.models.lead import Lead
+from app.models.lead_tombstone import LeadTombstone
+from app.models.sent_email_log import SentEmailLog
+from app.models.change_sequence import ChangeSequence, lead_tombstones_from
+from app.services.lead_snapshot import SnapshotService
+from app.services.refresh_tokens import RefreshTokenService
+
+logger = logging.getLogger(__name__)
+
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "60"))
+
+# Left once the leads are gone; each holds rows keyed only by user_id
+_USER_ROW_MODELS = (SentEmailLog,) + USER_SCOPED_MODELS + (LeadTombstone,)
+
+
+class PurgeService:
+    @staticmethod
+    def delete_leads(db: Session, lead_ids) -> None:
+        """
+        Delete leads (a list or a SELECT of IDs) with their suggestions, summaries
+        and sent emails, leaving tombstones. Does not commit.
+        """
+        for model in LEAD_CHILD_MODELS + (SentEmailLog,):
+            db.query(model).filter(model.lead_id.in_(lead_ids)).delete(synchronize_session=False)
+        lead_tombstones_from(db, lead_ids)
+        db.query(Lead).filter(Lead.id.in_(lead_ids)).delete(synchronize_session=False)
+
+    @staticmethod
+    def schedule_user(db: Session, user: User) -> None:
+        """Deactivate the user now and queue their data for purging."""
+        user.is_active = False
+        RefreshTokenService.revoke_user(db, user.id)
+        if db.query(UserPurge).get(user.id) is None:
+            db.add(UserPurge(user_id=user.id))
+        db.commit()
+
+    @staticmethod
+    def purge_chunk(shard_db: Session, user_id: int, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+        """Delete one chunk of a user's shard rows in one transaction. Returns rows deleted; 0 when done."""
+        lead_ids = [lead_id for (lead_id,) in shard_db.query(Lead.id).filter(Lead.user_id == user_id).limit(chunk_size)]
+        if lead_ids:
+            deleted = 0
+            for model in LEAD_CHILD_MODELS + (SentEmailLog,):
+                deleted += shard_db.query(model)\
+                    .filter(model.lead_id.in_(lead_ids))\
+                    .delete(synchronize_session=False)
+            # The account is going away, so no tombstones: delta sync has no one left to serve
+            deleted += shard_db.query(Lead).filter(Lead.id.in_(lead_ids)).delete(synchronize_session=False)
+            shard_db.commit()
+            return deleted
+
+        for model in _USER_ROW_MODELS:
+            ids = select(model.id).where(model.user_id == user_id).limit(chunk_size)
+            deleted = shard_db.query(model)\
+                .filter(model.id.in_([row_id for (row_id,) in shard_db.execute(ids)]))\
+                .delete(synchronize_session=False)
+            if deleted:
+                shard_db.commit()
+                return deleted
+        # A user has one row per sequence, so these go in one statement
+        deleted = shard_db.query(ChangeSequence)\
+            .filter(ChangeSequence.user_id == user_id)\
+            .delete(synchronize_session=False)
+        shard_db.commit()
+        return deleted
+
+    @staticmethod
+    def purge_user(db: Session, user_id: int, chunk_size: int = PURGE_CHUNK_SIZE, max_chunks: Optional[int] = None) -> bool:
+        """Work off a queued purge. Returns True once the user and the queue entry are gone."""
+        job = db.query(UserPurge).get(user_id)
+        if job is None:
+            return True
+        rows_deleted = job.rows_deleted
+        shard_db = shard_router.session(shard_router.shard_for_user(db, user_id))
+        try:
+            chunks = 0
+            while True:
+                if max_chunks is not None and chunks >= max_chunks:
+                    return False
+                deleted = PurgeService.purge_chunk(shard_db, user_id, chunk_size)
+                if not deleted:
+                    break
+                rows_deleted += deleted
+                job.rows_deleted = rows_deleted  # progress, visible while a large purge runs
+                db.commit()
+                chunks += 1
+        finally:
+            shard_db.close()
+
+        db.query(UserShard).filter(UserShard.user_id == user_id).delete(synchronize_session=False)
+        db.query(UserPurge).filter(UserPurge.user_id == user_id).delete(synchronize_session=False)
+        db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+        db.commit()
+        shard_router.invalidate(user_id)
+        SnapshotService.drop(user_id)
+        logger.info("Purged user %d (%d rows)", user_id, rows_deleted)
+        return True
+
+    @staticmethod
+    def run_pending(user_ids: Optional[List[int]] = None) -> Dict[str, int]:
+        """Finish queued purges (or just ``user_ids``), oldest first."""
+        db = SessionLocal()
+        try:
+            query = db.query(UserPurge.user_id).order_by(UserPurge.requested_at)
+            if user_ids is not None:
+                query = query.filter(UserPurge.user_id.in_(user_ids))
+            done = 0
+            for (user_id,) in query.all():
+                try:
+                    done += PurgeService.purge_user(db, user_id)
+                except Exception:
+                    db.rollback()
+                    logger.exception("Purge of user %d failed; it will be retried", user_id)
+            return {"users": done}
+        finally:
+            db.close()
+
+
+async def purge_periodically(interval_seconds: float = PURGE_INTERVAL_SECONDS):
+    """Background loop for the API process; each pass runs in a worker thread."""
+    while True:
+        try:
+            await run_in_threadpool(PurgeService.run_pending)
+        except Exception:
+            logger.exception("Purge pass failed")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    print(f"Purged: {PurgeService.run_pending()}")
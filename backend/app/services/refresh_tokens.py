@@ -0,0 +1,96 @@
+"""
+Refresh-token rotation.
+
+Login issues a short-lived access token and a refresh token. Exchanging the
+refresh token at ``/api/auth/refresh`` verifies its signature and one primary
+key lookup instead of a bcrypt hash, and returns a new pair. Every exchange
+rotates the refresh token: the session row keeps only the newest token's
+ID, so an older token presented again means the family leaked, and the whole
+session is revoked. Revoked and expired sessions are deleted, which keeps the
+store at one row per live session.
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.security import REFRESH_TOKEN_EXPIRE_DAYS, create_refresh_token, decode_refresh_token
+from app.models.refresh_session import RefreshSession
+from app.models.user import User
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RefreshTokenService:
+    @staticmethod
+    def issue(db: Session, user_id: int, email: str) -> str:
+        """Start a session for a fresh login. Returns its first refresh token."""
+        family, jti = _new_id(), _new_id()
+        expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        db.add(RefreshSession(id=family, user_id=user_id, jti=jti, expires_at=expires_at))
+        db.commit()
+        return create_refresh_token(email, user_id, family, jti, expires_at)
+
+    @staticmethod
+    def rotate(db: Session, token: str) -> Optional[Tuple[str, str]]:
+        """
+        Exchange a refresh token for its successor. Returns (email, new refresh token),
+        or None if the token is invalid, expired, revoked or already used, or its user
+        is gone or deactivated.
+        """
+        claims = decode_refresh_token(token)
+        if claims is None:
+            return None
+        # The email in the token may since have changed hands; the user ID has not
+        user = db.query(User).get(claims["uid"])
+        if user is None or not user.is_active:
+            db.query(RefreshSession).filter(RefreshSession.id == claims["fam"]).delete(synchronize_session=False)
+            db.commit()
+            return None
+        now = datetime.utcnow()
+        jti = _new_id()
+        expires_at = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        # Compare-and-swap on the current token ID: of two racing exchanges only one wins
+        rotated = db.query(RefreshSession)\
+            .filter(
+                RefreshSession.id == claims["fam"],
+                RefreshSession.jti == claims["jti"],
+                RefreshSession.expires_at > now
+            )\
+            .update({
+                RefreshSession.jti: jti,
+                RefreshSession.expires_at: expires_at,
+                RefreshSession.rotated_at: now,
+            }, synchronize_session=False)
+        if not rotated:
+            # A superseded token is being replayed: whoever holds it, the session is no longer safe
+            db.query(RefreshSession).filter(RefreshSession.id == claims["fam"]).delete(synchronize_session=False)
+            db.commit()
+            return None
+        db.commit()
+        return user.email, create_refresh_token(user.email, user.id, claims["fam"], jti, expires_at)
+
+    @staticmethod
+    def revoke(db: Session, token: str) -> None:
+        """Sign out the session a refresh token belongs to."""
+        claims = decode_refresh_token(token)
+        if claims is not None:
+            db.query(RefreshSession).filter(RefreshSession.id == claims["fam"]).delete(synchronize_session=False)
+            db.commit()
+
+    @staticmethod
+    def revoke_user(db: Session, user_id: int) -> None:
+        """Sign out all of a user's sessions. Does not commit."""
+        db.query(RefreshSession).filter(RefreshSession.user_id == user_id).delete(synchronize_session=False)
+
+    @staticmethod
+    def prune(db: Session) -> int:
+        """Delete expired sessions. Returns rows deleted."""
+        deleted = db.query(RefreshSession)\
+            .filter(RefreshSession.expires_at < datetime.utcnow())\
+            .delete(synchronize_session=False)
+        db.commit()
+        return deleted
@@ -0,0 +1,222 @@
+"""
+"Leads like this one": a local similarity index over lead text.
+
+Each lead is embedded from its notes, last email snippet and the subjects of
+its latest sent emails with a hashed n-gram embedder (words plus character
+trigrams, feature-hashed into ``EMBEDDING_DIM`` signed buckets and
+L2-normalized), so there is no model to download and no network call. A
+user's vectors are rows of one float32 matrix and a query is a single
+matrix-vector product plus a partial sort, with NumPy when installed and a
+pure-Python scan otherwise.
+
+Indexes are built and kept current by ``app.services.lead_index`` (a sent
+email advances its lead's change sequence, so new subjects are picked up), and
+least recently used ones are dropped once they exceed ``SIMILARITY_MAX_MB`` in
+total.
+"""
+import heapq
+import math
+import os
+import re
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.lead import Lead
+from app.models.sent_email_log import SentEmailLog
+from app.services.lead_index import LeadIndex, LeadIndexCache
+
+try:
+    import numpy
+except ImportError:  # optional; a pure-Python scan is fine for small accounts
+    numpy = None
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+SIMILARITY_SUBJECTS_PER_LEAD = int(os.getenv("SIMILARITY_SUBJECTS_PER_LEAD", "20"))
+SIMILARITY_MAX_MB = float(os.getenv("SIMILARITY_MAX_MB", "256"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_TRIGRAM_WEIGHT = 0.5
+_LOAD_CHUNK = 500
+
+
+def _features(text: str) -> Iterable[Tuple[str, float]]:
+    for word in _WORD.findall(text.lower()):
+        yield word, 1.0
+        # Trigrams let "invoice" match "invoices" and survive typos
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3], _TRIGRAM_WEIGHT
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> Optional[array]:
+    """Unit-length float32 vector for ``text``, or None when it has no words."""
+    vector = [0.0] * dim
+    for feature, weight in _features(text):
+        # crc32 rather than hash(): stable across processes and restarts
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = math.sqrt(sum(v * v for v in vector))
+    if not norm:
+        return None
+    return array("f", (v / norm for v in vector))
+
+
+def lead_text(notes: Optional[str], snippet: Optional[str], subjects: Sequence[str]) -> str:
+    return "\n".join(part for part in (notes, snippet, *subjects) if part)
+
+
+class UserIndex(LeadIndex):
+    """One user's lead vectors, as rows of a float32 matrix."""
+
+    def __init__(self, shard_id: int, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        super().__init__(shard_id)
+
+    def clear(self) -> None:
+        super().clear()
+        self.lead_ids: List[int] = []
+        self._rows: Dict[int, int] = {}
+        if numpy is not None:
+            self._matrix = numpy.zeros((16, self.dim), dtype=numpy.float32)
+        else:
+            self._matrix = []
+
+    def __len__(self) -> int:
+        return len(self.lead_ids)
+
+    @property
+    def nbytes(self) -> int:
+        if numpy is not None:
+            return self._matrix.nbytes
+        return len(self._matrix) * self.dim * 4
+
+    def vector(self, lead_id: int):
+        row = self._rows.get(lead_id)
+        return None if row is None else self._matrix[row]
+
+    def upsert(self, lead_id: int, vector: Optional[array]) -> None:
+        if vector is None:
+            self.remove(lead_id)
+            return
+        row = self._rows.get(lead_id)
+        if row is None:
+            row = len(self.lead_ids)
+            self.lead_ids.append(lead_id)
+            self._rows[lead_id] = row
+            if numpy is not None:
+                if row == len(self._matrix):
+                    grown = numpy.zeros((2 * row, self.dim), dtype=numpy.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+            else:
+                self._matrix.append(vector)
+                return
+        if numpy is not None:
+            self._matrix[row] = numpy.frombuffer(vector, dtype=numpy.float32)
+        else:
+            self._matrix[row] = vector
+
+    def remove(self, lead_id: int) -> None:
+        row = self._rows.pop(lead_id, None)
+        if row is None:
+            return
+        # Move the last row into the gap so the live rows stay contiguous
+        last = len(self.lead_ids) - 1
+        moved = self.lead_ids.pop()
+        if row != last:
+            self.lead_ids[row] = moved
+            self._rows[moved] = row
+            self._matrix[row] = self._matrix[last]
+        if numpy is None:
+            self._matrix.pop()
+
+    def top_k(self, query, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Up to ``k`` (lead_id, cosine score) pairs with a positive score, best first."""
+        count = len(self.lead_ids)
+        if not count or k <= 0:
+            return []
+        if numpy is not None:
+            scores = self._matrix[:count] @ numpy.asarray(query, dtype=numpy.float32)
+            if exclude in self._rows:
+                scores[self._rows[exclude]] = -1.0
+            k = min(k, count)
+            best = numpy.argpartition(-scores, k - 1)[:k]
+            best = best[numpy.argsort(-scores[best], kind="stable")]
+            ranked = [(self.lead_ids[row], float(scores[row])) for row in best]
+        else:
+            ranked = heapq.nlargest(
+                k,
+                ((lead_id, sum(a * b for a, b in zip(row, query)))
+                 for lead_id, row in zip(self.lead_ids, self._matrix) if lead_id != exclude),
+                key=lambda pair: pair[1]
+            )
+        return [(lead_id, round(score, 4)) for lead_id, score in ranked if lead_id != exclude and score > 0]
+
+
+class SimilarityIndex(LeadIndexCache):
+    """LRU of per-user similarity indexes."""
+
+    index_class = UserIndex
+
+    def __init__(self, max_bytes: int = int(SIMILARITY_MAX_MB * 1024 * 1024)):
+        super().__init__(max_bytes)
+
+    def similar_to_lead(
+        self, db: Session, user_id: int, shard_id: int, lead_id: int, limit: int
+    ) -> Optional[List[Tuple[int, float]]]:
+        """Leads most similar to ``lead_id``; None if the user has no such lead."""
+        index = self._index_for(db, user_id, shard_id)
+        with index.lock:
+            query = index.vector(lead_id)
+            if query is not None:
+                return index.top_k(query, limit, exclude=lead_id)
+        # Not indexed: either no text to compare or not the user's lead
+        exists = db.query(Lead.id).filter(Lead.id == lead_id, Lead.user_id == user_id).first()
+        return [] if exists else None
+
+    def search(self, db: Session, user_id: int, shard_id: int, text: str, limit: int) -> List[Tuple[int, float]]:
+        """Leads most similar to free text."""
+        query = embed(text)
+        if query is None:
+            return []
+        index = self._index_for(db, user_id, shard_id)
+        with index.lock:
+            return index.top_k(query, limit)
+
+    def _build(self, db: Session, user_id: int, index: UserIndex) -> None:
+        self._load(db, user_id, index, None)
+
+    def _update(self, db: Session, user_id: int, index: UserIndex, removed: Set[int], changed: Tuple) -> None:
+        for lead_id in removed:
+            index.remove(lead_id)
+        lead_ids = sorted(lead_id for (lead_id,) in db.query(Lead.id).filter(*changed))
+        for start in range(0, len(lead_ids), _LOAD_CHUNK):
+            self._load(db, user_id, index, lead_ids[start:start + _LOAD_CHUNK])
+
+    def _load(self, db: Session, user_id: int, index: UserIndex, lead_ids: Optional[List[int]]) -> None:
+        """(Re-)embed ``lead_ids``, or all of the user's leads when None."""
+        leads = db.query(Lead.id, Lead.notes, Lead.last_email_snippet).filter(Lead.user_id == user_id)
+        emails = db.query(SentEmailLog.lead_id, SentEmailLog.subject).filter(SentEmailLog.user_id == user_id)
+        if lead_ids is not None:
+            leads = leads.filter(Lead.id.in_(lead_ids))
+            emails = emails.filter(SentEmailLog.lead_id.in_(lead_ids))
+
+        subjects: Dict[int, List[str]] = {}
+        for lead_id, subject in emails.order_by(SentEmailLog.sent_at.desc()):
+            recent = subjects.setdefault(lead_id, [])
+            if len(recent) < SIMILARITY_SUBJECTS_PER_LEAD:
+                recent.append(subject)
+
+        found = set()
+        for lead_id, notes, snippet in leads:
+            found.add(lead_id)
+            index.upsert(lead_id, embed(lead_text(notes, snippet, subjects.get(lead_id, ())), index.dim))
+        for lead_id in set(lead_ids or ()) - found:
+            index.remove(lead_id)  # deleted or moved to another user since
+        self.counters["embedded"] += len(found)
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,305 @@
+"""
+Open and click tracking for sent emails.
+
+Each sent email gets a tracking pixel URL and click-redirect URLs (see
+``GET /api/sent-emails/{id}/tracking-links``). The token in them names the
+user and the email's ``tracking_key`` (which, unlike its ID, survives a move
+to another shard) and is signed with ``SECRET_KEY``; click tokens also sign
+the target URL, so the redirect cannot be pointed elsewhere.
+
+A hit is answered right away. It only verifies the signature and appends a
+tuple to this process's in-memory buffer. Every
+``TRACKING_FLUSH_SECONDS``, or sooner once ``TRACKING_FLUSH_ROWS`` events
+are waiting, the buffer is written out per shard, in one transaction:
+
+- one batched INSERT into ``email_events``
+- one batched UPDATE of the emails' ``opens_count``, ``clicks_count`` and
+  ``first_opened_at``
+- one batched UPDATE of the leads' ``opens_count``, ``clicks_count`` and
+  ``last_opened_at``
+
+Events for emails that no longer exist (deleted or archived) are dropped.
+Events of a user whose data is being moved between shards stay buffered
+until the move is over.
+
+The buffer holds at most ``TRACKING_BUFFER_MAX`` events and drops hits
+beyond that instead of growing. Events still buffered when a process dies
+are lost. A failed flush is logged and its events discarded. Either way the
+counters undercount and never double count.
+
+    python -m app.services.tracking bench   # hits/s through verify + buffer, rows/s through flush
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.security import SECRET_KEY
+from app.db.base import SessionLocal
+from app.db.sharding import shard_router
+from app.models.lead import Lead
+from app.models.sent_email_log import SentEmailLog
+from app.models.email_event import EmailEvent
+from app.models.change_sequence import next_change_seqs
+
+logger = logging.getLogger(__name__)
+
+TRACKING_BASE_URL = os.getenv("TRACKING_BASE_URL", "http://localhost:8000").rstrip("/")
+TRACKING_FLUSH_SECONDS = float(os.getenv("TRACKING_FLUSH_SECONDS", "1"))
+TRACKING_FLUSH_ROWS = int(os.getenv("TRACKING_FLUSH_ROWS", "5000"))
+TRACKING_BUFFER_MAX = int(os.getenv("TRACKING_BUFFER_MAX", "200000"))
+
+OPEN, CLICK = "open", "click"
+
+_LOOKUP_CHUNK = 500  # tracking keys per IN (...), well under SQLite's bound-parameter limit
+
+# Smallest transparent GIF, served for every pixel hit
+PIXEL_GIF = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+_KEY = hashlib.sha256(b"email-tracking:" + SECRET_KEY.encode("utf-8")).digest()
+
+
+def _signature(kind: str, user_id: int, email_key: str, url: str = "") -> str:
+    mac = hmac.new(_KEY, f"{kind}:{user_id}:{email_key}:{url}".encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac[:12]).decode("ascii")
+
+
+def make_token(kind: str, user_id: int, email_key: str, url: str = "") -> str:
+    return f"{user_id}.{email_key}.{_signature(kind, user_id, email_key, url)}"
+
+
+def verify_token(kind: str, token: str, url: str = "") -> Optional[Tuple[int, str]]:
+    """(user_id, email tracking key) of a genuine token, else None."""
+    try:
+        user_id, email_key, signature = token.split(".")
+        user_id = int(user_id)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _signature(kind, user_id, email_key, url)):
+        return None
+    return user_id, email_key
+
+
+def pixel_url(user_id: int, email_key: str) -> str:
+    return f"{TRACKING_BASE_URL}/api/track/open/{make_token(OPEN, user_id, email_key)}.gif"
+
+
+def click_url(user_id: int, email_key: str, url: str) -> str:
+    return f"{TRACKING_BASE_URL}/api/track/click/{make_token(CLICK, user_id, email_key, url)}?{urlencode({'url': url})}"
+
+
+class TrackingBuffer:
+    """Per-process queue of tracking hits, written to the database in batches."""
+
+    def __init__(self, max_events: int = TRACKING_BUFFER_MAX):
+        self.max_events = max_events
+        # deque.append and popleft are atomic, so hits from any thread need no lock
+        self._events: deque = deque()
+        self.stats: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def record(self, kind: str, user_id: int, email_key: str) -> None:
+        if len(self._events) >= self.max_events:
+            self.stats["dropped"] += 1
+            return
+        self._events.append((kind, user_id, email_key, time.time()))
+
+    def _drain(self) -> List[tuple]:
+        events = []
+        for _ in range(len(self._events)):
+            events.append(self._events.popleft())
+        return events
+
+    def flush(self) -> int:
+        """Write out everything buffered so far. Returns events stored."""
+        events = self._drain()
+        if not events:
+            return 0
+        by_user: Dict[int, List[tuple]] = defaultdict(list)
+        for event in events:
+            by_user[event[1]].append(event)
+
+        primary = SessionLocal()
+        try:
+            moving = shard_router.moving_users(primary, list(by_user))
+            by_shard: Dict[int, List[tuple]] = defaultdict(list)
+            for user_id, user_events in by_user.items():
+                if user_id in moving:
+                    # Written to the source now they would be lost with it; keep them for a later flush
+                    self._events.extend(user_events)
+                    self.stats["deferred"] += len(user_events)
+                else:
+                    by_shard[shard_router.shard_for_user(primary, user_id)] += user_events
+        finally:
+            primary.close()
+
+        stored = 0
+        for shard_id, shard_events in by_shard.items():
+            db = shard_router.session(shard_id)
+            try:
+                stored += self._store(db, shard_events)
+            except Exception:
+                db.rollback()
+                self.stats["failed"] += len(shard_events)
+                logger.exception("Dropped %d tracking events for shard %d", len(shard_events), shard_id)
+            finally:
+                db.close()
+        self.stats["stored"] += stored
+        self.stats["flushes"] += 1
+        return stored
+
+    def _store(self, db: Session, events: List[tuple]) -> int:
+        email_keys = sorted({event[2] for event in events})
+        # Resolve email, lead and owner once per key; keys of emails gone from this shard resolve to nothing
+        owners = {}
+        for start in range(0, len(email_keys), _LOOKUP_CHUNK):
+            chunk = email_keys[start:start + _LOOKUP_CHUNK]
+            owners.update(
+                (email_key, (email_id, user_id, lead_id))
+                for email_key, email_id, user_id, lead_id in db.execute(
+                    select(SentEmailLog.tracking_key, SentEmailLog.id, SentEmailLog.user_id, SentEmailLog.lead_id)
+                    .where(SentEmailLog.tracking_key.in_(chunk))
+                )
+            )
+
+        rows = []
+        per_email: Dict[int, list] = {}
+        per_lead: Dict[int, list] = {}
+        for kind, user_id, email_key, ts in events:
+            owner = owners.get(email_key)
+            if owner is None or owner[1] != user_id:
+                self.stats["unknown_email"] += 1
+                continue
+            email_id, _, lead_id = owner
+            occurred_at = datetime.utcfromtimestamp(ts)
+            rows.append({"user_id": user_id, "lead_id": lead_id, "email_id": email_id, "kind": kind, "occurred_at": occurred_at})
+            email = per_email.setdefault(email_id, [0, 0, None])
+            lead = per_lead.setdefault(lead_id, [0, 0, None, user_id])
+            if kind == OPEN:
+                email[0] += 1
+                lead[0] += 1
+                email[2] = min(email[2] or occurred_at, occurred_at)
+                lead[2] = max(lead[2] or occurred_at, occurred_at)
+            else:
+                email[1] += 1
+                lead[1] += 1
+        if not rows:
+            return 0
+
+        db.execute(EmailEvent.__table__.insert(), rows)
+        first_open = bindparam("first_open", type_=SentEmailLog.first_opened_at.type)
+        db.execute(
+            update(SentEmailLog.__table__)
+            .where(SentEmailLog.__table__.c.id == bindparam("email_id"))
+            .values(
+                opens_count=SentEmailLog.__table__.c.opens_count + bindparam("opens"),
+                clicks_count=SentEmailLog.__table__.c.clicks_count + bindparam("clicks"),
+                first_opened_at=func.coalesce(SentEmailLog.__table__.c.first_opened_at, first_open),
+            ),
+            [{"email_id": email_id, "opens": o, "clicks": c, "first_open": first} for email_id, (o, c, first) in per_email.items()]
+        )
+        seqs = next_change_seqs(db, (user_id for _, _, _, user_id in per_lead.values()))
+        leads = Lead.__table__.c
+        last_open = bindparam("last_open", type_=Lead.last_opened_at.type)
+        db.execute(
+            update(Lead.__table__)
+            .where(leads.id == bindparam("lead_id"))
+            .values(
+                opens_count=leads.opens_count + bindparam("opens"),
+                clicks_count=leads.clicks_count + bindparam("clicks"),
+                last_opened_at=case(
+                    (last_open.is_(None), leads.last_opened_at),
+                    (leads.last_opened_at.is_(None), last_open),
+                    (leads.last_opened_at < last_open, last_open),
+                    else_=leads.last_opened_at
+                ),
+                updated_at=leads.updated_at,  # engagement is not an edit of the lead
+                change_seq=bindparam("seq"),
+            ),
+            [
+                {"lead_id": lead_id, "opens": o, "clicks": c, "last_open": last, "seq": seqs[user_id]}
+                for lead_id, (o, c, last, user_id) in per_lead.items()
+            ]
+        )
+        db.commit()
+        return len(rows)
+
+
+tracking_buffer = TrackingBuffer()
+
+
+async def flush_periodically(interval_seconds: float = TRACKING_FLUSH_SECONDS, flush_rows: int = TRACKING_FLUSH_ROWS):
+    """Background loop for every API process; each process flushes its own buffer."""
+    while True:
+        waited = 0.0
+        while waited < interval_seconds and len(tracking_buffer) < flush_rows:
+            await asyncio.sleep(min(0.05, interval_seconds))
+            waited += 0.05
+        if len(tracking_buffer):
+            try:
+                await run_in_threadpool(tracking_buffer.flush)
+            except Exception:
+                logger.exception("Tracking flush failed")
+
+
+def bench(hits: int = 200000) -> None:
+    """Throughput of the hit path (verify + buffer) and of one flush, against a throwaway account."""
+    from app.db.init_db import init_db
+    from app.models.user import User
+    from app.services.purge_service import PurgeService
+
+    init_db()
+    db = SessionLocal()
+    user = User(email=f"tracking-bench-{os.getpid()}@example.com", hashed_password="-", is_active=False)
+    db.add(user)
+    db.commit()
+    try:
+        shard_db = shard_router.session(shard_router.shard_for_user(db, user.id))
+        try:
+            lead = Lead(user_id=user.id, contact_name="Bench", contact_email="bench@example.com")
+            shard_db.add(lead)
+            shard_db.flush()
+            emails = [SentEmailLog(user_id=user.id, lead_id=lead.id, to_email="bench@example.com", subject="Bench", body="-")
+                      for _ in range(100)]
+            shard_db.add_all(emails)
+            shard_db.commit()
+            tokens = [make_token(OPEN, user.id, email.tracking_key) for email in emails]
+        finally:
+            shard_db.close()
+
+        buffer = TrackingBuffer(max_events=hits)
+        start = time.perf_counter()
+        for i in range(hits):
+            user_id, email_key = verify_token(OPEN, tokens[i % len(tokens)])
+            buffer.record(OPEN, user_id, email_key)
+        elapsed = time.perf_counter() - start
+        print(f"hit path: {hits / elapsed:,.0f} hits/s")
+
+        start = time.perf_counter()
+        stored = buffer.flush()
+        elapsed = time.perf_counter() - start
+        print(f"   flush: {stored:,} events in {elapsed:.2f}s ({stored / elapsed:,.0f} rows/s)")
+    finally:
+        PurgeService.schedule_user(db, user)
+        PurgeService.purge_user(db, user.id)
+        db.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["bench"]:
+        sys.exit("usage: python -m app.services.tracking bench")
+    bench()
@@ -6,5 +6,7 @@ The real FastAPI app lives at `app.main:app`. This file re-exports
 the app so either import style works.
 
 Generated automatically by QA assistant to fix "Could not import module 'main'".
+
+For production with several worker processes use ``python -m app.serve``.
 """
 from app.main import app  # re-export FastAPI instance
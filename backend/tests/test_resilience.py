@@ -0,0 +1,104 @@
+"""
+Tail latency of the AI provider chain against in-process fake LLM servers.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.ai import resilience
+from app.ai.fake_llm_server import create_app
+from app.ai.providers import LLMProvider
+from app.ai.resilience import CircuitBreaker, FallbackAIProvider
+
+HEDGE_SECONDS = 0.1
+
+
+@pytest.fixture
+def fake_provider():
+    """Makes LLMProviders talking to their own fake server, noting each request in ``calls``."""
+    clients = []
+
+    def make(calls: list, name: str, **server) -> LLMProvider:
+        async def note(request):
+            calls.append(name)
+
+        provider = LLMProvider(base_url="http://fake/v1", model="fake")
+        clients.append(provider.client)
+        provider.client = httpx.AsyncClient(
+            app=create_app(**server), base_url="http://fake/v1", event_hooks={"request": [note]}
+        )
+        clients.append(provider.client)
+        return provider
+
+    yield make
+    for client in clients:
+        asyncio.run(client.aclose())
+
+
+@pytest.fixture(autouse=True)
+def fast_hedge(monkeypatch):
+    # No latency samples yet, so the chain hedges after the default delay
+    monkeypatch.setattr(resilience, "AI_HEDGE_DEFAULT_SECONDS", HEDGE_SECONDS)
+    monkeypatch.setattr(resilience, "AI_HEDGE_MIN_SECONDS", 0.0)
+
+
+def generate(chain: FallbackAIProvider):
+    async def timed():
+        started = time.monotonic()
+        variants = await chain.generate_followup_variants(context="Met at the expo")
+        return variants, time.monotonic() - started
+    return asyncio.run(timed())
+
+
+def test_stalled_primary_is_hedged_within_its_delay(fake_provider):
+    calls = []
+    chain = FallbackAIProvider({
+        "primary": fake_provider(calls, "primary", delay_seconds=30),
+        "secondary": fake_provider(calls, "secondary", delay_seconds=0.01),
+    }, timeout_seconds=60)
+
+    variants, elapsed = generate(chain)
+
+    assert len(variants) == 3
+    assert calls == ["primary", "secondary"]
+    assert elapsed < HEDGE_SECONDS + 1.0
+    # Losing the race to a hedge is not a failure of the primary
+    primary, secondary = chain.members
+    assert primary.breaker.state == CircuitBreaker.CLOSED
+    assert secondary.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failing_primary_opens_its_circuit_and_is_skipped(fake_provider):
+    calls = []
+    chain = FallbackAIProvider({
+        "primary": fake_provider(calls, "primary", failure_rate=1.0),
+        "secondary": fake_provider(calls, "secondary", delay_seconds=0.01),
+    }, timeout_seconds=60)
+    primary = chain.members[0]
+
+    for _ in range(primary.breaker.failure_threshold):
+        variants, _ = generate(chain)
+        assert len(variants) == 3
+    assert primary.breaker.state == CircuitBreaker.OPEN
+    assert calls.count("primary") == primary.breaker.failure_threshold
+
+    calls.clear()
+    variants, elapsed = generate(chain)
+    assert len(variants) == 3
+    assert calls == ["secondary"]
+    assert elapsed < 1.0  # no wait on the open circuit
+
+
+def test_every_circuit_open_fails_fast(fake_provider):
+    calls = []
+    chain = FallbackAIProvider({"primary": fake_provider(calls, "primary", failure_rate=1.0)}, timeout_seconds=60)
+    for _ in range(chain.members[0].breaker.failure_threshold):
+        with pytest.raises(resilience.AIProviderError):
+            generate(chain)
+
+    calls.clear()
+    with pytest.raises(resilience.AIProviderError, match="circuits open"):
+        generate(chain)
+    assert calls == []